@@ -5,7 +5,10 @@ This is the main script that runs all modules.
 import os
 import argparse
 
+import src.batch as bat
 import src.drop_recent as drp
+import src.get_data as get
+import src.regimes as reg
 import src.main as main
 import TurbulenceSuite_paths as path
 
@@ -15,19 +18,92 @@ parser.add_argument('-d', '--drop_recent', type=int,
                     help=
                     """
                     How many rows (reverse-chronological) do you want to
-                    remove from the "index_data.pkl" dataframe?
+                    remove from the prices store ("data/prices")?
+                    """)
+parser.add_argument('-f', '--full-rebuild', action='store_true',
+                    help=
+                    """
+                    Ignore the checkpoint from the previous run and rebuild
+                    both indicators from the full history.
+                    """)
+parser.add_argument('-o', '--offline', action='store_true',
+                    help=
+                    """
+                    Replay the Yahoo Finance responses stored in the
+                    "data/cache" folder instead of requesting new data.
+                    """)
+parser.add_argument('-p', '--profile', action='store_true',
+                    help=
+                    """
+                    Dump a cProfile profile of the calculation stages to
+                    "reports/calculation_profile.prof".
+                    """)
+parser.add_argument('-n', '--non-interactive', action='store_true',
+                    help=
+                    """
+                    Do not wait for [ENTER] at the end of the run.
+                    """)
+parser.add_argument('-w', '--workers', type=int, default=1,
+                    help=
+                    """
+                    How many processes should rebuild Turbulence and Systemic
+                    Risk at the same time? (1 for a serial rebuild)
+                    """)
+parser.add_argument('-s', '--stream',
+                    help=
+                    """
+                    Extend the indicators bar by bar from a local stream of
+                    prices: a socket ("host:port"), a file or a named pipe.
+                    """)
+parser.add_argument('--publish', type=int,
+                    help=
+                    """
+                    With --stream, publish the updates to TCP clients on this
+                    port instead of printing them.
+                    """)
+parser.add_argument('-b', '--batch', nargs='?', const=path.batch_path,
+                    help=
+                    """
+                    Calculate the indicators of every universe listed in a
+                    .json file (default "data/batch.json"), and write each
+                    universe's outputs to "reports/universes/<universe>".
+                    """)
+parser.add_argument('--serve', type=int,
+                    help=
+                    """
+                    Serve the indicator series of the last run over a local
+                    HTTP/JSON query API on this port.
                     """)
-args = parser.parse_args()
-rows_to_drop = args.drop_recent
 
-if rows_to_drop is not None:
-    drp.DropRecent().drop(rows_to_drop=rows_to_drop)
+# The guard stops the worker processes of --workers from re-running the script.
+if __name__ == '__main__':
+    args = parser.parse_args()
+    rows_to_drop = args.drop_recent
     
-else:
-    main_process = main.MainProcess()
-    main_process.append_prices_and_returns()
-    main_process.calculate_turbulence_and_systemic_risk()
-    main_process.save_chart_data()
+    if rows_to_drop is not None:
+        drp.DropRecent().drop(rows_to_drop=rows_to_drop)
+        
+    elif args.stream is not None:
+        main.MainProcess().stream(source=args.stream, publish_port=args.publish)
+        
+    elif args.batch is not None:
+        bat.BatchRunner(output_directory=path.batch_output_path, max_workers=args.workers,
+                        cache=get.ResponseCache(path.response_cache_path, offline=args.offline),
+                        regime_calendar=reg.RegimeCalendar().load(path.regimes_path)
+                        ).load(args.batch).run()
+        
+    elif args.serve is not None:
+        main.MainProcess().serve_queries(port=args.serve)
+        
+    else:
+        main_process = main.MainProcess(full_rebuild=args.full_rebuild,
+                                       offline=args.offline,
+                                       profile=args.profile,
+                                       interactive=not args.non_interactive,
+                                       workers=args.workers)
+        main_process.append_prices_and_returns()
+        main_process.calculate_turbulence_and_systemic_risk()
+        main_process.save_chart_data()
     
             
 #MIT License
@@ -5,10 +5,20 @@ import os
 
 os.chdir(os.path.dirname(os.path.abspath(__file__)))
 
-prices_path_historical = str(os.getcwd() + '\\data\\index_data 2023.03.11 VALID.pkl')
-prices_path_current = str(os.getcwd() + '\\data\\index_data.pkl')
-turbulence_chart_path = str(os.getcwd() + '\\reports\\turbulence_chart.csv')
-systemic_risk_chart_path = str(os.getcwd() + '\\reports\\systemic_risk_chart.csv')
+prices_path_historical = os.path.join(os.getcwd(), 'data', 'index_data 2023.03.11 VALID.pkl')
+prices_path_current = os.path.join(os.getcwd(), 'data', 'index_data.pkl')
+prices_store_path = os.path.join(os.getcwd(), 'data', 'prices')
+turbulence_chart_path = os.path.join(os.getcwd(), 'reports', 'turbulence_chart.csv')
+systemic_risk_chart_path = os.path.join(os.getcwd(), 'reports', 'systemic_risk_chart.csv')
+indicators_path = os.path.join(os.getcwd(), 'reports', 'indicators.npz')
+run_metrics_path = os.path.join(os.getcwd(), 'reports', 'run_metrics.jsonl')
+profile_path = os.path.join(os.getcwd(), 'reports', 'calculation_profile.prof')
+regimes_path = os.path.join(os.getcwd(), 'data', 'regimes.json')
+universe_path = os.path.join(os.getcwd(), 'data', 'universe.json')
+checkpoint_path = os.path.join(os.getcwd(), 'data', 'checkpoint.pkl')
+response_cache_path = os.path.join(os.getcwd(), 'data', 'cache')
+batch_path = os.path.join(os.getcwd(), 'data', 'batch.json')
+batch_output_path = os.path.join(os.getcwd(), 'reports', 'universes')
 
 #MIT License
 #
@@ -0,0 +1,296 @@
+"""
+Benchmarks the calculation engines on seeded synthetic asset universes.
+
+Each case in "thresholds.json" names an engine, a number of assets and a number
+of rows. Every case records its wall time, peak memory and an output checksum
+in a .json results file. The run fails (exit code 1) if any case exceeds its
+"max_seconds" or "max_peak_mb" threshold. For "gini_coefficients", "assets" is
+the number of values per window and "rows" is the number of windows;
+"gini_coefficients_loop" runs the same windows through the list-and-loop Gini
+of the original code (reference_gini), as the baseline of the kernel. The
+"parameter_sweep" engine runs a 20 x 20 grid (window sizes 150 to 340, half-lives
+1 to 20). For "score_scenarios", "rows" is the number of scenarios, scored against
+2,000 weeks of history. For "parse_chart", "rows" is the number of bars in a
+Yahoo Finance chart response, decoded with get.ChartDecoder.
+
+Usage: python benchmarks/benchmark_engines.py [--engine ENGINE] [--repeat N]
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.getcwd())
+
+import src.calculate as calc
+import src.get_data as get
+import src.regimes as reg
+import src.sweep as sw
+import src.universe as uni
+
+
+def reference_gini(values):
+    """
+    Purpose: the Gini coefficient of one window, as calculated by the original
+    Calculate.gini (a sorted list and a loop over the values), before it was
+    replaced by Calculate.gini_coefficients.
+    """
+    values = list(values)
+    values.sort()
+    
+    minimum_value = values[0]
+    lorenz_curve_value = minimum_value
+    average_input = sum(values)/len(values)
+    line_of_equality = [average_input]
+    gap_area = [line_of_equality[0] - lorenz_curve_value]
+    
+    for index in range(1, len(values)):
+        lorenz_curve_value += values[index]
+        line_of_equality.append(line_of_equality[index - 1] + average_input)
+        gap_area.append(line_of_equality[index - 1] + average_input
+                        - lorenz_curve_value)
+    
+    return(sum(gap_area)/sum(line_of_equality))
+
+
+class SyntheticUniverse:
+    """
+    Generates seeded synthetic weekly returns and prices for a universe of assets,
+    from a one-factor model with fat-tailed (Student-t) shocks.
+    """
+
+
+    def __init__(self, assets, rows, seed=0):
+        """
+        "assets": integer, the number of assets.
+
+        "rows": integer, the number of weekly observations.
+
+        "seed": integer, the random seed.
+        """
+        self.assets = int(assets)
+        self.rows = int(rows)
+        self.random = np.random.RandomState(int(seed))
+
+
+    def dates(self):
+        """
+        Purpose: weekly date-stamps (YYYY-MM-DD strings), in reverse chronological order.
+        """
+        chronological_dates = (np.datetime64('1900-01-01')
+                               + 7 * np.arange(self.rows)).astype('datetime64[D]')
+        return(np.datetime_as_string(chronological_dates[::-1], unit='D').astype(object))
+
+
+    def returns(self):
+        """
+        Purpose: synthetic returns in the format of get.CalculateReturns().calculate_returns().
+
+        Output: a dataframe containing the returns (in reverse chronological order).
+        """
+        market = 0.02 * self.random.standard_t(df=5, size=(self.rows, 1))
+        loadings = self.random.uniform(0.2, 1.2, size=(1, self.assets))
+        shocks = 0.01 * self.random.standard_t(df=5, size=(self.rows, self.assets))
+        returns = pd.DataFrame(market @ loadings + shocks,
+                               columns=['Asset{}'.format(asset) for asset in range(self.assets)])
+        returns.insert(0, 'Dates', self.dates())
+
+        return(returns)
+
+
+    def prices(self, assets):
+        """
+        Purpose: synthetic prices in the format of the prices dataset.
+
+        Output: a dataframe containing the prices (in reverse chronological order).
+
+        "assets": list, the column names of the prices.
+        """
+        shocks = 1 + 0.02 * self.random.standard_normal(size=(self.rows, len(assets)))
+        prices = pd.DataFrame(100 * np.cumprod(shocks, axis=0)[::-1], columns=assets)
+        prices.insert(0, 'Dates', self.dates())
+
+        return(prices)
+
+
+    def chart_response(self):
+        """
+        Purpose: a synthetic Yahoo Finance chart response (one bar per row), with
+        the quote arrays and metadata of a real response.
+
+        Output: the response text.
+        """
+        timestamps = 1700000000 - 86400 * 7 * np.arange(self.rows)[::-1]
+        prices = np.round(100 * np.cumprod(1 + 0.02 * self.random.standard_normal(self.rows)), 6).tolist()
+        quote = {field: prices for field in ['open', 'high', 'low', 'close']}
+        quote['volume'] = self.random.randint(0, 10**9, size=self.rows).tolist()
+        chart = {'meta': {'currency': 'USD', 'symbol': 'SYNTHETIC', 'gmtoffset': -18000,
+                          'timezone': 'EST', 'dataGranularity': '1wk'},
+                 'timestamp': timestamps.tolist(),
+                 'indicators': {'quote': [quote], 'adjclose': [{'adjclose': prices}]}}
+        return(json.dumps({'chart': {'result': [chart], 'error': None}}, separators=(',', ':')))
+
+
+class EngineBenchmarks:
+    """
+    Runs the benchmark cases and checks them against their thresholds.
+    """
+
+
+    def __init__(self, repeat=3):
+        """
+        "repeat": integer, the number of timed runs per case (the fastest is kept).
+        """
+        self.repeat = int(repeat)
+        self.regime_calendar = reg.RegimeCalendar().load(os.path.join('data', 'regimes.json'))
+        self.universe = uni.Universe().load(os.path.join('data', 'universe.json'))
+        self.results = []
+
+
+    def engine_call(self, engine, assets, rows):
+        """
+        Purpose: prepare the inputs of one case.
+
+        Output: a function that runs the engine once and returns its output as an array.
+        """
+        universe = SyntheticUniverse(assets=assets, rows=rows)
+        calculator = calc.Calculate(regime_calendar=self.regime_calendar)
+
+        if engine == 'calculate_turbulence':
+            returns = universe.returns()
+            return(lambda: np.asarray(calculator.calculate_turbulence(returns)['Raw Turbulence']))
+        if engine == 'calculate_turbulence_ledoit_wolf':
+            returns = universe.returns()
+            return(lambda: np.asarray(calculator.calculate_turbulence(
+                returns, covariance_estimator='ledoit_wolf')['Raw Turbulence']))
+        if engine == 'calculate_systemic_risk':
+            returns = universe.returns()
+            return(lambda: np.asarray(calculator.calculate_systemic_risk(returns)['Systemic Risk']))
+        if engine == 'calculate_returns':
+            returns_calculator = get.CalculateReturns(universe=self.universe)
+            prices = returns_calculator.add_curve_slope(universe.prices(list(self.universe.tickers)))
+            return(lambda: returns_calculator.calculate_returns(prices).iloc[:, 1:].to_numpy())
+        if engine == 'parameter_sweep':
+            returns = universe.returns()
+            sweep = sw.ParameterSweep(window_sizes=range(150, 350, 10), half_lives=range(1, 21))
+            return(lambda: sweep.calculate(returns, calculator=calculator).to_numpy())
+        if engine == 'score_scenarios':
+            calculator.calculate_turbulence(SyntheticUniverse(assets=assets, rows=2000, seed=1).returns())
+            scorer = calculator.scenario_scorer()
+            scenarios = universe.returns().iloc[:, 1:].to_numpy()
+            return(lambda: scorer.score_scenarios(scenarios)['Raw Turbulence'])
+        if engine == 'parse_chart':
+            response_text = universe.chart_response()
+            return(lambda: get.ChartDecoder().decode(response_text)['adjclose'])
+        if engine == 'exponential_smoother':
+            raw_data = np.abs(universe.returns().iloc[::-1, 1:].to_numpy().T)
+            return(lambda: calculator.exponential_smoothers(raw_data, half_lives=[12])[0])
+        if engine == 'gini_coefficients':
+            eigenvalues = np.abs(universe.returns().iloc[:, 1:].to_numpy())
+            return(lambda: calculator.gini_coefficients(eigenvalues))
+        if engine == 'gini_coefficients_loop':
+            eigenvalues = np.abs(universe.returns().iloc[:, 1:].to_numpy())
+            return(lambda: np.array([reference_gini(window) for window in eigenvalues]))
+        raise ValueError('Unknown engine "{}".'.format(engine))
+
+
+    def run_case(self, case):
+        """
+        Purpose: time one case, measure its peak memory, and compare both with
+        its thresholds.
+
+        "case": dictionary, an item of the "cases" list in thresholds.json.
+        """
+        run_engine = self.engine_call(case['engine'], case['assets'], case['rows'])
+
+        seconds = []
+        for _ in range(self.repeat):
+            start = time.perf_counter()
+            output = run_engine()
+            seconds.append(time.perf_counter() - start)
+
+        tracemalloc.start()
+        run_engine()
+        peak_mb = tracemalloc.get_traced_memory()[1] / 2**20
+        tracemalloc.stop()
+
+        output = np.ascontiguousarray(output, dtype=np.float64)
+        result = dict(case)
+        result.update({'seconds': min(seconds),
+                       'peak_mb': peak_mb,
+                       'output_sum': float(np.nansum(output)),
+                       'checksum': hashlib.sha256(np.round(output, 8).tobytes()).hexdigest()[:16]})
+        result['passed'] = (result['seconds'] <= case.get('max_seconds', float('inf'))
+                            and result['peak_mb'] <= case.get('max_peak_mb', float('inf')))
+        self.results.append(result)
+
+        print('{:<32} {:>5} assets {:>6} rows  {:>9.4f} s  {:>8.1f} MB  {}'.format(
+              case['engine'], case['assets'], case['rows'], result['seconds'],
+              result['peak_mb'], 'ok' if result['passed'] else 'SLOWER THAN THRESHOLD'))
+
+
+    def run(self, cases):
+        """
+        Purpose: run every case.
+
+        Output: True if every case is within its thresholds.
+        """
+        for case in cases:
+            self.run_case(case)
+
+        return(all(result['passed'] for result in self.results))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--thresholds', default=os.path.join('benchmarks', 'thresholds.json'),
+                        help='The .json file listing the cases and their thresholds.')
+    parser.add_argument('--output', default=os.path.join('benchmarks', 'results.json'),
+                        help='The .json file the results are written to.')
+    parser.add_argument('--engine', default=None,
+                        help='Only run the cases of this engine.')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='The number of timed runs per case.')
+    args = parser.parse_args()
+
+    with open(args.thresholds) as thresholds_file:
+        cases = json.load(thresholds_file)['cases']
+    if args.engine is not None:
+        cases = [case for case in cases if case['engine'] == args.engine]
+
+    benchmarks = EngineBenchmarks(repeat=args.repeat)
+    passed = benchmarks.run(cases)
+    with open(args.output, 'w') as output_file:
+        json.dump({'passed': passed, 'results': benchmarks.results}, output_file, indent=2)
+    print('\nResults written to {}'.format(args.output))
+    sys.exit(0 if passed else 1)
+
+
+#MIT License
+#
+#Copyright (c) 2019 Terrence Zhang
+#
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+#
+#The above copyright notice and this permission notice shall be included in all
+#copies or substantial portions of the Software.
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#SOFTWARE.
@@ -0,0 +1,340 @@
+"""
+This module runs the indicators for several asset universes in one invocation.
+"""
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+
+def universe_task(name, returns, universe, regime_calendar, recession_regime, output_directory):
+    """
+    Purpose: calculate Turbulence, Systemic Risk and the other spectral
+    indicators of one universe in a worker, and write its outputs to
+    "output_directory" (see write_outputs).
+
+    Output: a dictionary summarizing the run of the universe.
+    """
+    import src.calculate as calc
+    import src.spectral as spec
+
+    calculator = calc.Calculate(regime_calendar=regime_calendar, recession_regime=recession_regime)
+    calculator.calculate_turbulence(returns, covariance_estimator=universe.covariance_estimator,
+                                    covariance_options=universe.covariance_options, attribution=True)
+    calculator.calculate_systemic_risk(returns, spectral_indicators=spec.SpectralIndicators().names())
+    write_outputs(output_directory, calculator, columns=list(returns.columns[1:]))
+    turbulence = calculator.turbulence['Turbulence']
+
+    return({'Universe': name, 'Assets': returns.shape[1] - 1, 'Returns': len(returns),
+            'First Date': returns['Dates'].iloc[-1], 'Last Date': returns['Dates'].iloc[0],
+            'Latest Turbulence': turbulence[-1] if len(turbulence) > 0 else None})
+
+
+def write_outputs(output_directory, calculator, columns):
+    """
+    Purpose: write the outputs of one universe to its own folder: the Visualizer
+    charts (turbulence_chart.csv, systemic_risk_chart.csv, as written by the
+    main process) and the columnar series of the query service (indicators.npz).
+
+    "calculator": calculate.Calculate, holds the indicator series.
+
+    "columns": list, the return columns of the universe (for the attribution).
+    """
+    import src.query_service as qry
+
+    os.makedirs(output_directory, exist_ok=True)
+    turbulence = pd.DataFrame(calculator.turbulence)
+    systemic_risk = pd.DataFrame(calculator.systemic_risk)
+    charts = {'turbulence_chart.csv': (turbulence, ['Raw Turbulence', 'Turbulence', 'Recession']),
+              'systemic_risk_chart.csv': (systemic_risk, ['Systemic Risk', 'Recession'])}
+    for filename, (series, chart_columns) in charts.items():
+        chart = pd.DataFrame({'Dates': ['date'] + list(series['Dates'])})
+        for column in chart_columns:
+            chart[column] = ['number'] + list(series[column])
+        chart.to_csv(os.path.join(output_directory, filename), index=False)
+
+    series = {'turbulence': turbulence, 'systemic_risk': systemic_risk}
+    if calculator.turbulence_attribution is not None:
+        attribution = pd.DataFrame(calculator.turbulence_attribution, columns=columns)
+        attribution.insert(0, 'Dates', turbulence['Dates'].values)
+        series['turbulence_attribution'] = attribution
+    if len(calculator.spectral_indicators) > 0:
+        series['spectral_indicators'] = pd.DataFrame(calculator.spectral_indicators)
+    qry.IndicatorCache(os.path.join(output_directory, 'indicators.npz')).write(series)
+
+
+class BatchRunner:
+    """
+    Runs the indicators for several universes (e.g. per-region equity pools, a
+    rates-only pool and a global pool), sharing the work they have in common:
+
+        Prices: every distinct Yahoo Finance ticker is pulled once (through one
+        GetPrices, rate limiter and response cache), and aligned to one weekly
+        grid (see trading_calendar.TradingCalendar.align).
+
+        Returns: every distinct return column (an asset or a spread, identified
+        by its ticker symbols, as a percent or an absolute change) is calculated
+        once over the whole grid. Each universe then selects its columns, under
+        its own names, from the first date on which all of its assets have a price.
+
+        Indicators: each universe is one task (Turbulence, Systemic Risk and the
+        other spectral indicators) on a process pool.
+
+    The cost therefore grows with the number of distinct tickers plus the number
+    of universes, rather than their product. Each universe writes its outputs to
+    its own folder, "output_directory"/<universe name>.
+    """
+
+
+    def __init__(self, universes=None, output_directory='universes', calendar=None,
+                 max_workers=1, fetch_workers=4, cache=None, regime_calendar=None,
+                 recession_regime='NBER recessions'):
+        """
+        "universes": dictionary, the universe.Universe of each universe name.
+
+        "output_directory": string, the folder holding one output folder per universe.
+
+        "calendar": string, the Yahoo Finance ticker whose dates form the grid.
+        Defaults to the calendar asset of the first universe.
+
+        "max_workers": integer, the number of processes calculating universes at
+        the same time (1 to calculate them one after the other, in this process).
+
+        "fetch_workers": integer, the number of tickers pulled at the same time.
+
+        "cache": get.ResponseCache, stores the Yahoo Finance responses.
+
+        "regime_calendar", "recession_regime": see calc.Calculate(). Defaults to
+        the NBER recessions (regimes.NBER_RECESSIONS).
+        """
+        self.universes = dict(universes or {})
+        self.output_directory = str(output_directory)
+        self.calendar = calendar
+        self.max_workers = int(max_workers)
+        self.fetch_workers = int(fetch_workers)
+        self.cache = cache
+        if regime_calendar is None:
+            import src.regimes as reg
+            regime_calendar = reg.RegimeCalendar({'NBER recessions': reg.NBER_RECESSIONS})
+        self.regime_calendar = regime_calendar
+        self.recession_regime = str(recession_regime)
+        self.prices = pd.DataFrame()
+        self.first_dates = {}
+        self.returns = pd.DataFrame()
+        self.summaries = []
+
+
+    def load(self, filepath):
+        """
+        Purpose: read the universes listed in a .json file (see data/batch.json):
+
+            {"calendar": "^RUT",
+             "universes": {"global": "universe.json",
+                           "rates": {"tickers": {...}, "absolute_change": [...]}}}
+
+        Each universe is either a universe definition, or the path of a universe
+        .json file (relative to the folder of "filepath").
+
+        "filepath": string, the path of the .json file.
+        """
+        import src.universe as uni
+
+        with open(filepath) as batch_file:
+            definition = json.load(batch_file)
+        self.calendar = definition.get('calendar', self.calendar)
+        self.universes = {}
+        for name, universe in definition['universes'].items():
+            if isinstance(universe, str):
+                self.universes[name] = uni.Universe().load(os.path.join(os.path.dirname(filepath), universe))
+            else:
+                self.universes[name] = uni.Universe(**universe)
+                self.universes[name].validate()
+
+        return(self)
+
+
+    def column_key(self, universe, column):
+        """
+        Purpose: the name of an asset or spread of "universe" in the shared
+        prices: its ticker symbol, or "minuend symbol-subtrahend symbol" for a
+        spread.
+        """
+        if column in universe.spreads:
+            minuend, subtrahend = universe.spreads[column]
+            return('{}-{}'.format(universe.tickers[minuend], universe.tickers[subtrahend]))
+        return(universe.tickers[column])
+
+
+    def return_key(self, universe, column):
+        """
+        Purpose: the name of a return column of "universe" in the shared returns.
+        """
+        change = 'absolute' if column in universe.absolute_change else 'percent'
+        return('{} ({} change)'.format(self.column_key(universe, column), change))
+
+
+    def shared_universe(self):
+        """
+        Purpose: the union of every universe, named by ticker symbol, with each
+        distinct ticker, spread and return column once.
+
+        Output: a universe.Universe object.
+        """
+        import src.universe as uni
+
+        tickers = {}
+        spreads = {}
+        for universe in self.universes.values():
+            tickers.update((symbol, symbol) for symbol in universe.tickers.values())
+            for spread, (minuend, subtrahend) in universe.spreads.items():
+                spreads[self.column_key(universe, spread)] = [universe.tickers[minuend],
+                                                              universe.tickers[subtrahend]]
+        calendar = self.calendar
+        if calendar is None:
+            first_universe = list(self.universes.values())[0]
+            calendar = first_universe.tickers[first_universe.calendar]
+
+        return(uni.Universe(tickers=tickers, calendar=calendar, spreads=spreads))
+
+
+    def fetch_prices(self):
+        """
+        Purpose: pull the full history of every distinct ticker once, aligned to
+        the grid of the calendar ticker, and add every distinct spread. The date
+        of the first price of each ticker is kept in "self.first_dates", before
+        gaps are filled.
+
+        Output: a dataframe containing the prices (in reverse chronological
+        order), with one column per ticker symbol or spread.
+        """
+        import src.get_data as get
+
+        shared_universe = self.shared_universe()
+        print('\nRequesting data for {} distinct tickers across {} universes...'.format(
+              len(shared_universe.tickers), len(self.universes)))
+        price_source = get.GetPrices(max_workers=self.fetch_workers, cache=self.cache,
+                                    universe=shared_universe)
+        prices = price_source.get_weekly_prices()
+
+        self.first_dates = {}
+        for symbol in shared_universe.tickers:
+            values = np.asarray(prices[symbol], dtype=np.float64)
+            valid_rows = np.nonzero(~np.isnan(values) & (values != 0))[0]
+            self.first_dates[symbol] = prices['Dates'][valid_rows[-1]] if len(valid_rows) > 0 else None
+        prices = pd.DataFrame(price_source.replace_zero_values(input_dictionary=prices))
+        self.prices = get.CalculateReturns(universe=shared_universe).add_curve_slope(prices)
+
+        return(self.prices)
+
+
+    def calculate_returns(self):
+        """
+        Purpose: calculate every distinct return column once, over the whole grid.
+
+        Output: a dataframe containing the returns (in reverse chronological
+        order), with one column per return key (see return_key).
+        """
+        import src.get_data as get
+        import src.universe as uni
+
+        changes = {}
+        for universe in self.universes.values():
+            for column in universe.return_assets():
+                changes[self.return_key(universe, column)] = (self.column_key(universe, column),
+                                                              column in universe.absolute_change)
+        prices = self.prices[['Dates']].copy()
+        percent_change = []
+        absolute_change = []
+        for key, (column_key, is_absolute_change) in changes.items():
+            prices[key] = self.prices[column_key]
+            (absolute_change if is_absolute_change else percent_change).append(key)
+        returns = get.CalculateReturns(universe=uni.Universe(percent_change=percent_change,
+                                                             absolute_change=absolute_change)
+                                       ).calculate_returns(prices)
+        self.returns = returns[['Dates'] + list(changes.keys())]
+
+        return(self.returns)
+
+
+    def universe_returns(self, name):
+        """
+        Purpose: the returns of one universe, under its own column names, from
+        the first date on which all of its tickers have a price.
+
+        Output: a dataframe containing the returns (in reverse chronological order).
+        """
+        universe = self.universes[name]
+        assets = universe.return_assets()
+        first_dates = [self.first_dates[symbol] for symbol in universe.tickers.values()]
+        if any(first_date is None for first_date in first_dates):
+            return(pd.DataFrame(columns=['Dates'] + assets))
+        first_date = max(first_dates)
+
+        returns = self.returns[['Dates'] + [self.return_key(universe, asset) for asset in assets]]
+        returns = returns[returns['Dates'] > first_date].reset_index(drop=True)
+        returns.columns = ['Dates'] + assets
+
+        return(returns)
+
+
+    def output_path(self, name):
+        """
+        Purpose: the output folder of one universe.
+        """
+        return(os.path.join(self.output_directory, re.sub(r'[^\w.-]', '_', str(name))))
+
+
+    def run(self):
+        """
+        Purpose: pull the prices, calculate the returns, and calculate and write
+        the indicators of every universe.
+
+        Output: a dataframe summarizing the run of each universe.
+        """
+        self.fetch_prices()
+        self.calculate_returns()
+        tasks = [(name, self.universe_returns(name), universe, self.regime_calendar,
+                  self.recession_regime, self.output_path(name))
+                 for name, universe in self.universes.items()]
+        skipped = [task[0] for task in tasks if len(task[1]) == 0]
+        tasks = [task for task in tasks if len(task[1]) > 0]
+        for name in skipped:
+            print('\t No complete returns for universe {}, skipped.'.format(name))
+
+        print('\nBuilding the indicators of {} universes...'.format(len(tasks)))
+        if self.max_workers > 1:
+            with ProcessPoolExecutor(max_workers=self.max_workers) as pool:
+                self.summaries = list(pool.map(universe_task, *zip(*tasks)))
+        else:
+            self.summaries = [universe_task(*task) for task in tasks]
+        summary = pd.DataFrame(self.summaries)
+        print(summary.to_string(index=False))
+        print('\nOutputs written to {}'.format(self.output_directory))
+
+        return(summary)
+
+
+#MIT License
+#
+#Copyright (c) 2019 Terrence Zhang
+#
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+#
+#The above copyright notice and this permission notice shall be included in all
+#copies or substantial portions of the Software.
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#SOFTWARE.
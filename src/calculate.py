@@ -2,24 +2,157 @@
 This module calculates the Turbulence and Systemic Risk indicators.
 """
 
+class ExponentialSmootherState:
+    """
+    The state of an exponential smoother: the last smoothed value and the
+    smoothing factor (alpha). Extends a smoothed series in O(1) per new value,
+    without re-smoothing its history.
+    """
+    # Extensions shorter than this run the recursion in Python (about 0.2 ms for
+    # 63 points) instead of importing scipy.signal (about 1.4 s) for lfilter.
+    recursion_limit = 64
+    
+    
+    def __init__(self, smoothed_value, smoothing_factor):
+        """
+        "smoothed_value": float (or 1-D array, one value per series), the last
+        smoothed value.
+        
+        "smoothing_factor": float, alpha.
+        """
+        self.smoothed_value = smoothed_value
+        self.smoothing_factor = float(smoothing_factor)
+    
+    
+    def update(self, raw_value):
+        """
+        Purpose: smooth one new value.
+        
+        Output: the new smoothed value.
+        
+        "raw_value": float (or 1-D array, one value per series), the new value.
+        """
+        self.smoothed_value = ((self.smoothing_factor * raw_value)
+            + ((1 - self.smoothing_factor) * self.smoothed_value))
+        
+        return(self.smoothed_value)
+    
+    
+    def extend(self, raw_data):
+        """
+        Purpose: smooth several new values (in chronological order) at once.
+        Short extensions (e.g. a weekly update) run the recursion directly;
+        longer ones use a linear filter.
+        
+        Output: a list containing the new smoothed values (one list per series if
+        the state holds several series).
+        
+        "raw_data": iterable (or 2-D array, series x observations), the new values.
+        """
+        import numpy as np
+        
+        raw_data = np.asarray(raw_data, dtype=np.float64)
+        if raw_data.shape[-1] < self.recursion_limit:
+            smoothed_values = [self.update(raw_data[..., index])
+                               for index in range(raw_data.shape[-1])]
+            return(np.asarray(smoothed_values, dtype=np.float64).reshape(
+                   (raw_data.shape[-1],) + raw_data.shape[:-1]).T.tolist())
+        
+        from scipy import signal
+        
+        retention = 1 - self.smoothing_factor
+        initial_condition = retention * np.asarray(self.smoothed_value, dtype=np.float64)[..., None]
+        smoothed_values = signal.lfilter([self.smoothing_factor], [1, -retention], raw_data,
+                                         axis=-1, zi=initial_condition)[0]
+        self.smoothed_value = smoothed_values[..., -1]
+        if np.ndim(self.smoothed_value) == 0:
+            self.smoothed_value = float(self.smoothed_value)
+        
+        return(smoothed_values.tolist())
+
+
 class Calculate:
     """
     Calculates the Turbulence and Systemic Risk indicators.
     """
     
     
-    def __init__(self):
-        self.recession_start_dates = ['2001-04-01', '2008-01-01', '2020-03-01']
-        self.recession_end_dates = ['2001-11-01', '2009-06-01', '2020-04-01']
+    def __init__(self, regime_calendar=None, recession_regime='NBER recessions'):
+        """
+        "regime_calendar": regimes.RegimeCalendar, labels the "Recession" series.
+        Defaults to the NBER recessions (regimes.NBER_RECESSIONS).
+        
+        "recession_regime": string, the regime set used for the "Recession" series.
+        """
+        if regime_calendar is None:
+            import src.regimes as reg
+            regime_calendar = reg.RegimeCalendar({'NBER recessions': reg.NBER_RECESSIONS})
+        self.regime_calendar = regime_calendar
+        self.recession_regime = str(recession_regime)
         self.turbulence = {}
         self.systemic_risk = {}
+        self.spectral_indicators = {}
+        self.spectral_functions = {}
+        self.spectral_layer = None
+        self.smoother_state = None
+        self.turbulence_sample = None
+        self.turbulence_attribution = None
+        self.systemic_risk_window = None
+    
+    
+    def smoothing_factor(self, half_life):
+        """
+        Purpose: convert a half-life into a smoothing factor (alpha), as
+        alpha = 1 - exp(ln(0.5) / half_life)
+        
+        Output: the smoothing factor, as a float object.
+        """
+        import math
+        
+        return(1 - math.exp(math.log(0.5) / float(half_life)))
+    
+    
+    def exponential_smoothers(self, raw_data, half_lives):
+        """
+        Purpose: performs exponential smoothing on each series in "raw_data", for
+        each half-life in "half_lives", with one linear filter per half-life.
+        Begins each recursion with the first data item of the series (i.e.
+        assumes that each series is listed in chronological order).
+        
+        Output: a tuple (smoothed values, states). "smoothed values" is a
+        (half-lives x series x observations) array. "states" is a list containing
+        an ExponentialSmootherState for each half-life, holding the last smoothed
+        value of every series.
+        
+        "raw_data": 2-D array (series x observations), the data to be smoothed.
+        
+        "half_lives": iterable, the half-lives for the smoother.
+        """
+        import numpy as np
+        from scipy import signal
+        
+        raw_data = np.atleast_2d(np.asarray(raw_data, dtype=np.float64))
+        half_lives = list(half_lives)
+        
+        smoothed_values = np.empty((len(half_lives),) + raw_data.shape)
+        states = []
+        for index, half_life in enumerate(half_lives):
+            smoothing_factor = self.smoothing_factor(half_life)
+            retention = 1 - smoothing_factor
+            smoothed_values[index] = signal.lfilter([smoothing_factor], [1, -retention], raw_data,
+                                                    axis=-1, zi=retention * raw_data[:, :1])[0]
+            states.append(ExponentialSmootherState(smoothed_value=smoothed_values[index, :, -1].copy(),
+                                                   smoothing_factor=smoothing_factor))
+        
+        return(smoothed_values, states)
     
     
     def exponential_smoother(self, raw_data, half_life):
         """
         Purpose: performs exponential smoothing on "raw_data". Begins recursion
         with the first data item (i.e. assumes that data in "raw_data" is listed
-        in chronological order).
+        in chronological order). The state at the end of "raw_data" is kept in
+        "self.smoother_state", so the series can be extended later.
         
         Output: a list containing the smoothed values of "raw_data".
         
@@ -28,43 +161,30 @@ class Calculate:
         "half_life": float, the half-life for the smoother. The smoothing factor
         (alpha) is calculated as alpha = 1 - exp(ln(0.5) / half_life)
         """
-        import math
+        smoothed_values, states = self.exponential_smoothers(raw_data=[list(raw_data)],
+                                                             half_lives=[half_life])
+        self.smoother_state = ExponentialSmootherState(smoothed_value=float(states[0].smoothed_value[0]),
+                                                       smoothing_factor=states[0].smoothing_factor)
         
-        raw_data = list(raw_data)
-        half_life = float(half_life)
+        return(smoothed_values[0, 0].tolist())
         
-        smoothing_factor = 1 - math.exp(math.log(0.5) / half_life)
-        smoothed_values = [raw_data[0]]
-        for index in range(1, len(raw_data)):
-            previous_smooth_value = smoothed_values[-1]
-            new_unsmooth_value = raw_data[index]
-            new_smooth_value = ((smoothing_factor * new_unsmooth_value)
-                + ((1 - smoothing_factor) * previous_smooth_value))
-            smoothed_values.append(new_smooth_value)
         
-        return(smoothed_values)
+    def recession_series(self, dates):
+        """
+        Purpose: determine which "dates" are in a recessionary time period.
         
+        Output: a list containing 100 for each date in recession, 0 otherwise.
         
-    def append_recession_series(self, current_date, dataframe):
+        "dates": iterable, the dates (YYYY-MM-DD strings).
         """
-        Purpose: determine if the "current_date" is in a recessionary time period.
-        Appends the result (100 if in recession, 0 if not) to the "Recession"
-        series of the "dataframe".
-        """
-        recession_value = 0
-        for recession_instance in range(0, len(self.recession_end_dates)):
-            recession_start = self.recession_start_dates[recession_instance]
-            recession_end = self.recession_end_dates[recession_instance]
-            after_start_date = current_date >= recession_start
-            before_end_date = current_date <= recession_end
-            
-            if after_start_date and before_end_date:
-                recession_value = 100
-                break
-        dataframe['Recession'].append(recession_value)
+        return(self.regime_calendar.label(dates=dates, name=self.recession_regime,
+                                          value=100).tolist())
         
     
-    def calculate_turbulence(self, returns, initial_window_size=250):
+    def calculate_turbulence(self, returns, initial_window_size=250,
+                             refresh_interval=52, half_life=12,
+                             covariance_estimator='sample', covariance_options=None,
+                             attribution=False):
         """
         Purpose: calculate the Turbulence of the asset pool.
         
@@ -76,35 +196,202 @@ class Calculate:
         "initial window_size": integer, the initial window size used to calculate
         the covariance matrix. This window size grows as the analysis proceeds
         across time.
+        
+        "refresh_interval": integer, the number of observations between exact
+        rebuilds of the inverse covariance matrix. In between, the inverse is
+        carried forward with rank-1 updates (see covariance.ExpandingCovariance).
+        On the weekly asset pool, Raw Turbulence matches a full np.linalg.pinv
+        rebuild at every step to a relative tolerance of 1e-9.
+        
+        "half_life": float, the half-life used to smooth Raw Turbulence into
+        Turbulence.
+        
+        "covariance_estimator": string, "sample" for the sample covariance matrix,
+        or "ledoit_wolf" for the Ledoit-Wolf shrinkage estimate, which stays
+        well-conditioned for large asset pools (see
+        covariance.ShrinkageExpandingCovariance). With "ledoit_wolf", the inverse
+        is held fixed for "refresh_interval" observations at a time. Two more
+        estimators forget old observations instead of growing the window:
+        "exponential" (exponentially weighted mean and covariance matrix, see
+        covariance.ExponentialCovariance) and "rolling" (the last "window_size"
+        observations, see covariance.RollingWindowCovariance).
+        
+        "covariance_options": dictionary, extra arguments of the estimator, e.g.
+        {"half_life": 52} for "exponential" or {"window_size": 520} for "rolling"
+        (which defaults to "initial_window_size").
+        
+        "attribution": boolean, if True, also decompose each Raw Turbulence value
+        into the contribution of each asset (the terms deviation_i * (inverse
+        covariance @ deviation)_i of the quadratic form, which sum to it), kept
+        in "self.turbulence_attribution" as a (dates x assets) array. The terms
+        reuse the deviation and inverse of the same pass.
         """
-        import copy
         import numpy as np
-        from scipy.spatial import distance
         
-        window_size = copy.deepcopy(int(initial_window_size)) 
-        self.turbulence = {'Dates': [], 'Raw Turbulence': [], 'Recession': []}
         chronological_returns = returns.iloc[::-1]
-        while window_size < len(chronological_returns):
-            historical_sample = chronological_returns.iloc[:window_size, 1:]
-            historical_sample_means = historical_sample.mean()
-            inverse_covariance_matrix = np.linalg.pinv(historical_sample.cov())
-            current_data = chronological_returns.iloc[[window_size]]
-            current_date = current_data['Dates'].values[0]
-            
-            mahalanobis_distance = distance.mahalanobis(u=current_data.iloc[:, 1:],
-                                                        v=historical_sample_means,
-                                                        VI=inverse_covariance_matrix)
-            turbulence = mahalanobis_distance**2
-            
-            self.turbulence['Raw Turbulence'].append(turbulence)
-            self.turbulence['Dates'].append(current_date)
-            self.append_recession_series(current_date=current_date,
-                                         dataframe=self.turbulence)
-            window_size += 1
+        chronological_dates = chronological_returns['Dates'].values
+        chronological_values = chronological_returns.iloc[:, 1:].to_numpy(dtype=np.float64)
+        
+        return(self.expanding_turbulence(chronological_values=chronological_values,
+                                         chronological_dates=chronological_dates,
+                                         initial_window_size=initial_window_size,
+                                         refresh_interval=refresh_interval, half_life=half_life,
+                                         covariance_estimator=covariance_estimator,
+                                         covariance_options=covariance_options,
+                                         attribution=attribution))
+    
+    
+    def expanding_covariance(self, covariance_estimator='sample', refresh_interval=52,
+                             covariance_options=None):
+        """
+        Purpose: create the running covariance statistics used by Turbulence.
+        
+        Output: a covariance.ExpandingCovariance ("sample"),
+        covariance.ShrinkageExpandingCovariance ("ledoit_wolf"),
+        covariance.ExponentialCovariance ("exponential") or
+        covariance.RollingWindowCovariance ("rolling"), not fitted yet.
+        
+        "covariance_options": dictionary, extra arguments of the estimator.
+        """
+        import src.covariance as cov
+        
+        estimators = {'sample': cov.ExpandingCovariance,
+                      'ledoit_wolf': cov.ShrinkageExpandingCovariance,
+                      'exponential': cov.ExponentialCovariance,
+                      'rolling': cov.RollingWindowCovariance}
+        if covariance_estimator not in estimators:
+            raise ValueError('Unknown covariance estimator "{}".'.format(covariance_estimator))
+        
+        return(estimators[covariance_estimator](refresh_interval=refresh_interval,
+                                                **(covariance_options or {})))
+    
+    
+    def expanding_turbulence(self, chronological_values, chronological_dates,
+                             initial_window_size=250, refresh_interval=52, half_life=12,
+                             covariance_estimator='sample', covariance_options=None,
+                             attribution=False):
+        """
+        Purpose: calculate the Turbulence of the asset pool from its returns as
+        arrays in chronological order (see calculate_turbulence for the other
+        arguments).
+        
+        Output: a dictionary containing the Turbulence values and their date-stamps.
+        
+        "chronological_values": 2-D array, the returns (rows) of each asset (columns).
+        
+        "chronological_dates": 1-D array, the date-stamp of each row.
+        """
+        import numpy as np
+        
+        window_size = int(initial_window_size)
+        self.turbulence = {'Dates': [], 'Raw Turbulence': [], 'Recession': []}
+        self.turbulence_attribution = None
+        if attribution:
+            self.turbulence_attribution = np.zeros((max(0, len(chronological_values) - window_size),
+                                                    chronological_values.shape[1]))
+        if window_size < len(chronological_values):
+            self.turbulence_sample = self.expanding_covariance(covariance_estimator=covariance_estimator,
+                                                               refresh_interval=refresh_interval,
+                                                               covariance_options=covariance_options)
+            self.turbulence_sample.fit(chronological_values[:window_size])
+            for current_row in range(window_size, len(chronological_values)):
+                contributions = (None if self.turbulence_attribution is None
+                                 else self.turbulence_attribution[current_row - window_size])
+                turbulence = self.turbulence_sample.score_and_update(chronological_values[current_row],
+                                                                     contributions=contributions)
+                self.turbulence['Raw Turbulence'].append(turbulence)
+            self.turbulence['Dates'] = list(chronological_dates[window_size:])
+            self.turbulence['Recession'] = self.recession_series(dates=self.turbulence['Dates'])
             
         self.turbulence['Turbulence'] = self.exponential_smoother(raw_data=self.turbulence['Raw Turbulence'],
-                                                                  half_life=12)
+                                                                  half_life=half_life)
         return(self.turbulence)
+    
+    
+    def update_turbulence(self, returns):
+        """
+        Purpose: extend the Turbulence of the asset pool with new returns, starting
+        from the state left by calculate_turbulence (or restore_checkpoint). The
+        per-asset attribution is extended too, if it was calculated.
+        
+        Output: a dictionary containing the Turbulence values and their date-stamps.
+        
+        "returns": dataframe, the new returns of the asset pool only (in reverse
+        chronological order).
+        """
+        import numpy as np
+        
+        chronological_returns = returns.iloc[::-1]
+        new_dates = list(chronological_returns['Dates'].values)
+        new_values = chronological_returns.iloc[:, 1:].to_numpy(dtype=np.float64)
+        
+        if self.turbulence_attribution is None:
+            raw_turbulence = [self.turbulence_sample.score_and_update(current_data)
+                              for current_data in new_values]
+        else:
+            new_attribution = np.zeros(new_values.shape)
+            raw_turbulence = [self.turbulence_sample.score_and_update(current_data,
+                                                                      contributions=contributions)
+                              for current_data, contributions in zip(new_values, new_attribution)]
+            self.turbulence_attribution = np.concatenate([self.turbulence_attribution, new_attribution])
+        self.turbulence['Raw Turbulence'].extend(raw_turbulence)
+        self.turbulence['Turbulence'].extend(self.smoother_state.extend(raw_turbulence))
+        self.turbulence['Dates'].extend(new_dates)
+        self.turbulence['Recession'].extend(self.recession_series(dates=new_dates))
+        
+        return(self.turbulence)
+
+
+    def scenario_scorer(self, columns=None):
+        """
+        Purpose: create a scorer for hypothetical return scenarios, against the
+        latest Turbulence covariance estimate and Raw Turbulence history (after
+        calculate_turbulence, update_turbulence or restore_checkpoint).
+        
+        Output: a scenarios.ScenarioScorer.
+        
+        "columns": list, the asset names, in the order of the returns columns.
+        """
+        import src.scenarios as scn
+        
+        if self.turbulence_sample is None:
+            raise ValueError('Calculate Turbulence (or restore a checkpoint) before scoring scenarios.')
+        return(scn.ScenarioScorer(turbulence_sample=self.turbulence_sample,
+                                  raw_turbulence=self.turbulence['Raw Turbulence'],
+                                  columns=columns))
+
+
+    def gini_coefficients(self, values, presorted=False):
+        """
+        Purpose: calculate the Gini coefficient for each row of a two-dimensional
+        set of values, using the closed-form sorted-rank formula:
+        
+            Gini = 1 - 2 * sum_i ((n - i + 1) * x_(i)) / ((n + 1) * sum_i x_(i))
+        
+        where x_(1) <= ... <= x_(n). This is the ratio of the area between the
+        line of equality and the Lorenz curve to the area under the line of equality,
+        with both curves sampled at n points.
+        
+        Output: a 1-D array containing the Gini coefficient of each row.
+        
+        "values": 2-D array (rows x values), the values on which to calculate the
+        Gini coefficients.
+        
+        "presorted": boolean, True if each row of "values" is already sorted in
+        ascending order (e.g. the output of np.linalg.eigvalsh).
+        """
+        import numpy as np
+        
+        values = np.asarray(values, dtype=np.float64)
+        if not presorted:
+            values = np.sort(values, axis=-1)
+        
+        value_count = values.shape[-1]
+        lorenz_weights = np.arange(value_count, 0, -1, dtype=np.float64)
+        lorenz_area = values @ lorenz_weights
+        equality_area = (value_count + 1) * values.sum(axis=-1) / 2
+        
+        return(1 - lorenz_area / equality_area)
 
 
     def gini(self, values):
@@ -116,28 +403,15 @@ class Calculate:
         "values": iterable, the values on which to calculate the Gini coefficient.
         The data in "values" does not have to be sorted in ascending or descending order.
         """
-        
-        values = list(values)
-        values.sort()
-        
-        minimum_value = values[0]
-        lorenz_curve_value = minimum_value
-        average_input = sum(values)/len(values)
-        line_of_equality = [average_input]
-        gap_area = [line_of_equality[0] - lorenz_curve_value]
-        
-        for index in range(1, len(values)):
-            lorenz_curve_value += values[index]
-            line_of_equality.append(line_of_equality[index - 1] + average_input)
-            gap_area.append(line_of_equality[index - 1] + average_input
-                            - lorenz_curve_value)
-        
-        return(sum(gap_area)/sum(line_of_equality))
+        return(float(self.gini_coefficients(values=[list(values)])[0]))
     
     
-    def calculate_systemic_risk(self, returns, window_size=250):
+    def calculate_systemic_risk(self, returns, window_size=250,
+                                max_chunk_bytes=64 * 2**20, spectral_indicators=None):
         """
-        Purpose: calculate the Systemic Risk of the asset pool.
+        Purpose: calculate the Systemic Risk of the asset pool, and optionally
+        other indicators of the same window spectra (kept in
+        "self.spectral_indicators", with their own "Dates").
         
         Output: a dictionary containing the Systemic Risk values and their date-stamps.
         
@@ -147,23 +421,206 @@ class Calculate:
         "window_size": integer, the window size used to calculate
         the covariance matrix. This window size shifts forward as the analysis proceeds
         across time.
-        """
         
+        "max_chunk_bytes": integer, the memory budget for each batch of stacked
+        window covariance matrices (see covariance.SlidingWindowCovariances).
+        
+        "spectral_indicators": list, the names of the other indicators of
+        spectral.SpectralIndicators to calculate (e.g. "Absorption Ratio",
+        "Top Eigenvalue Share", "Effective Rank"). Each one reuses the
+        eigenvalues calculated for Systemic Risk.
+        """
         import numpy as np
-        import copy
         
+        window_size = int(window_size)
         self.systemic_risk = {'Dates': [], 'Systemic Risk': [], 'Recession': []}
         chronological_returns = returns.iloc[::-1]
+        chronological_dates = chronological_returns['Dates'].values
+        chronological_values = chronological_returns.iloc[:, 1:].to_numpy(dtype=np.float64)
+        
+        # New returns: spectra cached for earlier returns may not apply.
+        self.spectral_layer = None
+        self.systemic_risk_window = chronological_values[-window_size:]
+        values, self.systemic_risk['Dates'] = self.windowed_spectral_indicators(
+            chronological_values=chronological_values, chronological_dates=chronological_dates,
+            first_endpoint=window_size, window_size=window_size, max_chunk_bytes=max_chunk_bytes,
+            names=['Systemic Risk'] + list(spectral_indicators or []))
+        self.systemic_risk['Systemic Risk'] = values.pop('Systemic Risk')
+        self.systemic_risk['Recession'] = self.recession_series(dates=self.systemic_risk['Dates'])
+        self.spectral_indicators = {}
+        if len(values) > 0:
+            self.spectral_indicators = dict({'Dates': list(self.systemic_risk['Dates'])}, **values)
+            
+        return(self.systemic_risk)
+    
+    
+    def update_systemic_risk(self, returns, max_chunk_bytes=64 * 2**20):
+        """
+        Purpose: extend the Systemic Risk of the asset pool with new returns, using
+        the trailing window left by calculate_systemic_risk (or restore_checkpoint).
+        The other spectral indicators in "self.spectral_indicators" are extended too.
+        
+        Output: a dictionary containing the Systemic Risk values and their date-stamps.
+        
+        "returns": dataframe, the new returns of the asset pool only (in reverse
+        chronological order).
+        
+        "max_chunk_bytes": integer, the memory budget for each batch of stacked
+        window covariance matrices.
+        """
+        import numpy as np
+        
+        chronological_returns = returns.iloc[::-1]
+        window_size = len(self.systemic_risk_window)
+        chronological_values = np.concatenate([self.systemic_risk_window,
+                                               chronological_returns.iloc[:, 1:].to_numpy(dtype=np.float64)])
+        chronological_dates = np.concatenate([np.full(window_size, None, dtype=object),
+                                              chronological_returns['Dates'].values.astype(object)])
         
-        window_endpoint = copy.deepcopy(int(window_size))
-        while window_endpoint < len(chronological_returns):
-            covariance_matrix = chronological_returns.iloc[window_endpoint + 1 - window_size : window_endpoint + 1].cov()
-            eigenvalues = np.sort(np.linalg.eig(covariance_matrix)[0])
-            current_date = chronological_returns.iloc[window_endpoint, 0]
-            self.systemic_risk['Systemic Risk'].append(self.gini(values=eigenvalues))
-            self.systemic_risk['Dates'].append(current_date)
-            self.append_recession_series(current_date=current_date,
-                                         dataframe=self.systemic_risk)
-            window_endpoint += 1
+        self.systemic_risk_window = chronological_values[-window_size:]
+        names = [name for name in self.spectral_indicators if name != 'Dates']
+        values, new_dates = self.windowed_spectral_indicators(
+            chronological_values=chronological_values, chronological_dates=chronological_dates,
+            first_endpoint=window_size, window_size=window_size, max_chunk_bytes=max_chunk_bytes,
+            names=['Systemic Risk'] + names)
+        self.systemic_risk['Systemic Risk'].extend(values.pop('Systemic Risk'))
+        self.systemic_risk['Dates'].extend(new_dates)
+        self.systemic_risk['Recession'].extend(self.recession_series(dates=new_dates))
+        for name, new_values in values.items():
+            self.spectral_indicators[name].extend(new_values)
+        if len(values) > 0:
+            self.spectral_indicators['Dates'].extend(new_dates)
+        
+        return(self.systemic_risk)
+    
+    
+    def windowed_systemic_risk(self, chronological_values, chronological_dates,
+                               first_endpoint, window_size, max_chunk_bytes,
+                               stop_endpoint=None):
+        """
+        Purpose: calculate the Systemic Risk (the Gini coefficient of the
+        eigenvalues of the covariance matrix) of every window ending at or after
+        "first_endpoint". For asset pools larger than the window, the eigenvalues
+        come from the smaller Gram matrix of each window (see
+        covariance.SlidingWindowCovariances.eigenvalue_chunks).
+        
+        Output: a tuple (Systemic Risk values, date-stamps), as lists.
+        
+        "stop_endpoint": integer, only windows ending before this row index are
+        calculated. Defaults to all windows.
+        """
+        values, dates = self.windowed_spectral_indicators(
+            chronological_values=chronological_values, chronological_dates=chronological_dates,
+            first_endpoint=first_endpoint, window_size=window_size,
+            max_chunk_bytes=max_chunk_bytes, stop_endpoint=stop_endpoint)
             
-        return(self.systemic_risk)
\ No newline at end of file
+        return(values['Systemic Risk'], dates)
+    
+    
+    def spectral_indicator_set(self):
+        """
+        Purpose: the indicators available to the spectral layer: Systemic Risk
+        (the Gini coefficient of the eigenvalues), those of
+        spectral.SpectralIndicators, and those added with add_spectral_indicator.
+        
+        Output: a spectral.SpectralIndicators object.
+        """
+        import functools
+        import src.spectral as spec
+        
+        indicators = spec.SpectralIndicators().add('Systemic Risk',
+                                                   functools.partial(self.gini_coefficients, presorted=True))
+        for name, function in self.spectral_functions.items():
+            indicators.add(name, function)
+        
+        return(indicators)
+    
+    
+    def windowed_spectral_indicators(self, chronological_values, chronological_dates,
+                                     first_endpoint, window_size, max_chunk_bytes,
+                                     names=('Systemic Risk',), stop_endpoint=None):
+        """
+        Purpose: calculate spectral indicators of every window ending at or after
+        "first_endpoint" (see windowed_systemic_risk), decomposing each window
+        once for all of them. The spectra are kept in "self.spectral_layer",
+        keyed by date, so later calls on the same windows skip the decomposition.
+        
+        Output: a tuple (values, date-stamps), where "values" is a dictionary
+        containing the list of values of each indicator.
+        
+        "names": list, the indicators to calculate (see spectral_indicator_set).
+        """
+        import src.spectral as spec
+        
+        if self.spectral_layer is None or self.spectral_layer.window_size != int(window_size):
+            self.spectral_layer = spec.SpectralLayer(window_size=window_size,
+                                                     max_chunk_bytes=max_chunk_bytes,
+                                                     indicators=self.spectral_indicator_set())
+        
+        return(self.spectral_layer.calculate(chronological_values, chronological_dates,
+                                             first_endpoint=first_endpoint,
+                                             stop_endpoint=stop_endpoint, names=names))
+    
+    
+    def add_spectral_indicator(self, name, function):
+        """
+        Purpose: add an indicator to the spectral layer, and calculate it for
+        every Systemic Risk date whose spectrum is still cached (NaN for the
+        others), without decomposing any window again. update_systemic_risk
+        extends it afterwards (the function is saved with the checkpoint).
+        
+        Output: a dictionary containing the spectral indicators and their date-stamps.
+        
+        "name": string, the name of the indicator.
+        
+        "function": callable, maps a (windows x k) array of eigenvalues, each row
+        in ascending order, to a 1-D array of values. It must be picklable (e.g.
+        a module-level function) to be saved with the checkpoint.
+        """
+        if self.spectral_layer is None:
+            raise ValueError('Calculate the Systemic Risk before adding spectral indicators.')
+        self.spectral_functions[str(name)] = function
+        self.spectral_layer.indicators.add(name, function)
+        values = self.spectral_layer.evaluate_cached(self.systemic_risk['Dates'], names=[name])
+        if 'Dates' not in self.spectral_indicators:
+            self.spectral_indicators['Dates'] = list(self.systemic_risk['Dates'])
+        self.spectral_indicators[name] = values[name].tolist()
+        
+        return(self.spectral_indicators)
+    
+    
+    def checkpoint(self):
+        """
+        Purpose: collect the state needed to extend both indicators later without
+        recalculating their history.
+        
+        Output: a dictionary containing the indicator series (and the functions
+        of the spectral indicators added with add_spectral_indicator), the
+        running covariance statistics, the per-asset attribution, the smoother
+        state and the trailing window.
+        """
+        return({'Turbulence': self.turbulence,
+                'Systemic Risk': self.systemic_risk,
+                'Spectral Indicators': self.spectral_indicators,
+                'Spectral Functions': self.spectral_functions,
+                'Turbulence Sample': self.turbulence_sample,
+                'Turbulence Attribution': self.turbulence_attribution,
+                'Smoother State': self.smoother_state,
+                'Systemic Risk Window': self.systemic_risk_window})
+    
+    
+    def restore_checkpoint(self, checkpoint):
+        """
+        Purpose: restore the state collected by checkpoint().
+        
+        "checkpoint": dictionary, the output of checkpoint().
+        """
+        self.turbulence = checkpoint['Turbulence']
+        self.systemic_risk = checkpoint['Systemic Risk']
+        self.spectral_indicators = checkpoint.get('Spectral Indicators', {})
+        self.spectral_functions = checkpoint.get('Spectral Functions', {})
+        self.spectral_layer = None
+        self.turbulence_sample = checkpoint['Turbulence Sample']
+        self.turbulence_attribution = checkpoint.get('Turbulence Attribution')
+        self.smoother_state = checkpoint['Smoother State']
+        self.systemic_risk_window = checkpoint['Systemic Risk Window']
@@ -0,0 +1,1037 @@
+"""
+This module contains the covariance estimators used by the Turbulence and
+Systemic Risk indicators.
+
+The estimators copy their samples to C-contiguous arrays first, so that results
+do not depend on the memory layout of the input (e.g. the column-major values
+of a dataframe, or a row-major copy in shared memory) and are bit-identical
+across the serial and parallel paths.
+"""
+import numpy as np
+
+
+class ExpandingCovariance:
+    """
+    Tracks the mean, the covariance matrix and the inverse covariance matrix of
+    an expanding sample, one observation at a time.
+
+    The inverse is carried forward with Sherman-Morrison rank-1 updates (O(k^2)
+    per observation instead of O(k^3)), and is rebuilt exactly with
+    np.linalg.pinv every "refresh_interval" observations to stop numerical drift.
+    """
+
+
+    def __init__(self, refresh_interval=52):
+        """
+        "refresh_interval": integer, the number of rank-1 updates between exact
+        rebuilds of the inverse covariance matrix.
+        """
+        self.refresh_interval = int(refresh_interval)
+        self.count = 0
+        self.mean = None
+        self.scatter = None
+        self.scatter_inverse = None
+        self.updates_since_refresh = 0
+
+
+    def fit(self, sample):
+        """
+        Purpose: (re)initialize the running statistics from a full sample.
+
+        "sample": 2-D array, the observations (rows) of each asset (columns),
+        in chronological order.
+        """
+        sample = np.ascontiguousarray(sample, dtype=np.float64)
+        self.count = len(sample)
+        self.mean = sample.mean(axis=0)
+        demeaned_sample = sample - self.mean
+        self.scatter = demeaned_sample.T @ demeaned_sample
+        self.refresh()
+
+        return(self)
+
+
+    def refresh(self):
+        """
+        Purpose: rebuild the inverse of the scatter matrix exactly.
+        """
+        self.scatter_inverse = np.linalg.pinv(self.scatter)
+        self.updates_since_refresh = 0
+
+
+    def inverse_covariance(self):
+        """
+        Purpose: the inverse of the sample covariance matrix (ddof=1).
+        """
+        return((self.count - 1) * self.scatter_inverse)
+
+
+    def score(self, observation):
+        """
+        Purpose: calculate the squared Mahalanobis distance of "observation"
+        from the current sample.
+
+        Output: the squared Mahalanobis distance, as a float object.
+
+        "observation": 1-D array, the values of each asset.
+        """
+        deviation = np.asarray(observation, dtype=np.float64) - self.mean
+        return(float((self.count - 1) * (deviation @ self.scatter_inverse @ deviation)))
+
+
+    def whitening_matrix(self):
+        """
+        Purpose: a matrix W such that the squared Mahalanobis distance of a
+        deviation d (a row vector) from the current mean is ||d @ W||^2, so that
+        many observations can be scored with one matrix product. W is built from
+        the eigenvalue decomposition of the covariance matrix, exactly at the
+        current state; as with np.linalg.pinv, directions with no variance are
+        left out.
+
+        Output: a (k x rank) array.
+        """
+        eigenvalues, eigenvectors = np.linalg.eigh(self.scatter / (self.count - 1))
+        kept = eigenvalues > 1e-15 * max(eigenvalues.max(), 0.0)
+        return(eigenvectors[:, kept] / np.sqrt(eigenvalues[kept]))
+
+
+    def update(self, observation):
+        """
+        Purpose: add "observation" to the sample.
+
+        "observation": 1-D array, the values of each asset.
+        """
+        self.score_and_update(observation)
+
+
+    def score_and_update(self, observation, contributions=None):
+        """
+        Purpose: calculate the squared Mahalanobis distance of "observation"
+        from the current sample, then add "observation" to the sample (Welford
+        update of the mean and scatter matrix, Sherman-Morrison update of the
+        inverse scatter matrix). Both steps share the same projected deviation.
+
+        Output: the squared Mahalanobis distance, as a float object.
+
+        "observation": 1-D array, the values of each asset.
+
+        "contributions": 1-D array (k), if given, is filled with the contribution
+        of each asset to the distance, deviation_i * (inverse covariance @
+        deviation)_i. The contributions sum to the distance.
+        """
+        observation = np.asarray(observation, dtype=np.float64)
+        deviation = observation - self.mean
+        projected_deviation = self.scatter_inverse @ deviation
+        quadratic_form = deviation @ projected_deviation
+
+        weight = self.count / (self.count + 1)
+        distance = float((self.count - 1) * quadratic_form)
+        if contributions is not None:
+            np.multiply(deviation, (self.count - 1) * projected_deviation, out=contributions)
+        self.count += 1
+        self.mean = self.mean + deviation / self.count
+        self.scatter = self.scatter + weight * np.outer(deviation, deviation)
+
+        self.updates_since_refresh += 1
+        if self.updates_since_refresh >= self.refresh_interval:
+            self.refresh()
+        else:
+            self.scatter_inverse = (self.scatter_inverse
+                - (weight / (1 + weight * quadratic_form))
+                * np.outer(projected_deviation, projected_deviation))
+
+        return(distance)
+
+
+
+class ShrinkageExpandingCovariance:
+    """
+    Tracks the mean and the Ledoit-Wolf shrinkage estimate of the covariance
+    matrix of an expanding sample, one observation at a time:
+
+        shrunk covariance = shrinkage * mu * I + (1 - shrinkage) * S
+
+    where S is the sample covariance matrix (ddof=0), mu is the average variance
+    and the shrinkage intensity is estimated from the sample (Ledoit and Wolf,
+    2004). Unlike S, the shrunk covariance matrix is well-conditioned and
+    invertible even when there are fewer observations than assets.
+
+    Only running moments are kept (O(k^2) memory, whatever the sample length),
+    and each observation costs O(k^2): the sum of outer products is updated in
+    place with the BLAS routine dsyr (upper triangle only). The shrunk covariance
+    matrix is re-estimated and its Cholesky factor rebuilt (O(k^3)) every
+    "refresh_interval" observations, and held fixed in between, while the mean
+    is kept current.
+    """
+
+
+    def __init__(self, refresh_interval=52):
+        """
+        "refresh_interval": integer, the number of observations between
+        re-estimations of the shrunk covariance matrix and its inverse.
+        """
+        self.refresh_interval = int(refresh_interval)
+        self.count = 0
+        self.shift = None
+        self.sums = None
+        self.products = None
+        self.squared_norms = 0.0
+        self.weighted_sums = None
+        self.fourth_powers = 0.0
+        self.mean = None
+        self.shrinkage = None
+        self.covariance_factor = None
+        self.updates_since_refresh = 0
+
+
+    def fit(self, sample):
+        """
+        Purpose: (re)initialize the running moments from a full sample. The
+        moments are taken around the mean of this sample ("shift"), which limits
+        cancellation when they are combined.
+
+        "sample": 2-D array, the observations (rows) of each asset (columns),
+        in chronological order.
+        """
+        sample = np.ascontiguousarray(sample, dtype=np.float64)
+        self.count = len(sample)
+        self.shift = sample.mean(axis=0)
+        shifted_sample = sample - self.shift
+        squared_norms = np.einsum('ti,ti->t', shifted_sample, shifted_sample)
+        self.sums = shifted_sample.sum(axis=0)
+        self.products = np.asfortranarray(shifted_sample.T @ shifted_sample)
+        self.squared_norms = float(squared_norms.sum())
+        self.weighted_sums = squared_norms @ shifted_sample
+        self.fourth_powers = float(squared_norms @ squared_norms)
+        self.mean = self.shift + self.sums / self.count
+        self.refresh()
+
+        return(self)
+
+
+    def refresh(self):
+        """
+        Purpose: re-estimate the shrinkage intensity and rebuild the (upper)
+        Cholesky factor of the shrunk covariance matrix from the running moments.
+        """
+        from scipy import linalg
+        
+        count = self.count
+        asset_count = len(self.sums)
+        centred_mean = self.sums / count
+        products = np.triu(self.products) + np.triu(self.products, k=1).T
+        covariance = (products - count * np.outer(centred_mean, centred_mean)) / count
+        average_variance = np.trace(covariance) / asset_count
+        squared_norm = np.einsum('ij,ij->', covariance, covariance)
+        # Sum over observations of ||x - mean||^4, expanded into the running moments.
+        mean_norm = centred_mean @ centred_mean
+        fourth_powers = (self.fourth_powers + count * mean_norm**2
+                         + 4 * (centred_mean @ products @ centred_mean)
+                         + 2 * mean_norm * self.squared_norms
+                         - 4 * (centred_mean @ self.weighted_sums)
+                         - 4 * mean_norm * (centred_mean @ self.sums))
+
+        dispersion = squared_norm - asset_count * average_variance**2
+        estimation_error = min(max((fourth_powers - count * squared_norm) / count**2, 0.0),
+                               dispersion)
+        self.shrinkage = float(estimation_error / dispersion) if dispersion > 0 else 1.0
+
+        shrunk_covariance = (1 - self.shrinkage) * covariance
+        shrunk_covariance.flat[::asset_count + 1] += self.shrinkage * average_variance
+        self.covariance_factor = linalg.cholesky(shrunk_covariance, lower=False,
+                                                 check_finite=False)
+        self.updates_since_refresh = 0
+
+
+    def inverse_covariance(self):
+        """
+        Purpose: the inverse of the shrunk covariance matrix.
+        """
+        from scipy import linalg
+        
+        identity = np.eye(len(self.covariance_factor))
+        return(linalg.cho_solve((self.covariance_factor, False), identity, check_finite=False))
+
+
+    def score(self, observation, contributions=None):
+        """
+        Purpose: calculate the squared Mahalanobis distance of "observation"
+        from the current sample, under the shrunk covariance matrix.
+
+        Output: the squared Mahalanobis distance, as a float object.
+
+        "observation": 1-D array, the values of each asset.
+
+        "contributions": 1-D array (k), if given, is filled with the contribution
+        of each asset to the distance (see ExpandingCovariance.score_and_update),
+        at the cost of a second triangular solve.
+        """
+        from scipy import linalg
+        
+        deviation = np.asarray(observation, dtype=np.float64) - self.mean
+        whitened_deviation = linalg.solve_triangular(self.covariance_factor, deviation,
+                                                     trans='T', check_finite=False)
+        if contributions is not None:
+            np.multiply(deviation, linalg.solve_triangular(self.covariance_factor, whitened_deviation,
+                                                           check_finite=False),
+                        out=contributions)
+        return(float(whitened_deviation @ whitened_deviation))
+
+
+    def whitening_matrix(self):
+        """
+        Purpose: a matrix W such that the squared Mahalanobis distance of a
+        deviation d (a row vector) from the current mean is ||d @ W||^2, so that
+        many observations can be scored with one matrix product. W is the inverse
+        of the current Cholesky factor.
+
+        Output: a (k x k) array.
+        """
+        from scipy import linalg
+        
+        identity = np.eye(len(self.covariance_factor))
+        return(linalg.solve_triangular(self.covariance_factor, identity, check_finite=False))
+
+
+    def update(self, observation):
+        """
+        Purpose: add "observation" to the sample.
+
+        "observation": 1-D array, the values of each asset.
+        """
+        from scipy.linalg import blas
+        
+        shifted_observation = np.asarray(observation, dtype=np.float64) - self.shift
+        squared_norm = float(shifted_observation @ shifted_observation)
+        self.count += 1
+        self.sums += shifted_observation
+        self.products = blas.dsyr(1.0, shifted_observation, a=self.products, overwrite_a=True)
+        self.squared_norms += squared_norm
+        self.weighted_sums += squared_norm * shifted_observation
+        self.fourth_powers += squared_norm**2
+        self.mean = self.shift + self.sums / self.count
+
+        self.updates_since_refresh += 1
+        if self.updates_since_refresh >= self.refresh_interval:
+            self.refresh()
+
+
+    def score_and_update(self, observation, contributions=None):
+        """
+        Purpose: calculate the squared Mahalanobis distance of "observation"
+        from the current sample, then add "observation" to the sample.
+
+        Output: the squared Mahalanobis distance, as a float object.
+
+        "observation": 1-D array, the values of each asset.
+
+        "contributions": 1-D array (k), if given, is filled with the contribution
+        of each asset to the distance (see score).
+        """
+        distance = self.score(observation, contributions=contributions)
+        self.update(observation)
+
+        return(distance)
+
+
+
+class ExponentialCovariance:
+    """
+    Tracks the exponentially weighted mean, covariance matrix and inverse
+    covariance matrix of a sample, one observation at a time. The weight of each
+    observation halves every "half_life" observations, so the estimate keeps
+    adapting however long the history is:
+
+        mean' = mean + alpha * d
+        covariance' = (1 - alpha) * (covariance + alpha * d d')
+
+    where d = observation - mean and alpha = 1 - exp(ln(0.5) / half_life). The
+    inverse is carried forward with Sherman-Morrison rank-1 updates (O(k^2) per
+    observation), and rebuilt exactly with np.linalg.pinv every
+    "refresh_interval" observations to stop numerical drift.
+    """
+
+
+    def __init__(self, half_life=52, refresh_interval=52):
+        """
+        "half_life": float, the number of observations over which the weight of
+        an observation halves.
+        
+        "refresh_interval": integer, the number of rank-1 updates between exact
+        rebuilds of the inverse covariance matrix.
+        """
+        self.half_life = float(half_life)
+        self.smoothing_factor = 1 - np.exp(np.log(0.5) / self.half_life)
+        self.refresh_interval = int(refresh_interval)
+        self.count = 0
+        self.mean = None
+        self.covariance = None
+        self.covariance_inverse = None
+        self.updates_since_refresh = 0
+
+
+    def fit(self, sample):
+        """
+        Purpose: (re)initialize the statistics from the (equally weighted) mean
+        and covariance matrix (ddof=1) of a full sample.
+
+        "sample": 2-D array, the observations (rows) of each asset (columns),
+        in chronological order.
+        """
+        sample = np.ascontiguousarray(sample, dtype=np.float64)
+        self.count = len(sample)
+        self.mean = sample.mean(axis=0)
+        demeaned_sample = sample - self.mean
+        self.covariance = (demeaned_sample.T @ demeaned_sample) / (self.count - 1)
+        self.refresh()
+
+        return(self)
+
+
+    def refresh(self):
+        """
+        Purpose: rebuild the inverse of the covariance matrix exactly.
+        """
+        self.covariance_inverse = np.linalg.pinv(self.covariance)
+        self.updates_since_refresh = 0
+
+
+    def inverse_covariance(self):
+        """
+        Purpose: the inverse of the exponentially weighted covariance matrix.
+        """
+        return(self.covariance_inverse)
+
+
+    def score(self, observation):
+        """
+        Purpose: calculate the squared Mahalanobis distance of "observation"
+        from the current mean, under the current covariance matrix.
+
+        Output: the squared Mahalanobis distance, as a float object.
+
+        "observation": 1-D array, the values of each asset.
+        """
+        deviation = np.asarray(observation, dtype=np.float64) - self.mean
+        return(float(deviation @ self.covariance_inverse @ deviation))
+
+
+    def whitening_matrix(self):
+        """
+        Purpose: a matrix W such that the squared Mahalanobis distance of a
+        deviation d (a row vector) from the current mean is ||d @ W||^2 (see
+        ExpandingCovariance.whitening_matrix).
+
+        Output: a (k x rank) array.
+        """
+        eigenvalues, eigenvectors = np.linalg.eigh(self.covariance)
+        kept = eigenvalues > 1e-15 * max(eigenvalues.max(), 0.0)
+        return(eigenvectors[:, kept] / np.sqrt(eigenvalues[kept]))
+
+
+    def update(self, observation):
+        """
+        Purpose: add "observation" to the sample.
+
+        "observation": 1-D array, the values of each asset.
+        """
+        self.score_and_update(observation)
+
+
+    def score_and_update(self, observation, contributions=None):
+        """
+        Purpose: calculate the squared Mahalanobis distance of "observation"
+        from the current mean, then add "observation" to the sample. Both steps
+        share the same projected deviation.
+
+        Output: the squared Mahalanobis distance, as a float object.
+
+        "observation": 1-D array, the values of each asset.
+
+        "contributions": 1-D array (k), if given, is filled with the contribution
+        of each asset to the distance (see ExpandingCovariance.score_and_update).
+        """
+        observation = np.asarray(observation, dtype=np.float64)
+        deviation = observation - self.mean
+        projected_deviation = self.covariance_inverse @ deviation
+        quadratic_form = deviation @ projected_deviation
+        if contributions is not None:
+            np.multiply(deviation, projected_deviation, out=contributions)
+
+        smoothing_factor = self.smoothing_factor
+        retention = 1 - smoothing_factor
+        self.count += 1
+        self.mean = self.mean + smoothing_factor * deviation
+        self.covariance = retention * (self.covariance
+                                       + smoothing_factor * np.outer(deviation, deviation))
+
+        self.updates_since_refresh += 1
+        if self.updates_since_refresh >= self.refresh_interval:
+            self.refresh()
+        else:
+            self.covariance_inverse = (self.covariance_inverse
+                - (smoothing_factor / (1 + smoothing_factor * quadratic_form))
+                * np.outer(projected_deviation, projected_deviation)) / retention
+
+        return(float(quadratic_form))
+
+
+
+class RollingWindowCovariance:
+    """
+    Tracks the mean, the covariance matrix and the inverse covariance matrix of
+    the last "window_size" observations, one observation at a time.
+
+    Each new observation is added to the mean and scatter matrix (Welford) and,
+    once the window is full, the oldest one is removed; the inverse scatter
+    matrix follows with two
+    Sherman-Morrison rank-1 updates (O(k^2) per observation). Removing
+    observations loses precision faster than adding them, so every
+    "refresh_interval" observations the scatter matrix is rebuilt from the
+    window, and its inverse with np.linalg.pinv.
+    """
+
+
+    def __init__(self, window_size=None, refresh_interval=52):
+        """
+        "window_size": integer, the number of observations in the window.
+        Defaults to the length of the sample passed to fit. If the sample is
+        shorter, the window grows until it holds "window_size" observations.
+        
+        "refresh_interval": integer, the number of observations between exact
+        rebuilds of the scatter matrix and its inverse.
+        """
+        self.window_size = None if window_size is None else int(window_size)
+        self.refresh_interval = int(refresh_interval)
+        self.window = None
+        self.position = 0
+        self.count = 0
+        self.mean = None
+        self.scatter = None
+        self.scatter_inverse = None
+        self.updates_since_refresh = 0
+
+
+    def fit(self, sample):
+        """
+        Purpose: (re)initialize the window with the last "window_size"
+        observations of a full sample.
+
+        "sample": 2-D array, the observations (rows) of each asset (columns),
+        in chronological order.
+        """
+        sample = np.ascontiguousarray(sample, dtype=np.float64)
+        if self.window_size is None:
+            self.window_size = len(sample)
+        sample = sample[-self.window_size:]
+        self.window = np.zeros((self.window_size, sample.shape[1]))
+        self.window[:len(sample)] = sample
+        self.count = len(sample)
+        self.position = self.count % self.window_size
+        self.refresh()
+
+        return(self)
+
+
+    def chronological_window(self):
+        """
+        Purpose: the observations in the window, oldest first.
+        """
+        if self.count < self.window_size:
+            return(self.window[:self.count])
+        return(np.concatenate([self.window[self.position:], self.window[:self.position]]))
+
+
+    def refresh(self):
+        """
+        Purpose: rebuild the mean, the scatter matrix and its inverse exactly
+        from the window.
+        """
+        window = self.window[:self.count]
+        self.mean = window.mean(axis=0)
+        demeaned_window = window - self.mean
+        self.scatter = demeaned_window.T @ demeaned_window
+        self.scatter_inverse = np.linalg.pinv(self.scatter)
+        self.updates_since_refresh = 0
+
+
+    def inverse_covariance(self):
+        """
+        Purpose: the inverse of the sample covariance matrix (ddof=1) of the window.
+        """
+        return((self.count - 1) * self.scatter_inverse)
+
+
+    def score(self, observation):
+        """
+        Purpose: calculate the squared Mahalanobis distance of "observation"
+        from the window.
+
+        Output: the squared Mahalanobis distance, as a float object.
+
+        "observation": 1-D array, the values of each asset.
+        """
+        deviation = np.asarray(observation, dtype=np.float64) - self.mean
+        return(float((self.count - 1) * (deviation @ self.scatter_inverse @ deviation)))
+
+
+    def whitening_matrix(self):
+        """
+        Purpose: a matrix W such that the squared Mahalanobis distance of a
+        deviation d (a row vector) from the current mean is ||d @ W||^2 (see
+        ExpandingCovariance.whitening_matrix).
+
+        Output: a (k x rank) array.
+        """
+        eigenvalues, eigenvectors = np.linalg.eigh(self.scatter / (self.count - 1))
+        kept = eigenvalues > 1e-15 * max(eigenvalues.max(), 0.0)
+        return(eigenvectors[:, kept] / np.sqrt(eigenvalues[kept]))
+
+
+    def update(self, observation):
+        """
+        Purpose: add "observation" to the window, and remove the oldest one.
+
+        "observation": 1-D array, the values of each asset.
+        """
+        self.score_and_update(observation)
+
+
+    def score_and_update(self, observation, contributions=None):
+        """
+        Purpose: calculate the squared Mahalanobis distance of "observation"
+        from the window, then add "observation" to the window and remove the
+        oldest one (once the window is full).
+
+        Output: the squared Mahalanobis distance, as a float object.
+
+        "observation": 1-D array, the values of each asset.
+
+        "contributions": 1-D array (k), if given, is filled with the contribution
+        of each asset to the distance (see ExpandingCovariance.score_and_update).
+        """
+        observation = np.asarray(observation, dtype=np.float64)
+        count = self.count
+        deviation = observation - self.mean
+        projected_deviation = self.scatter_inverse @ deviation
+        quadratic_form = deviation @ projected_deviation
+        distance = float((count - 1) * quadratic_form)
+        if contributions is not None:
+            np.multiply(deviation, (count - 1) * projected_deviation, out=contributions)
+
+        window_full = count == self.window_size
+        oldest_observation = self.window[self.position].copy()
+        self.window[self.position] = observation
+        self.position = (self.position + 1) % self.window_size
+        if not window_full:
+            self.count += 1
+        self.updates_since_refresh += 1
+        if self.updates_since_refresh >= self.refresh_interval:
+            self.refresh()
+            return(distance)
+
+        # Add the new observation (count -> count + 1).
+        added_weight = count / (count + 1)
+        self.mean = self.mean + deviation / (count + 1)
+        self.scatter = self.scatter + added_weight * np.outer(deviation, deviation)
+        self.scatter_inverse = (self.scatter_inverse
+            - (added_weight / (1 + added_weight * quadratic_form))
+            * np.outer(projected_deviation, projected_deviation))
+        if not window_full:
+            return(distance)
+        # Remove the oldest observation (count + 1 -> count).
+        removed_deviation = oldest_observation - self.mean
+        removed_weight = (count + 1) / count
+        self.mean = self.mean - removed_deviation / count
+        self.scatter = self.scatter - removed_weight * np.outer(removed_deviation, removed_deviation)
+        projected_removed = self.scatter_inverse @ removed_deviation
+        self.scatter_inverse = (self.scatter_inverse
+            + (removed_weight / (1 - removed_weight * (removed_deviation @ projected_removed)))
+            * np.outer(projected_removed, projected_removed))
+
+        return(distance)
+
+
+
+class RollingCovariance:
+    """
+    Tracks the covariance matrix of a fixed-length window of observations, one
+    observation at a time. Each new observation is added to the running sums
+    (of the observations and of their outer products) and the oldest one is
+    removed, in O(k^2). The sums are rebuilt exactly from the window every
+    "window_size" observations, so rounding errors never build up.
+    """
+
+
+    def __init__(self, window):
+        """
+        "window": 2-D array, the observations (rows) of each asset (columns) in
+        the current window, in chronological order.
+        """
+        self.window = np.array(window, dtype=np.float64, order='C')
+        self.window_size = len(self.window)
+        self.position = 0
+        self.refresh()
+
+
+    def refresh(self):
+        """
+        Purpose: rebuild the running sums exactly, around the current mean of the
+        window (which limits cancellation).
+        """
+        self.shift = self.window.mean(axis=0)
+        shifted_window = self.window - self.shift
+        self.sums = shifted_window.sum(axis=0)
+        self.products = shifted_window.T @ shifted_window
+        self.updates_since_refresh = 0
+
+
+    def update(self, observation):
+        """
+        Purpose: add "observation" to the window, and remove the oldest one.
+
+        "observation": 1-D array, the values of each asset.
+        """
+        observation = np.asarray(observation, dtype=np.float64)
+        added_row = observation - self.shift
+        removed_row = self.window[self.position] - self.shift
+        self.sums += added_row - removed_row
+        self.products += np.outer(added_row, added_row) - np.outer(removed_row, removed_row)
+        self.window[self.position] = observation
+        self.position = (self.position + 1) % self.window_size
+
+        self.updates_since_refresh += 1
+        if self.updates_since_refresh >= self.window_size:
+            self.refresh()
+
+
+    def covariance(self):
+        """
+        Purpose: the covariance matrix (ddof=1) of the current window.
+        """
+        return((self.products - np.outer(self.sums, self.sums) / self.window_size)
+               / (self.window_size - 1))
+
+
+    def chronological_window(self):
+        """
+        Purpose: the observations of the current window, in chronological order.
+        """
+        return(np.roll(self.window, -self.position, axis=0))
+
+
+
+class SlidingWindowCovariances:
+    """
+    Calculates the covariance matrix of every fixed-length window of a sample in
+    batches, from cumulative sums of the observations and of their outer products.
+
+    Windows are produced in chunks so that the stacked (windows x k x k) arrays
+    stay under "max_chunk_bytes". Each chunk starts from an exact window sum, so
+    rounding errors from the cumulative sums never carry over between chunks.
+    Each chunk only needs the rows of its own windows (see window_covariances
+    and window_eigenvalues), so chunks can also be read from disk one at a time.
+    """
+
+
+    def __init__(self, window_size=250, max_chunk_bytes=64 * 2**20,
+                 eigenvalue_dtype=np.float64):
+        """
+        "window_size": integer, the number of observations in each window.
+        
+        "max_chunk_bytes": integer, the memory budget for one chunk of stacked
+        covariance matrices.
+        
+        "eigenvalue_dtype": numpy dtype, the precision of the eigenvalue
+        decompositions. np.float32 halves their memory and roughly halves their
+        time; the window sums are still accumulated in float64, and the
+        eigenvalues are returned as float64.
+        """
+        self.window_size = int(window_size)
+        self.max_chunk_bytes = int(max_chunk_bytes)
+        self.eigenvalue_dtype = np.dtype(eigenvalue_dtype)
+
+
+    def chunk_size(self, asset_count):
+        """
+        Purpose: the number of windows per chunk that fits in "max_chunk_bytes".
+        """
+        matrix_bytes = 8 * asset_count * asset_count
+        return(max(1, self.max_chunk_bytes // (2 * matrix_bytes)))
+
+
+    def endpoint_range(self, row_count, first_endpoint=None, stop_endpoint=None):
+        """
+        Purpose: apply the defaults of "first_endpoint" and "stop_endpoint" (see
+        covariance_chunks).
+        
+        Output: a tuple (first endpoint, stop endpoint).
+        """
+        if first_endpoint is None:
+            first_endpoint = self.window_size - 1
+        first_endpoint = max(int(first_endpoint), self.window_size - 1)
+        stop_endpoint = row_count if stop_endpoint is None else min(int(stop_endpoint), row_count)
+        
+        return(first_endpoint, stop_endpoint)
+
+
+    def covariance_chunks(self, sample, first_endpoint=None, stop_endpoint=None):
+        """
+        Purpose: calculate the covariance matrix (ddof=1) of each window
+        sample[endpoint + 1 - window_size : endpoint + 1].
+        
+        Output: a generator of (endpoints, covariance matrices) tuples, where
+        "endpoints" is a 1-D integer array and "covariance matrices" is a
+        (len(endpoints) x k x k) array.
+        
+        "sample": 2-D array, the observations (rows) of each asset (columns),
+        in chronological order.
+        
+        "first_endpoint": integer, the row index of the first window's last
+        observation. Defaults to "window_size" - 1.
+        
+        "stop_endpoint": integer, only windows whose last observation comes before
+        this row index are calculated. Defaults to len(sample). The chunks always
+        start at "first_endpoint" + a multiple of chunk_size(k), so a range of
+        windows split at chunk boundaries gives the same values as the whole range.
+        """
+        sample = np.ascontiguousarray(sample, dtype=np.float64)
+        window_size = self.window_size
+        first_endpoint, stop_endpoint = self.endpoint_range(len(sample), first_endpoint, stop_endpoint)
+        # Covariances are shift-invariant; centring first limits cancellation.
+        sample_mean = sample.mean(axis=0)
+        chunk_size = self.chunk_size(sample.shape[1])
+        
+        for chunk_start in range(first_endpoint, stop_endpoint, chunk_size):
+            chunk_stop = min(chunk_start + chunk_size, stop_endpoint)
+            rows = sample[chunk_start + 1 - window_size : chunk_stop] - sample_mean
+            yield(np.arange(chunk_start, chunk_stop), self.window_covariances(rows))
+
+
+    def window_covariances(self, rows):
+        """
+        Purpose: calculate the covariance matrix (ddof=1) of each window of
+        consecutive "rows", from the first full window to the last row.
+        
+        Output: a ((len(rows) - window_size + 1) x k x k) array.
+        
+        "rows": 2-D array, the (centred) observations of one chunk of windows.
+        """
+        window_size = self.window_size
+        first_window = rows[:window_size]
+        base_sums = first_window.sum(axis=0)
+        base_products = first_window.T @ first_window
+        
+        added_rows = rows[window_size:]
+        removed_rows = rows[:len(rows) - window_size]
+        sum_increments = np.cumsum(added_rows - removed_rows, axis=0)
+        product_increments = np.cumsum(np.einsum('ti,tj->tij', added_rows, added_rows)
+                                       - np.einsum('ti,tj->tij', removed_rows, removed_rows),
+                                       axis=0)
+        window_sums = np.concatenate([base_sums[None], base_sums + sum_increments])
+        window_products = np.concatenate([base_products[None],
+                                          base_products + product_increments])
+        
+        covariances = (window_products
+                       - np.einsum('ti,tj->tij', window_sums, window_sums) / window_size)
+        covariances /= (window_size - 1)
+        
+        return(covariances)
+
+
+    def symmetric_eigenvalues(self, matrices):
+        """
+        Purpose: the eigenvalues of a stack of symmetric matrices, calculated in
+        "eigenvalue_dtype".
+        
+        Output: a float64 array, each row in ascending order.
+        """
+        if self.eigenvalue_dtype == np.float64:
+            return(np.linalg.eigvalsh(matrices))
+        return(np.linalg.eigvalsh(matrices.astype(self.eigenvalue_dtype)).astype(np.float64))
+
+
+
+    def eigenvalue_chunk_size(self, asset_count):
+        """
+        Purpose: the number of windows per chunk used by eigenvalue_chunks.
+        """
+        if self.window_size >= asset_count:
+            return(self.chunk_size(asset_count))
+        window_bytes = 8 * self.window_size * asset_count
+        return(max(1, self.max_chunk_bytes // (2 * window_bytes)))
+
+
+    def window_eigenvalues(self, rows, sample_mean):
+        """
+        Purpose: calculate the eigenvalues of the covariance matrix (ddof=1) of
+        each window of consecutive "rows", from the first full window to the
+        last row.
+        
+        When the windows have fewer observations than there are assets (k), each
+        covariance matrix has rank "window_size" - 1 at most, and its non-zero
+        eigenvalues are those of the (window_size x window_size) Gram matrix of
+        the demeaned window. The smaller eigenproblem is solved instead, and the
+        remaining eigenvalues are zero.
+        
+        Output: a ((len(rows) - window_size + 1) x k) array, each row in
+        ascending order.
+        
+        "rows": 2-D array, the observations of one chunk of windows.
+        
+        "sample_mean": 1-D array, the mean of the whole sample, which the rows are
+        centred on before their covariance matrices are calculated.
+        """
+        window_size = self.window_size
+        asset_count = rows.shape[1]
+        if window_size >= asset_count:
+            return(self.symmetric_eigenvalues(self.window_covariances(rows - sample_mean)))
+        
+        window_offsets = np.arange(1 - window_size, 1)
+        windows = rows[np.arange(window_size - 1, len(rows))[:, None] + window_offsets]
+        windows -= windows.mean(axis=1, keepdims=True)
+        gram_matrices = windows @ windows.transpose(0, 2, 1)
+        gram_matrices /= (window_size - 1)
+        
+        eigenvalues = np.zeros((len(windows), asset_count))
+        eigenvalues[:, asset_count - window_size:] = self.symmetric_eigenvalues(gram_matrices)
+        return(np.sort(eigenvalues, axis=1))
+
+
+    def eigenvalue_chunks(self, sample, first_endpoint=None, stop_endpoint=None):
+        """
+        Purpose: calculate the eigenvalues of the covariance matrix (ddof=1) of
+        each window, as in covariance_chunks (see window_eigenvalues).
+        
+        Output: a generator of (endpoints, eigenvalues) tuples, where
+        "eigenvalues" is a (len(endpoints) x k) array, each row in ascending order.
+        """
+        sample = np.ascontiguousarray(sample, dtype=np.float64)
+        window_size = self.window_size
+        first_endpoint, stop_endpoint = self.endpoint_range(len(sample), first_endpoint, stop_endpoint)
+        sample_mean = sample.mean(axis=0) if window_size >= sample.shape[1] else None
+        chunk_size = self.eigenvalue_chunk_size(sample.shape[1])
+        
+        for chunk_start in range(first_endpoint, stop_endpoint, chunk_size):
+            chunk_stop = min(chunk_start + chunk_size, stop_endpoint)
+            rows = sample[chunk_start + 1 - window_size : chunk_stop]
+            yield(np.arange(chunk_start, chunk_stop), self.window_eigenvalues(rows, sample_mean))
+
+
+class MultiWindowCovariances:
+    """
+    Calculates the eigenvalues of the covariance matrices of every window, for
+    several window sizes at once (e.g. a parameter sweep).
+
+    Each chunk of window endpoints shares one cumulative sum of the observations
+    and of their outer products, starting from zero at the first row the largest
+    window needs. The sums of a window of any size ending in the chunk are then
+    the difference of two cumulative sums, so the O(k^2) outer products are
+    calculated once per row for all window sizes, instead of twice per row for
+    each window size. Window sizes smaller than the number of assets use the
+    Gram matrices of SlidingWindowCovariances.eigenvalue_chunks instead.
+    """
+
+
+    def __init__(self, window_sizes, max_chunk_bytes=64 * 2**20):
+        """
+        "window_sizes": iterable, the window sizes (integers).
+        
+        "max_chunk_bytes": integer, the memory budget for the cumulative sums of
+        one chunk (exceeded when a chunk has to hold the largest window).
+        """
+        self.window_sizes = sorted(set(int(window_size) for window_size in window_sizes))
+        self.max_chunk_bytes = int(max_chunk_bytes)
+
+
+    def chunk_size(self, asset_count):
+        """
+        Purpose: the number of window endpoints per chunk. A chunk holds at least
+        as many endpoints as the largest window, so that the rows shared with
+        the previous chunk are at most half of the cumulative sums.
+        """
+        matrix_bytes = 8 * asset_count * asset_count
+        largest_window = self.window_sizes[-1]
+        return(max(largest_window, self.max_chunk_bytes // (2 * matrix_bytes) - largest_window))
+
+
+    def eigenvalue_chunks(self, sample, skip_windows=0):
+        """
+        Purpose: calculate the eigenvalues of the covariance matrix (ddof=1) of
+        each window sample[endpoint + 1 - window_size : endpoint + 1], for each
+        window size.
+        
+        Output: a generator of (window size, endpoints, eigenvalues) tuples, where
+        "eigenvalues" is a (len(endpoints) x k) array, each row in ascending order.
+        
+        "sample": 2-D array, the observations (rows) of each asset (columns),
+        in chronological order.
+        
+        "skip_windows": integer, the number of windows skipped at the start of
+        the sample for every window size (the first endpoint is
+        window_size - 1 + skip_windows).
+        """
+        sample = np.ascontiguousarray(sample, dtype=np.float64)
+        asset_count = sample.shape[1]
+        first_endpoints = {window_size: window_size - 1 + int(skip_windows)
+                           for window_size in self.window_sizes}
+        
+        for window_size in [size for size in self.window_sizes if size < asset_count]:
+            windows = SlidingWindowCovariances(window_size=window_size,
+                                               max_chunk_bytes=self.max_chunk_bytes)
+            for endpoints, eigenvalues in windows.eigenvalue_chunks(
+                    sample, first_endpoint=first_endpoints[window_size]):
+                yield(window_size, endpoints, eigenvalues)
+        
+        window_sizes = [size for size in self.window_sizes if size >= asset_count]
+        if len(window_sizes) == 0:
+            return
+        # Covariances are shift-invariant; centring first limits cancellation.
+        sample = sample - sample.mean(axis=0)
+        chunk_size = self.chunk_size(asset_count)
+        first_endpoint = min(first_endpoints[window_size] for window_size in window_sizes)
+        
+        for chunk_start in range(first_endpoint, len(sample), chunk_size):
+            chunk_stop = min(chunk_start + chunk_size, len(sample))
+            first_row = max(0, chunk_start + 1 - window_sizes[-1])
+            rows = sample[first_row:chunk_stop]
+            cumulative_sums = np.zeros((len(rows) + 1, asset_count))
+            np.cumsum(rows, axis=0, out=cumulative_sums[1:])
+            cumulative_products = np.zeros((len(rows) + 1, asset_count, asset_count))
+            np.einsum('ti,tj->tij', rows, rows, out=cumulative_products[1:])
+            np.cumsum(cumulative_products[1:], axis=0, out=cumulative_products[1:])
+            
+            for window_size in window_sizes:
+                endpoints = np.arange(max(chunk_start, first_endpoints[window_size]), chunk_stop)
+                if len(endpoints) == 0:
+                    continue
+                window_stops = endpoints + 1 - first_row
+                window_starts = window_stops - window_size
+                window_sums = cumulative_sums[window_stops] - cumulative_sums[window_starts]
+                covariances = cumulative_products[window_stops] - cumulative_products[window_starts]
+                covariances -= np.einsum('ti,tj->tij', window_sums, window_sums) / window_size
+                covariances /= (window_size - 1)
+                yield(window_size, endpoints, np.linalg.eigvalsh(covariances))
+
+
+#MIT License
+#
+#Copyright (c) 2019 Terrence Zhang
+#
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+#
+#The above copyright notice and this permission notice shall be included in all
+#copies or substantial portions of the Software.
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#SOFTWARE.
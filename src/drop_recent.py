@@ -1,9 +1,8 @@
 """
-Drops rows from the index_data.pkl dataframe.
+Drops rows from the prices store.
 """
-import pandas as pd
-
 import TurbulenceSuite_paths as path
+import src.price_store as store
 
 
 class DropRecent:
@@ -14,16 +13,15 @@ class DropRecent:
     
     def drop(self, rows_to_drop):
         """
-        Drop rows from the index_data.pkl dataframe.
+        Drop the most recent rows from the prices store.
         """
-        prices = pd.read_pickle(path.prices_path_current)
-        prices = prices.iloc[rows_to_drop:,]
-        prices.reset_index(inplace=True)
-        prices = prices.drop('index', axis=1)
-        prices.to_pickle(path.prices_path_current)
+        prices = store.PriceStore(path.prices_store_path)
+        if not prices.exists():
+            prices.migrate(path.prices_path_current)
+        prices.truncate(rows_to_drop=rows_to_drop)
         
         print('\nRemoved {} rows from "prices" dataframe'.format(rows_to_drop),
-              'and saved to {}'.format(path.prices_path_current))
+              'and saved to {}'.format(path.prices_store_path))
 
 
 #MIT License
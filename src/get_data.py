@@ -1,11 +1,16 @@
 """
 This module gets data from Yahoo Finance.
 """
+import os
 import re
-from io import StringIO
+import glob
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import requests as req
 import datetime as dt
 import time
+import codecs
 import pandas as pd
 
 
@@ -17,31 +22,43 @@ class YahooData:
     Correct headers: https://stackoverflow.com/questions/68259148/getting-404-error-for-certain-stocks-and-pages-on-yahoo-finance-python
     """
     timeout = 2
-    crumb_link = 'https://finance.yahoo.com/quote/{0}/history?p={0}'
+    crumb_base_url = 'https://finance.yahoo.com'
+    crumb_link = '{base_url}/quote/{0}/history?p={0}'
     crumble_regex = r'crumb:(.?),'
-    quote_link = 'https://query2.finance.yahoo.com/v8/finance/chart/{quote}?period1={dfrom}&period2={dto}&interval=1wk&events=history&crumb={crumb}'
+    quote_base_url = 'https://query2.finance.yahoo.com'
+    quote_link = '{base_url}/v8/finance/chart/{quote}?period1={dfrom}&period2={dto}&interval={interval}&events=history&crumb={crumb}'
 
 
-    def __init__(self, symbol, days_back=7):
+    def __init__(self, symbol, days_back=7, session=None, crumb=None, interval='1wk',
+                 base_url=None):
         """
         symbol: ticker symbol for the asset to be pulled.
+        session: requests.Session, shared across tickers (a new one if None).
+        crumb: the crumb already retrieved for "session" (retrieved if None).
+        interval: string, the bar interval ("1wk" or "1d").
+        base_url: string, the scheme and host serving both the crumb and the
+        quotes (e.g. a local mock server), instead of the Yahoo Finance hosts.
         Correct headers: https://stackoverflow.com/questions/68259148/getting-404-error-for-certain-stocks-and-pages-on-yahoo-finance-python
         """
         self.symbol = str(symbol)
-        self.session = req.Session()
+        if base_url is not None:
+            self.crumb_base_url = str(base_url).rstrip('/')
+            self.quote_base_url = str(base_url).rstrip('/')
+        self.session = req.Session() if session is None else session
+        self.crumb = crumb
+        self.interval = str(interval)
         self.dt = dt.timedelta(days=days_back)
         self.headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/71.0.3578.98 Safari/537.36',
                         'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
                         'Accept-Language': 'en-US,en;q=0.5',
-                        'DNT': '1', # Do Not Track Request Header 
-                        'Connection': 'close'}
+                        'DNT': '1'} # Do Not Track Request Header
 
 
     def get_crumb(self):
         """
         Original code source: https://stackoverflow.com/questions/44225771/scraping-historical-data-from-yahoo-finance-with-python
         """
-        response = self.session.get(self.crumb_link.format(self.symbol),
+        response = self.session.get(self.crumb_link.format(self.symbol, base_url=self.crumb_base_url),
                                     headers=self.headers,
                                     timeout=self.timeout)
         response.raise_for_status()
@@ -52,20 +69,284 @@ class YahooData:
             self.crumb = match.group(1)
 
 
-    def get_quote(self):
+    def get_quote_text(self, datefrom=-630961200):
         """
         Original code source: https://stackoverflow.com/questions/44225771/scraping-historical-data-from-yahoo-finance-with-python
+        
+        datefrom: integer, the start of the requested range (as a Unix timestamp).
+        The default requests the full history (from 1950).
         """
-        if not hasattr(self, 'crumb') or len(self.session.cookies) == 0:
+        if self.crumb is None:
             self.get_crumb()
         now = dt.datetime.utcnow()
         dateto = int(now.timestamp())
-        datefrom = -630961200
 #       line in original code: datefrom = int((now - self.dt).timestamp())
-        url = self.quote_link.format(quote=self.symbol, dfrom=datefrom, dto=dateto, crumb=self.crumb)
+        url = self.quote_link.format(base_url=self.quote_base_url, quote=self.symbol,
+                                     dfrom=int(datefrom), dto=dateto,
+                                     interval=self.interval, crumb=self.crumb)
         response = self.session.get(url, headers=self.headers)
         response.raise_for_status()
-        return pd.read_json(StringIO(response.text))
+        return response.text
+
+
+    def iter_quote_text(self, datefrom=-630961200, chunk_size=65536):
+        """
+        Streams the response of get_quote_text, as decoded text chunks of about
+        "chunk_size" bytes, so that it can be parsed while it downloads.
+        """
+        if self.crumb is None:
+            self.get_crumb()
+        dateto = int(dt.datetime.utcnow().timestamp())
+        url = self.quote_link.format(base_url=self.quote_base_url, quote=self.symbol,
+                                     dfrom=int(datefrom), dto=dateto,
+                                     interval=self.interval, crumb=self.crumb)
+        with self.session.get(url, headers=self.headers, stream=True) as response:
+            response.raise_for_status()
+            text_decoder = codecs.getincrementaldecoder(response.encoding or 'utf-8')()
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                yield(text_decoder.decode(chunk))
+            yield(text_decoder.decode(b'', final=True))
+
+
+    def get_quote(self, datefrom=-630961200, stream=False):
+        """
+        Original code source: https://stackoverflow.com/questions/44225771/scraping-historical-data-from-yahoo-finance-with-python
+        
+        Output: a dictionary of arrays, "timestamp" and "adjclose", and the
+        "gmtoffset" of the exchange (see ChartDecoder).
+        
+        stream: boolean, if True, parse the response while it downloads.
+        """
+        if stream:
+            chart_decoder = ChartDecoder()
+            for chunk in self.iter_quote_text(datefrom=datefrom):
+                chart_decoder.feed(chunk)
+            return(chart_decoder.close())
+        return(ChartDecoder().decode(self.get_quote_text(datefrom=datefrom)))
+
+
+class ChartDecoder:
+    """
+    Decodes a Yahoo Finance chart response straight into NumPy arrays: the bar
+    timestamps (int64), the adjusted closing prices (float64, nan for null) and
+    the UTC offset of the exchange. Only these fields are read: each array is
+    located with a regular expression, split on commas and converted to one
+    NumPy array, so the JSON document itself is never parsed (unlike json.loads
+    or pd.read_json).
+    
+    The response can be decoded at once (decode), or fed in chunks as it
+    arrives (feed, then close), in which case each array is parsed up to the
+    last complete value of every chunk, and only a short tail is kept between
+    chunks.
+    """
+    patterns = {'timestamp': re.compile(r'"timestamp"\s*:\s*\['),
+                'adjclose': re.compile(r'"adjclose"\s*:\s*\[\s*\{\s*"adjclose"\s*:\s*\['),
+                'gmtoffset': re.compile(r'"gmtoffset"\s*:\s*(-?\d+)\s*[,}]')}
+    dtypes = {'timestamp': 'int64', 'adjclose': 'float64'}
+    tail_length = 256
+    
+    
+    def __init__(self):
+        self.buffer = ''
+        self.current_field = None
+        self.parts = {'timestamp': [], 'adjclose': []}
+        self.found = set()
+        self.gmtoffset = 0
+    
+    
+    def parse_values(self, text):
+        """
+        Parses comma-separated values of the current field.
+        """
+        import numpy as np
+        
+        if text.strip() == '':
+            return
+        if self.current_field == 'adjclose':
+            text = text.replace('null', 'nan')
+        self.parts[self.current_field].append(np.array(text.split(','), dtype=self.dtypes[self.current_field]))
+    
+    
+    def feed(self, text):
+        """
+        Decodes the next chunk of the response.
+        """
+        self.buffer += text
+        while True:
+            if self.current_field is None:
+                matches = [(match.start(), field, match)
+                           for field, match in ((field, self.patterns[field].search(self.buffer))
+                                                for field in self.patterns if field not in self.found)
+                           if match is not None]
+                if len(matches) == 0:
+                    self.buffer = self.buffer[-self.tail_length:]
+                    return(self)
+                _, field, match = min(matches, key=lambda item: item[0])
+                self.found.add(field)
+                self.buffer = self.buffer[match.end():]
+                if field == 'gmtoffset':
+                    self.gmtoffset = int(match.group(1))
+                else:
+                    self.current_field = field
+            else:
+                array_end = self.buffer.find(']')
+                if array_end < 0:
+                    last_separator = self.buffer.rfind(',')
+                    if last_separator >= 0:
+                        self.parse_values(self.buffer[:last_separator])
+                        self.buffer = self.buffer[last_separator + 1:]
+                    return(self)
+                self.parse_values(self.buffer[:array_end])
+                self.buffer = self.buffer[array_end + 1:]
+                self.current_field = None
+    
+    
+    def close(self):
+        """
+        Output: a dictionary containing the "timestamp" and "adjclose" arrays and
+        the "gmtoffset" (0 if the response has none).
+        """
+        import numpy as np
+        
+        if self.current_field is not None or 'timestamp' not in self.found or 'adjclose' not in self.found:
+            raise ValueError('The Yahoo Finance response has no complete chart data.')
+        chart = {field: (np.concatenate(parts) if len(parts) > 0 else np.empty(0, dtype=self.dtypes[field]))
+                 for field, parts in self.parts.items()}
+        if len(chart['timestamp']) != len(chart['adjclose']):
+            raise ValueError('The Yahoo Finance response has {} timestamps but {} prices.'.format(
+                             len(chart['timestamp']), len(chart['adjclose'])))
+        chart['gmtoffset'] = self.gmtoffset
+        
+        return(chart)
+    
+    
+    def decode(self, text):
+        """
+        Decodes a whole response (see close for the output).
+        """
+        return(self.feed(text).close())
+
+
+class ResponseCache:
+    """
+    Stores Yahoo Finance responses on disk, keyed by ticker and request date
+    (each file also records the start of the range it covers). A fresh response
+    (younger than "ttl") is reused for any request of the same day whose range
+    it covers, i.e. that starts on or after the stored range, instead of calling
+    Yahoo Finance again. In offline mode, the latest stored response for each
+    ticker is replayed regardless of its age or range, and nothing is requested.
+    """
+    
+    
+    def __init__(self, directory, ttl=12 * 3600, offline=False):
+        """
+        directory: string, the folder holding the stored responses.
+        ttl: float, the number of seconds a stored response stays fresh.
+        offline: boolean, replay stored responses only.
+        """
+        self.directory = str(directory)
+        self.ttl = float(ttl)
+        self.offline = bool(offline)
+        os.makedirs(self.directory, exist_ok=True)
+    
+    
+    def filepath(self, symbol, datefrom, request_date):
+        """
+        The file storing the response for "symbol", requested from "datefrom"
+        on "request_date".
+        """
+        safe_symbol = re.sub(r'[^\w.-]', '_', str(symbol))
+        filename = '{}_{}_{}.json'.format(safe_symbol, int(datefrom), request_date)
+        return(os.path.join(self.directory, filename))
+    
+    
+    def stored_responses(self, symbol, request_date=None):
+        """
+        Output: a list of (range start, filepath) tuples, one per stored response
+        for "symbol" (requested on "request_date", if given).
+        """
+        safe_symbol = re.sub(r'[^\w.-]', '_', str(symbol))
+        pattern = re.compile(re.escape(safe_symbol) + r'_(-?\d+)_'
+                             + (r'\d{4}-\d{2}-\d{2}' if request_date is None else re.escape(request_date))
+                             + r'\.json')
+        responses = []
+        for filepath in glob.glob(os.path.join(self.directory, glob.escape(safe_symbol) + '_*.json')):
+            match = pattern.fullmatch(os.path.basename(filepath))
+            if match is not None:
+                responses.append((int(match.group(1)), filepath))
+        
+        return(responses)
+    
+    
+    def get(self, symbol, datefrom, request_date):
+        """
+        Output: the stored response text, or None if no fresh response of
+        "request_date" covers the range starting at "datefrom".
+        """
+        if self.offline:
+            candidates = [filepath for _, filepath in self.stored_responses(symbol)]
+            if len(candidates) == 0:
+                raise FileNotFoundError('No stored response for {} in {} (offline mode).'.format(
+                                        symbol, self.directory))
+            filepath = max(candidates, key=os.path.getmtime)
+        else:
+            now = time.time()
+            candidates = [(stored_datefrom, filepath)
+                          for stored_datefrom, filepath in self.stored_responses(symbol, request_date)
+                          if stored_datefrom <= int(datefrom) and now - os.path.getmtime(filepath) <= self.ttl]
+            if len(candidates) == 0:
+                return(None)
+            # The shortest covering response is the quickest to decode.
+            filepath = max(candidates)[1]
+            
+        with open(filepath, encoding='utf-8') as response_file:
+            return(response_file.read())
+    
+    
+    def put(self, symbol, datefrom, request_date, text):
+        """
+        Stores a response text.
+        """
+        filepath = self.filepath(symbol, datefrom, request_date)
+        temporary_filepath = filepath + '.tmp'
+        with open(temporary_filepath, 'w', encoding='utf-8') as response_file:
+            response_file.write(text)
+        os.replace(temporary_filepath, filepath)
+
+
+class TokenBucket:
+    """
+    A thread-safe token-bucket rate limiter.
+    """
+    
+    
+    def __init__(self, rate, capacity=1):
+        """
+        rate: float, the number of tokens added per second.
+        capacity: integer, the maximum number of tokens (i.e. the largest burst).
+        """
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.last_refill = time.monotonic()
+        self.lock = threading.Lock()
+    
+    
+    def acquire(self):
+        """
+        Blocks until a token is available, then takes it.
+        """
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity,
+                                  self.tokens + (now - self.last_refill) * self.rate)
+                self.last_refill = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
 
 
 class GetPrices:
@@ -74,91 +355,211 @@ class GetPrices:
     """
     
     
-    def __init__(self):
-        self.yahoo_dates = []
-        self.values = []
+    def __init__(self, max_workers=4, requests_per_second=2.0, burst=2,
+                 max_retries=5, base_delay=1.0, max_delay=60.0, cache=None,
+                 overlap_weeks=4, response_hooks=None, universe=None, trading_calendar=None,
+                 stream=False, base_url=None):
+        """
+        max_workers: integer, the number of tickers pulled at the same time.
+        requests_per_second: float, the rate limit shared by all requests.
+        burst: integer, the number of requests allowed at once above the rate limit.
+        max_retries: integer, the number of retries per ticker before giving up.
+        base_delay, max_delay: floats, the bounds (in seconds) of the exponential
+        backoff between retries. Each delay is drawn uniformly between 0 and
+        min(max_delay, base_delay * 2**attempt).
+        cache: ResponseCache, stores responses on disk (no caching if None).
+        overlap_weeks: integer, the number of already stored weeks requested again
+        by update_weekly_prices, so the pull overlaps the stored prices.
+        response_hooks: list, requests response hooks added to the shared session
+        (e.g. instrumentation.RunInstrumentation.http_hook).
+        universe: universe.Universe, the assets to pull. Defaults to the baseline
+        11-asset pool (universe.DEFAULT_UNIVERSE).
+        trading_calendar: trading_calendar.TradingCalendar, the grid every ticker
+        is aligned to. Defaults to weekly bars.
+        stream: boolean, if True, parse each response while it downloads (see
+        ChartDecoder), e.g. for long daily histories.
+        base_url: string, the scheme and host serving the crumb and the quotes,
+        instead of Yahoo Finance (see YahooData).
+        """
+        import src.trading_calendar as cal
+        
+        if universe is None:
+            import src.universe as uni
+            universe = uni.Universe(**uni.DEFAULT_UNIVERSE)
+        self.universe = universe
+        self.trading_calendar = cal.TradingCalendar() if trading_calendar is None else trading_calendar
+        self.max_workers = int(max_workers)
+        self.max_retries = int(max_retries)
+        self.base_delay = float(base_delay)
+        self.max_delay = float(max_delay)
+        self.rate_limiter = TokenBucket(rate=requests_per_second, capacity=burst)
+        self.session = None
+        self.crumb = None
+        self.crumb_lock = threading.Lock()
+        self.cache = cache
+        self.response_hooks = list(response_hooks or [])
+        self.overlap_weeks = int(overlap_weeks)
+        self.stream = bool(stream)
+        self.base_url = base_url
+        self.datefrom = -630961200
+        self.filled_gaps = {}
+        self.alignment_reports = {}
         self.now = dt.datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
     
+    
+    def new_session(self):
+        """
+        Creates the requests.Session shared by all tickers, with a connection pool
+        large enough for "max_workers" concurrent requests.
+        """
+        session = req.Session()
+        adapter = req.adapters.HTTPAdapter(pool_connections=self.max_workers,
+                                           pool_maxsize=self.max_workers)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        session.hooks['response'].extend(self.response_hooks)
+        
+        return(session)
+    
+    
+    def shared_crumb(self, series_id):
+        """
+        Retrieves the crumb for the shared session once, for all tickers.
+        
+        series_id: ticker symbol used to retrieve the crumb.
+        """
+        with self.crumb_lock:
+            if self.crumb is None:
+                self.rate_limiter.acquire()
+                crumb_source = YahooData(series_id, session=self.session, base_url=self.base_url)
+                crumb_source.get_crumb()
+                self.crumb = crumb_source.crumb
+                
+            return(self.crumb)
+    
 
     def yahoo_response(self, series_id):
         """
-        Retrieves data from Yahoo Finance, and performs timestamp adjustments.
+        Retrieves data from Yahoo Finance, decodes it straight into arrays (see
+        ChartDecoder), and converts the timestamps to the local dates of the
+        exchange (all at once). The last bar is dropped if it
+        is still in progress (see trading_calendar.TradingCalendar.complete_bars).
+        
+        Output: a tuple (dates, adjusted closing prices), as datetime64[D] and
+        float64 arrays in reverse chronological order.
         
         series_id: ticker symbol for the asset to be pulled.
         """
-        series_id = str(series_id)
-        series_dataframe = YahooData(series_id).get_quote()
-        
-        timestamplist       = series_dataframe["chart"]["result"][0]["timestamp"]
-        firstlast_date = []
-        firstlast_adjclose = []
-        for dte in range(0, len(timestamplist)):
-            if timestamplist[dte] > 0:
-                firstlast_date.extend([dt.datetime.fromtimestamp(timestamplist[dte]).strftime('%Y-%m-%d')])
-                firstlast_adjclose.extend([series_dataframe["chart"]["result"][0]["indicators"]["adjclose"][0]["adjclose"][dte]])
-            
+        import numpy as np
         
-        lastfirst_date      = firstlast_date[::-1]
-        lastfirst_adjclose  = firstlast_adjclose[::-1]
-                                               
-        first_date = dt.datetime.strptime(lastfirst_date[0],'%Y-%m-%d')
-        second_date = dt.datetime.strptime(lastfirst_date[1],'%Y-%m-%d')                   
-        
-        friday_check = first_date - second_date < dt.timedelta(days=6)
-        monday_check = first_date >= self.now
+        series_id = str(series_id)
+        request_date = self.now.strftime('%Y-%m-%d')
+        response_text = None
+        chart_decoder = ChartDecoder()
+        if self.cache is not None:
+            response_text = self.cache.get(series_id, self.datefrom, request_date)
+        if response_text is None:
+            if self.session is None:
+                self.session = self.new_session()
+            self.rate_limiter.acquire()
+            quote_source = YahooData(series_id, session=self.session,
+                                     crumb=self.shared_crumb(series_id),
+                                     interval=self.trading_calendar.interval,
+                                     base_url=self.base_url)
+            if self.stream:
+                chunks = []
+                for chunk in quote_source.iter_quote_text(datefrom=self.datefrom):
+                    chart_decoder.feed(chunk)
+                    chunks.append(chunk)
+                response_text = ''.join(chunks)
+            else:
+                response_text = quote_source.get_quote_text(datefrom=self.datefrom)
+                chart_decoder.feed(response_text)
+            if self.cache is not None:
+                self.cache.put(series_id, self.datefrom, request_date, response_text)
+        else:
+            chart_decoder.feed(response_text)
+        chart = chart_decoder.close()
         
-        if (friday_check or monday_check):
-            lastfirst_date.pop(0)
-            lastfirst_adjclose.pop(0)
+        valid = chart['timestamp'] > 0
+        dates, adjclose = self.trading_calendar.complete_bars(
+            self.trading_calendar.to_dates(chart['timestamp'][valid], utc_offset=chart['gmtoffset']),
+            chart['adjclose'][valid], today=np.datetime64(self.now.date()))
             
-        self.yahoo_dates.extend(lastfirst_date)
-        self.values.extend(lastfirst_adjclose)
+        return(dates[::-1], adjclose[::-1])
+    
+    
+    def fetch_ticker(self, ticker, name):
+        """
+        Retrieves data for one ticker, subject to the shared rate limit. Retries
+        failed requests with exponential backoff and jitter, up to "max_retries"
+        times.
+        
+        Output: a tuple (dates, adjusted closing prices), as lists in reverse
+        chronological order.
+        """
+        print('Currently pulling data for {} ({})'.format(ticker, name))
+        for attempt in range(0, self.max_retries + 1):
+            try:
+                return(self.yahoo_response(series_id=ticker))
+            except (req.exceptions.HTTPError, req.exceptions.ReadTimeout,
+                    req.exceptions.ConnectionError, ValueError) as error:
+                if attempt == self.max_retries:
+                    raise
+                if isinstance(error, req.exceptions.HTTPError):
+                    with self.crumb_lock:
+                        self.crumb = None
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+                print('\t --CONNECTION ERROR-- ({}: {})'.format(ticker, error),
+                      '\n\t Retrying in {:.1f} seconds.'.format(delay))
+                time.sleep(delay)
     
     
-    def get_weekly_prices(self):
+    def get_weekly_prices(self, grid=None):
         """
         Purpose: Get weekly adjusted closing prices (from Yahoo Finance)
-        for all assets used by the Turbulence indicators. 
+        for all assets in "self.universe". Tickers are pulled concurrently,
+        over one shared session and crumb, from "self.datefrom" onwards, and
+        aligned to one grid of dates (see trading_calendar.TradingCalendar.align).
+        Grid dates after the last bar of the universe's calendar asset are
+        dropped. Misalignments are recorded in "self.alignment_reports" and
+        printed; grid dates without a bar are left as nan.
         
         Output: A dictionary where each item is a list containing
-        (in reverse chronological order) the adjusted closing prices.
-        """
-        
-        
-        tickers = ['^FTSE', '^N225', '^GDAXI', '^FCHI', '^HSI', '^BVSP',
-                   '^RUT', '^IRX', '^FVX', '^TNX', '^TYX']
-        
-        output = {'Dates': [], 'FTSE100': [], 'Nikkei225': [], 'DAX': [], 
-                  'CAC40': [], 'HangSeng': [], 'Bovespa': [],
-                  'Russell2000': [], '13W_UST': [], '5Y_UST': [],
-                  '10Y_UST': [], '30Y_UST': []}
-        
-        
-        for iteration in range(0, len(tickers)):
-            ticker = tickers[iteration]
-            self.yahoo_dates = []
-            self.values = []
-            name = list(output.keys())[iteration + 1]
-            print('Currently pulling data for {} ({})'.format(ticker, name))
-            success = False
-            while success == False:
-                try:
-                    self.yahoo_response(series_id=ticker)
-                except (req.exceptions.HTTPError, req.exceptions.ReadTimeout,
-                        req.exceptions.ConnectionError, ValueError):
-                    delay = 30
-                    print('\t --CONNECTION ERROR--',
-                          '\n\t Sleeping for {} seconds.'.format(delay))
-                    time.sleep(delay)
-                else:
-                    success = True
-                    
-            output[name].extend(self.values)
-            
-            if ticker == '^RUT':
-                output['Dates'].extend(self.yahoo_dates)
-            
-            time.sleep(1)
+        (in reverse chronological order) the adjusted closing prices, and
+        "Dates" the grid dates (YYYY-MM-DD strings).
+        
+        grid: datetime64[D] array, the grid dates in chronological order. Defaults
+        to the dates of the universe's calendar asset.
+        """
+        import numpy as np
+        
+        names = list(self.universe.tickers.keys())
+        tickers = list(self.universe.tickers.values())
+        
+        self.session = self.new_session()
+        self.crumb = None
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            pulls = [pool.submit(self.fetch_ticker, ticker, name)
+                     for ticker, name in zip(tickers, names)]
+            bars = {name: pull.result() for name, pull in zip(names, pulls)}
+        
+        if grid is None:
+            grid = bars[self.universe.calendar][0][::-1]
+        aligned_prices = {}
+        self.alignment_reports = {}
+        for name in names:
+            yahoo_dates, values = bars[name]
+            aligned_prices[name], report = self.trading_calendar.align(grid, yahoo_dates[::-1], values[::-1])
+            if self.trading_calendar.describe(report) != '':
+                self.alignment_reports[name] = report
+        calendar_rows = np.nonzero(~np.isnan(aligned_prices[self.universe.calendar]))[0]
+        row_count = calendar_rows[-1] + 1 if len(calendar_rows) > 0 else 0
+        
+        output = {'Dates': self.trading_calendar.format(grid[:row_count][::-1]).tolist()}
+        output.update((name, aligned_prices[name][:row_count][::-1].tolist()) for name in names)
+        for name, report in self.alignment_reports.items():
+            print('\t Aligned {} to the calendar: {}'.format(name, self.trading_calendar.describe(report)))
         
         print('Finished pulling all data!')
         return(output)
@@ -166,60 +567,68 @@ class GetPrices:
         
     def replace_zero_values(self, input_dictionary):
         """
-        Purpose: Replace 0 values in each item in the "input_dictionary". Replaces
-        with the value of the next element.
+        Purpose: Replace 0 and nan values in each item in the "input_dictionary".
+        Replaces with the value of the nearest following (i.e. older) valid element,
+        or with the nearest preceding (newer) valid element if there is no older
+        one. The filled positions of each item are recorded in "self.filled_gaps".
         
-        "input_dictionary": dictionary.
+        "input_dictionary": dictionary, where each item is a list in reverse
+        chronological order. Items that are not numeric (e.g. dates) are left as is.
         """
+        import numpy as np
+        
+        self.filled_gaps = {}
         for key in input_dictionary.keys():
-            for index in range(len(input_dictionary[key]) - 1, -1, -1):
-                is_zero = input_dictionary[key][index] == 0
-                is_nan = str(input_dictionary[key][index]) == 'nan'
-                if is_zero or is_nan:
-                    input_dictionary[key][index] = input_dictionary[key][index + 1]
+            try:
+                values = np.asarray(input_dictionary[key], dtype=np.float64)
+            except (TypeError, ValueError):
+                continue
+            is_gap = (values == 0) | np.isnan(values)
+            if not is_gap.any() or is_gap.all():
+                continue
+            
+            positions = np.arange(len(values))
+            valid_positions = np.where(is_gap, len(values), positions)
+            next_valid = np.minimum.accumulate(valid_positions[::-1])[::-1]
+            previous_valid = np.maximum.accumulate(np.where(is_gap, -1, positions))
+            source = np.where(next_valid < len(values), next_valid, previous_valid)
+            
+            self.filled_gaps[key] = positions[is_gap].tolist()
+            input_dictionary[key] = values[source].tolist()
+        
+        for key, positions in self.filled_gaps.items():
+            print('\t Filled {} zero/nan values for {} at rows {}'.format(len(positions),
+                                                                          key, positions))
                     
         return(input_dictionary)
     
     
     def update_weekly_prices(self, prices):
         """
-        Purpose: update the "prices" with more recent prices.
+        Purpose: update the "prices" with more recent prices. The pull is
+        aligned to the grid continuing the stored dates (one bar every week
+        after the latest stored date, up to today), overlapping the last
+        "overlap_weeks" stored dates so that gaps in the new rows are filled
+        from stored weeks.
         
         Output: the updated "prices".
         
         "prices": dataframe, the dataframe to be updated.
         """
-        
-        new_pull = self.get_weekly_prices()
+        import numpy as np
+        
+        stored_dates = self.trading_calendar.parse(prices['Dates'].to_numpy(dtype=object)[:self.overlap_weeks][::-1])
+        latest_date = stored_dates[-1]
+        self.datefrom = int((latest_date - np.timedelta64(7 * self.overlap_weeks, 'D'))
+                            .astype('datetime64[s]').astype(np.int64))
+        new_dates = self.trading_calendar.grid(latest_date + np.timedelta64(self.trading_calendar.step_days, 'D'),
+                                               np.datetime64(self.now.date()))
+        new_pull = self.get_weekly_prices(grid=np.concatenate([stored_dates, new_dates]))
         new_pull = self.replace_zero_values(input_dictionary=new_pull)
-        new_pull = pd.DataFrame(dict([(k,pd.Series(v)) for k,v in new_pull.items()]))
-        previous_date = dt.datetime.strptime(prices['Dates'][0], '%Y-%m-%d')
-        data_to_add_indices = []
-        for index in range(0, len(new_pull)):
-            date = dt.datetime.strptime(new_pull.loc[index, 'Dates'], '%Y-%m-%d')
-            if date > previous_date:
-                data_to_add_indices.append(index)
-            else:
-                break
-            
-        data_to_add = new_pull.loc[data_to_add_indices,]
-        
-        all_dates = list(prices['Dates'][::-1])
-        previous_date = dt.datetime.strptime(all_dates[len(all_dates) - 1], '%Y-%m-%d')
-        date_is_current = False
-        while date_is_current == False:
-            next_date = previous_date + dt.timedelta(days=7)
-            if next_date < self.now:
-                next_date_string = str(next_date)[:10]
-                all_dates.append(next_date_string)
-                previous_date = previous_date + dt.timedelta(days=7)
-            else:
-                date_is_current = True
-        all_dates = all_dates[::-1]
+        new_pull = pd.DataFrame(new_pull)
+        data_to_add = new_pull[self.trading_calendar.parse(new_pull['Dates'].to_numpy(dtype=object)) > latest_date]
         
         prices = pd.concat([data_to_add, prices], sort=True)
-        #prices = data_to_add.append(prices, sort=True)
-        prices['Dates'] = all_dates
         prices.reset_index(inplace=True)
         prices.drop('index', axis=1, inplace=True)
         
@@ -230,18 +639,29 @@ class CalculateReturns:
     """
     Creates the returns dataset from the prices dataset.
     """
+    
+    
+    def __init__(self, universe=None):
+        """
+        universe: universe.Universe, defines the spreads and returns. Defaults to
+        the baseline 11-asset pool (universe.DEFAULT_UNIVERSE).
+        """
+        if universe is None:
+            import src.universe as uni
+            universe = uni.Universe(**uni.DEFAULT_UNIVERSE)
+        self.universe = universe
 
 
     def add_curve_slope(self, prices):
         """
-        Purpose: calculates yield curve slope data from data that is already in
-        "prices", and appends yield curve slope data to "prices".
+        Purpose: calculates the spreads of the universe (e.g. yield curve slope
+        data) from data that is already in "prices", and appends them to "prices".
         
-        Output: "prices" with yield curve slope data added.
+        Output: "prices" with the spreads added.
         """
         
-        prices['CurveSlope_10Y-5Y'] = prices['10Y_UST'] - prices['5Y_UST']
-        prices['CurveSlope_10Y-13W'] = prices['10Y_UST'] - prices['13W_UST']
+        for spread, (minuend, subtrahend) in self.universe.spreads.items():
+            prices[spread] = prices[minuend] - prices[subtrahend]
         
         return(prices)
 
@@ -264,31 +684,32 @@ class CalculateReturns:
         
     def calculate_returns(self, prices):
         """
-        Purpose: calculate single-period returns from the "prices".
+        Purpose: calculate single-period returns from the "prices". Calculates
+        percent changes for the universe's "percent_change" assets, and absolute
+        changes for its "absolute_change" assets (e.g. yields), column by column
+        on float64 arrays.
         
         Output: a dataframe containing the returns.
         
-        "prices": dataframe, contains prices.
+        "prices": dataframe, contains prices (in reverse chronological order).
         """
-        output = {'Dates': prices['Dates'][:len(prices) - 1],
-                  'FTSE100': [], 'Nikkei225': [], 'DAX': [], 
-                  'CAC40': [], 'HangSeng': [], 'Bovespa': [],
-                  'Russell2000': [], '10Y_UST': [], '30Y_UST': [],
-                  'CurveSlope_10Y-5Y': [], 'CurveSlope_10Y-13W': []}
+        import numpy as np
         
-        yield_assets = ['10Y_UST', '30Y_UST', 'CurveSlope_10Y-5Y',
-                        'CurveSlope_10Y-13W']
+        assets = self.universe.return_assets()
+        yield_assets = self.universe.absolute_change
         
-        for asset in list(output.keys())[1:]:
-            returns = []
-            for date in range(0, len(prices) - 1):
-                if asset in yield_assets:
-                    returns.append(self.first_difference(price_t1=prices.loc[date, asset],
-                                                         price_t0=prices.loc[date + 1, asset],
-                                                         percent_change=False))
-                else:
-                    returns.append(self.first_difference(price_t1=prices.loc[date, asset],
-                                                         price_t0=prices.loc[date + 1, asset]))
-            output[asset] = returns
+        price_values = np.ascontiguousarray(prices[assets].to_numpy(dtype=np.float64))
+        newer_prices = price_values[:-1]
+        older_prices = price_values[1:]
+        is_yield_asset = np.isin(assets, yield_assets)
+        
+        returns = np.empty_like(newer_prices)
+        returns[:, ~is_yield_asset] = (newer_prices[:, ~is_yield_asset]
+                                       / older_prices[:, ~is_yield_asset]) - 1
+        returns[:, is_yield_asset] = (newer_prices[:, is_yield_asset]
+                                      - older_prices[:, is_yield_asset])
+        
+        output = pd.DataFrame(returns, columns=assets)
+        output.insert(0, 'Dates', prices['Dates'].values[:len(prices) - 1])
             
-        return(pd.DataFrame(output))
+        return(output)
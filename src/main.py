@@ -3,10 +3,20 @@ The main module to output the Turbulence and Systemic Risk indicators.
 """
 import pandas as pd
 import os
+import pickle
+import asyncio
 
 import TurbulenceSuite_paths as path
 import src.get_data as get
 import src.calculate as calc
+import src.regimes as reg
+import src.price_store as store
+import src.instrumentation as instr
+import src.universe as uni
+import src.parallel as par
+import src.streaming as strm
+import src.query_service as qry
+import src.spectral as spec
 
 
 class MainProcess:
@@ -16,41 +26,184 @@ class MainProcess:
     """
     
     
-    def __init__(self):
+    def __init__(self, full_rebuild=False, offline=False, profile=False,
+                 interactive=True, workers=1):
+        """
+        "full_rebuild": boolean, if True, ignore the checkpoint and recalculate
+        both indicators from the full history.
+        
+        "offline": boolean, if True, replay the stored Yahoo Finance responses
+        instead of requesting new data.
+        
+        "profile": boolean, if True, dump a cProfile profile of the calculation
+        stages to TurbulenceSuite_paths.profile_path, and measure the peak memory
+        of each stage (which slows the stages down).
+        
+        "interactive": boolean, if False, do not wait for [ENTER] at the end of
+        the run.
+        
+        "workers": integer, the number of processes used to rebuild both
+        indicators at the same time (1 for a serial rebuild).
+        """
         self.prices = pd.DataFrame()
         self.returns = pd.DataFrame()
         self.turbulence = pd.DataFrame()
         self.systemic_risk = pd.DataFrame()
+        self.calculator = calc.Calculate(regime_calendar=reg.RegimeCalendar().load(path.regimes_path))
+        self.universe = uni.Universe().load(path.universe_path)
+        self.checkpoint = None
+        self.interactive = bool(interactive)
+        self.workers = int(workers)
+        self.instrumentation = instr.RunInstrumentation(metrics_path=path.run_metrics_path,
+                                                        profile_path=path.profile_path if profile else None,
+                                                        track_memory=profile)
+        self.response_cache = get.ResponseCache(path.response_cache_path, offline=offline)
+        self.price_store = store.PriceStore(path.prices_store_path)
+        if not full_rebuild:
+            self.load_checkpoint()
+    
+    
+    def load_checkpoint(self):
+        """
+        Loads the checkpoint saved by the previous run, if there is one.
+        """
+        if os.path.exists(path.checkpoint_path):
+            with open(path.checkpoint_path, 'rb') as checkpoint_file:
+                self.checkpoint = pickle.load(checkpoint_file)
+    
+    
+    def save_checkpoint(self):
+        """
+        Saves the last processed date, the indicator state, the returns columns and
+        the covariance estimator (and its options), so that the next run only has
+        to process new rows.
+        """
+        self.checkpoint = {'Last Date': self.calculator.turbulence['Dates'][-1],
+                           'Columns': list(self.returns.columns),
+                           'Covariance Estimator': self.universe.covariance_estimator,
+                           'Covariance Options': self.universe.covariance_options,
+                           'Calculator': self.calculator.checkpoint()}
+        with open(path.checkpoint_path, 'wb') as checkpoint_file:
+            pickle.dump(self.checkpoint, checkpoint_file, protocol=pickle.HIGHEST_PROTOCOL)
+    
+    
+    def new_row_count(self):
+        """
+        Finds how many rows of "self.prices" are newer than the checkpoint.
+        
+        Output: the number of new rows, or None if the checkpoint cannot be used
+        (no checkpoint, its last date is no longer in the prices dataset, e.g.
+        after --drop_recent, or the universe now uses another covariance estimator
+        or other estimator options).
+        """
+        if self.checkpoint is None:
+            return(None)
+        if self.checkpoint.get('Covariance Estimator', 'sample') != self.universe.covariance_estimator:
+            return(None)
+        if self.checkpoint.get('Covariance Options', {}) != self.universe.covariance_options:
+            return(None)
+        matching_rows = (self.prices['Dates'] == self.checkpoint['Last Date']).values.nonzero()[0]
+        if len(matching_rows) == 0:
+            return(None)
+        
+        return(int(matching_rows[0]))
     
     
     def append_prices_and_returns(self):
         """
-        Appends new data to the prices dataset and the returns dataset.
+        Appends new data to the prices dataset and the returns dataset. If the
+        checkpoint can be used, only the returns newer than the checkpoint are
+        calculated.
         """
+        if not self.price_store.exists():
+            print('\nMigrating {} to {}...'.format(path.prices_path_current,
+                                                  path.prices_store_path))
+            with self.instrumentation.stage('migrate') as stage:
+                self.price_store.migrate(path.prices_path_current)
+                stage['rows'] = self.price_store.rows
         print('\nRequesting data from Yahoo Finance...')
-        self.prices = pd.read_pickle(path.prices_path_historical)
-        self.prices = get.GetPrices().update_weekly_prices(self.prices)
-        self.prices.to_pickle(path.prices_path_current)
-        self.prices = get.CalculateReturns().add_curve_slope(self.prices)
-        self.returns = get.CalculateReturns().calculate_returns(self.prices)
+        with self.instrumentation.stage('fetch') as stage:
+            self.prices = self.price_store.to_dataframe()
+            self.prices = get.GetPrices(cache=self.response_cache,
+                                        response_hooks=[self.instrumentation.http_hook],
+                                        universe=self.universe
+                                        ).update_weekly_prices(self.prices)
+            stage['rows'] = len(self.prices)
+        with self.instrumentation.stage('store') as stage:
+            stage['rows'] = self.price_store.append(self.prices)
+        with self.instrumentation.stage('returns', profile=True) as stage:
+            self.prices = get.CalculateReturns(universe=self.universe).add_curve_slope(self.prices)
+            self.calculate_returns()
+            stage['rows'] = len(self.returns)
+        
+        
+    def calculate_returns(self):
+        """
+        Calculates the returns dataset from the prices dataset: only the new rows
+        if the checkpoint can be used, otherwise the full history.
+        """
+        new_rows = self.new_row_count()
+        if new_rows is None:
+            self.checkpoint = None
+            self.returns = get.CalculateReturns(universe=self.universe).calculate_returns(self.prices)
+        else:
+            self.returns = get.CalculateReturns(universe=self.universe).calculate_returns(self.prices.iloc[:new_rows + 1])
+            if list(self.returns.columns) != self.checkpoint['Columns']:
+                self.checkpoint = None
+                self.returns = get.CalculateReturns(universe=self.universe).calculate_returns(self.prices)
         
         
     def calculate_turbulence_and_systemic_risk(self):
         """
-        Calculates Turbulence and Systemic Risk.
+        Calculates Turbulence and Systemic Risk, extending the checkpoint if there
+        is one, then saves a new checkpoint.
         """
-        print('\nBuilding Turbulence Index...')
-        self.turbulence = pd.DataFrame(calc.Calculate().calculate_turbulence(self.returns))
-        print('Turbulence Index completed!')
+        if self.checkpoint is None and self.workers > 1:
+            print('\nBuilding Turbulence and Systemic Risk Indices on {} processes...'.format(self.workers))
+            with self.instrumentation.stage('turbulence_and_systemic_risk', rows=len(self.returns)):
+                par.ParallelCalculate(max_workers=self.workers).calculate(
+                    self.calculator, self.returns,
+                    covariance_estimator=self.universe.covariance_estimator,
+                    covariance_options=self.universe.covariance_options, attribution=True,
+                    spectral_indicators=spec.SpectralIndicators().names())
+            print('Turbulence and Systemic Risk Indices completed!')
+        elif self.checkpoint is None:
+            print('\nBuilding Turbulence Index...')
+            with self.instrumentation.stage('turbulence', rows=len(self.returns), profile=True):
+                self.calculator.calculate_turbulence(self.returns,
+                                                     covariance_estimator=self.universe.covariance_estimator,
+                                                     covariance_options=self.universe.covariance_options,
+                                                     attribution=True)
+            print('Turbulence Index completed!')
+            
+            print('\nBuilding Systemic Risk Index...')
+            with self.instrumentation.stage('systemic_risk', rows=len(self.returns), profile=True):
+                self.calculator.calculate_systemic_risk(self.returns,
+                                                        spectral_indicators=spec.SpectralIndicators().names())
+            print('Systemic Risk Index completed!')
+        else:
+            print('\nExtending Turbulence and Systemic Risk Indices from {} ({} new rows)...'.format(
+                  self.checkpoint['Last Date'], len(self.returns)))
+            self.calculator.restore_checkpoint(self.checkpoint['Calculator'])
+            with self.instrumentation.stage('turbulence', rows=len(self.returns), profile=True):
+                self.calculator.update_turbulence(self.returns)
+            with self.instrumentation.stage('systemic_risk', rows=len(self.returns), profile=True):
+                self.calculator.update_systemic_risk(self.returns)
+            print('Turbulence and Systemic Risk Indices completed!')
         
-        print('\nBuilding Systemic Risk Index...')
-        self.systemic_risk = pd.DataFrame(calc.Calculate().calculate_systemic_risk(self.returns))
-        print('Systemic Risk Index completed!')
+        self.turbulence = pd.DataFrame(self.calculator.turbulence)
+        self.systemic_risk = pd.DataFrame(self.calculator.systemic_risk)
+        with self.instrumentation.stage('checkpoint'):
+            self.save_checkpoint()
         
         
     def save_chart_data(self):
         """
-        Reformats data so that it can be uploaded to Visualizer (Wordpress library).
+        Reformats data so that it can be uploaded to Visualizer (Wordpress library),
+        and saves a columnar copy of both series (and of the per-asset Turbulence
+        attribution and the other spectral indicators) for the query service.
+        Then writes the run summary, and waits for [ENTER] if the run is
+        interactive.
         """
         turbulence_chart = pd.DataFrame({
                                          'Dates': ['date'] + list(self.turbulence['Dates']),
@@ -64,10 +217,73 @@ class MainProcess:
                                             'Recession': ['number'] + list(self.systemic_risk['Recession'])
                                            })
         
-        turbulence_chart.to_csv(path.turbulence_chart_path, index=False)
-        systemic_risk_chart.to_csv(path.systemic_risk_chart_path, index=False)
+        with self.instrumentation.stage('charts', rows=len(turbulence_chart) + len(systemic_risk_chart)):
+            turbulence_chart.to_csv(path.turbulence_chart_path, index=False)
+            systemic_risk_chart.to_csv(path.systemic_risk_chart_path, index=False)
+            series = {'turbulence': self.turbulence, 'systemic_risk': self.systemic_risk}
+            if self.calculator.turbulence_attribution is not None:
+                attribution = pd.DataFrame(self.calculator.turbulence_attribution,
+                                           columns=self.checkpoint['Columns'][1:])
+                attribution.insert(0, 'Dates', self.turbulence['Dates'].values)
+                series['turbulence_attribution'] = attribution
+            if len(self.calculator.spectral_indicators) > 0:
+                series['spectral_indicators'] = pd.DataFrame(self.calculator.spectral_indicators)
+            qry.IndicatorCache(path.indicators_path).write(series)
         
         print('\nTurbulence and Systemic Risk data written as .csv files and saved to',
               str(os.getcwd() + '\\data'))
         print('\n{}'.format(self.turbulence.iloc[-5:,]))
-        input('Press [ENTER] to close the program.')
\ No newline at end of file
+        summary = self.instrumentation.finish()
+        print('\nRun completed in {:.1f} seconds ({} HTTP requests). Stage timings appended to {}'.format(
+              summary['wall_seconds'], summary['http_requests'], path.run_metrics_path))
+        if self.interactive:
+            input('Press [ENTER] to close the program.')
+    
+    
+    def stream(self, source, publish_port=None, follow=True):
+        """
+        Extends the indicators bar by bar from a local stream of prices (one JSON
+        object per line, e.g. {"Dates": "2024-01-05", "FTSE100": 7689.6, ...}),
+        starting from the checkpoint of the last run. The updates are printed,
+        or published over TCP on "publish_port". Neither the checkpoint nor the
+        prices store are modified.
+        
+        "source": string, a local socket ("host:port"), a file or a named pipe.
+        
+        "follow": boolean, keep waiting for new bars at the end of a file.
+        """
+        if self.checkpoint is None:
+            raise ValueError('Streaming starts from a checkpoint; run the indicators once first.')
+        last_date = self.checkpoint['Last Date']
+        prices = self.price_store.to_dataframe()
+        last_prices = prices[prices['Dates'] == last_date]
+        if len(last_prices) == 0:
+            raise ValueError('The checkpoint date {} is not in the prices store.'.format(last_date))
+        
+        self.calculator.restore_checkpoint(self.checkpoint['Calculator'])
+        indicators = strm.OnlineIndicators(calculator=self.calculator, universe=self.universe,
+                                           last_date=last_date,
+                                           last_prices=last_prices.iloc[0].to_dict())
+        service = strm.StreamService(indicators)
+        print('\nStreaming bars from {} (after {})...'.format(source, last_date))
+        asyncio.run(service.serve(strm.source_lines(source, follow=follow),
+                                  publish_port=publish_port))
+        print('\nStream ended: {} bars processed, slowest update {:.3f} ms, {} updates dropped.'.format(
+              service.processed_bars, 1000 * service.max_update_seconds, service.dropped_updates))
+    
+    
+    def serve_queries(self, port=8080, host='127.0.0.1'):
+        """
+        Serves the indicator series saved by save_chart_data over a local HTTP/JSON
+        query API (see src/query_service.py), until interrupted with Ctrl+C. The
+        series are reloaded whenever a pipeline run saves new ones.
+        """
+        server = qry.QueryServer(qry.IndicatorCache(path.indicators_path), host=host, port=port)
+        print('\nServing {} on http://{}:{}/series (Ctrl+C to stop)...'.format(
+              path.indicators_path, host, port))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,372 @@
+"""
+This module calculates the Turbulence and Systemic Risk indicators out of core,
+from returns stored on disk and read in bounded chunks.
+"""
+import json
+import os
+
+import numpy as np
+
+
+class ReturnsFile:
+    """
+    The returns of the asset pool, in chronological order, in two raw binary
+    files (the layout of price_store.PriceStore):
+    
+        dates.i8:        the dates, as int64 datetime64[D] values.
+        values.f8 / .f4: the returns, as a row-major (rows x columns) float64 or
+                         float32 matrix.
+        metadata.json:   the column names, the number of rows and the dtype.
+    
+    Rows are read in chunks through short-lived memory maps, so only the chunk
+    being processed is held in memory, however long the history is. Storing
+    float32 values halves the file and the chunks, at the cost of rounding each
+    return to 24 significant bits.
+    """
+    
+    
+    def __init__(self, directory):
+        """
+        "directory": string, the folder holding the returns.
+        """
+        self.directory = str(directory)
+        self.metadata_path = os.path.join(self.directory, 'metadata.json')
+        self.dates_path = os.path.join(self.directory, 'dates.i8')
+        self.columns = []
+        self.rows = 0
+        self.dtype = np.dtype(np.float64)
+        if self.exists():
+            self.read_metadata()
+    
+    
+    def exists(self):
+        """
+        Purpose: check whether the returns have been written.
+        """
+        return(os.path.exists(self.metadata_path))
+    
+    
+    def values_path(self):
+        """
+        Purpose: the path of the values file (its extension gives the dtype).
+        """
+        return(os.path.join(self.directory, 'values.f{}'.format(self.dtype.itemsize)))
+    
+    
+    def read_metadata(self):
+        """
+        Purpose: load the column names, row count and dtype.
+        """
+        with open(self.metadata_path) as metadata_file:
+            metadata = json.load(metadata_file)
+        self.columns = metadata['columns']
+        self.rows = int(metadata['rows'])
+        self.dtype = np.dtype(metadata['dtype'])
+    
+    
+    def write_metadata(self):
+        """
+        Purpose: save the column names, row count and dtype (atomically).
+        """
+        temporary_path = self.metadata_path + '.tmp'
+        with open(temporary_path, 'w') as metadata_file:
+            json.dump({'columns': self.columns, 'rows': self.rows, 'dtype': self.dtype.name},
+                      metadata_file)
+        os.replace(temporary_path, self.metadata_path)
+    
+    
+    def create(self, columns, dtype=np.float64):
+        """
+        Purpose: (re)create empty files for the returns of "columns".
+        
+        "dtype": numpy dtype, np.float64 or np.float32.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        self.columns = list(columns)
+        self.dtype = np.dtype(dtype)
+        if self.dtype not in [np.float64, np.float32]:
+            raise ValueError('Returns are stored as float64 or float32, not {}.'.format(self.dtype))
+        self.rows = 0
+        for filepath in [self.dates_path, self.values_path()]:
+            open(filepath, 'wb').close()
+        self.write_metadata()
+    
+    
+    def append_rows(self, dates, values):
+        """
+        Purpose: append rows at the end of the files.
+        
+        "dates": 1-D array, the dates (YYYY-MM-DD strings or datetime64 values),
+        in chronological order.
+        
+        "values": 2-D array, the returns (rows) of each column.
+        """
+        dates = np.asarray(dates).astype('datetime64[D]').astype(np.int64)
+        values = np.ascontiguousarray(values, dtype=self.dtype)
+        with open(self.dates_path, 'ab') as dates_file:
+            dates_file.write(dates.tobytes())
+        with open(self.values_path(), 'ab') as values_file:
+            values_file.write(values.tobytes())
+        self.rows += len(dates)
+        self.write_metadata()
+    
+    
+    def write(self, returns, dtype=np.float64, chunk_rows=65536):
+        """
+        Purpose: write the returns dataset.
+        
+        "returns": dataframe, the returns of the asset pool (in reverse
+        chronological order), as made by get.CalculateReturns().calculate_returns().
+        
+        "chunk_rows": integer, the number of rows converted at a time.
+        """
+        self.create(columns=list(returns.columns[1:]), dtype=dtype)
+        for chunk_stop in range(len(returns), 0, -int(chunk_rows)):
+            chronological_chunk = returns.iloc[max(0, chunk_stop - int(chunk_rows)):chunk_stop].iloc[::-1]
+            self.append_rows(chronological_chunk['Dates'].to_numpy(dtype=object),
+                             chronological_chunk.iloc[:, 1:].to_numpy(dtype=np.float64))
+        
+        return(self)
+    
+    
+    def write_from_prices(self, price_store, returns_calculator, dtype=np.float64,
+                          chunk_rows=65536):
+        """
+        Purpose: calculate the returns from a prices store chunk by chunk, without
+        loading the whole prices dataset.
+        
+        "price_store": price_store.PriceStore, the prices.
+        
+        "returns_calculator": get.CalculateReturns, adds the spreads and
+        calculates the returns of each chunk.
+        
+        "chunk_rows": integer, the number of rows of prices read at a time.
+        """
+        import pandas as pd
+        
+        chunk_rows = max(2, int(chunk_rows))
+        for chunk_start in range(0, max(0, price_store.rows - 1), chunk_rows - 1):
+            chunk_stop = min(chunk_start + chunk_rows, price_store.rows)
+            prices = pd.DataFrame(np.array(price_store.values()[chunk_start:chunk_stop][::-1]),
+                                  columns=price_store.columns)
+            prices.insert(0, 'Dates', np.datetime_as_string(price_store.dates()[chunk_start:chunk_stop][::-1],
+                                                            unit='D').astype(object))
+            returns = returns_calculator.calculate_returns(returns_calculator.add_curve_slope(prices))
+            if chunk_start == 0:
+                self.create(columns=list(returns.columns[1:]), dtype=dtype)
+            self.append_rows(returns['Dates'].to_numpy(dtype=object)[::-1],
+                             returns.iloc[::-1, 1:].to_numpy(dtype=np.float64))
+        
+        return(self)
+    
+    
+    def dates(self):
+        """
+        Purpose: read the dates (chronological order).
+        
+        Output: a 1-D datetime64[D] array.
+        """
+        return(np.fromfile(self.dates_path, dtype=np.int64, count=self.rows).view('datetime64[D]'))
+    
+    
+    def read(self, start, stop):
+        """
+        Purpose: read rows "start" to "stop" (chronological order, "stop" excluded).
+        
+        Output: a (rows x columns) float64 array (a copy; the memory map is closed).
+        """
+        start = max(0, int(start))
+        stop = min(int(stop), self.rows)
+        if stop <= start:
+            return(np.empty((0, len(self.columns)), dtype=np.float64))
+        row_bytes = len(self.columns) * self.dtype.itemsize
+        values = np.memmap(self.values_path(), dtype=self.dtype, mode='r', offset=start * row_bytes,
+                           shape=(stop - start, len(self.columns)))
+        chunk = np.array(values, dtype=np.float64)
+        del values
+        
+        return(chunk)
+    
+    
+    def column_means(self, chunk_rows=65536):
+        """
+        Purpose: the mean of each column, accumulated in float64 chunk by chunk.
+        """
+        column_sums = np.zeros(len(self.columns))
+        for chunk_start in range(0, self.rows, int(chunk_rows)):
+            column_sums += self.read(chunk_start, chunk_start + int(chunk_rows)).sum(axis=0)
+        
+        return(column_sums / max(1, self.rows))
+
+
+class OutOfCoreCalculate:
+    """
+    Calculates Turbulence and Systemic Risk from a ReturnsFile, reading a
+    bounded number of rows at a time. The memory used does not grow with the
+    number of rows, apart from the output series themselves (a few arrays of
+    one value per row).
+    
+    Every chunk is converted to float64 when it is read. The running covariance
+    statistics of Turbulence and the cumulative window sums of Systemic Risk are
+    always accumulated in float64. With "eigenvalue_dtype"=np.float32, the
+    eigenvalue decompositions of Systemic Risk run in float32.
+    """
+    
+    
+    def __init__(self, calculator=None, chunk_rows=4096, max_chunk_bytes=16 * 2**20,
+                 eigenvalue_dtype=np.float64):
+        """
+        "calculator": calc.Calculate, supplies the "Recession" series, and keeps
+        the indicator series and the state needed to extend both indicators
+        later with update_turbulence and update_systemic_risk (as after its own
+        calculate_turbulence and calculate_systemic_risk).
+        
+        "chunk_rows": integer, the number of rows read at a time for Turbulence.
+        
+        "max_chunk_bytes": integer, the memory budget for each chunk of Systemic
+        Risk windows (see covariance.SlidingWindowCovariances).
+        
+        "eigenvalue_dtype": numpy dtype, the precision of the Systemic Risk
+        eigenvalue decompositions.
+        """
+        if calculator is None:
+            import src.calculate as calc
+            calculator = calc.Calculate()
+        self.calculator = calculator
+        self.chunk_rows = int(chunk_rows)
+        self.max_chunk_bytes = int(max_chunk_bytes)
+        self.eigenvalue_dtype = np.dtype(eigenvalue_dtype)
+    
+    
+    def recession_series(self, dates):
+        """
+        Purpose: label the recession dates (as in calc.Calculate().recession_series).
+        
+        Output: a 1-D integer array.
+        """
+        return(self.calculator.regime_calendar.label(dates=dates, name=self.calculator.recession_regime,
+                                                     value=100))
+    
+    
+    def date_strings(self, dates):
+        """
+        Purpose: convert "dates" to the date-stamps kept by calc.Calculate.
+        
+        Output: a list of YYYY-MM-DD strings.
+        """
+        return(np.datetime_as_string(dates, unit='D').tolist())
+    
+    
+    def calculate_turbulence(self, returns_file, initial_window_size=250,
+                             refresh_interval=52, half_life=12,
+                             covariance_estimator='sample', covariance_options=None):
+        """
+        Purpose: calculate the Turbulence of the asset pool (see
+        calc.Calculate().calculate_turbulence for the arguments).
+        
+        Output: a dictionary of arrays: "Dates" (datetime64[D]), "Raw Turbulence",
+        "Turbulence" and "Recession". The calculator keeps the same series as
+        lists in "calculator.turbulence".
+        
+        "returns_file": ReturnsFile, the returns of the asset pool.
+        """
+        window_size = int(initial_window_size)
+        dates = returns_file.dates()[window_size:]
+        raw_turbulence = np.empty(len(dates))
+        if len(dates) > 0:
+            turbulence_sample = self.calculator.expanding_covariance(covariance_estimator=covariance_estimator,
+                                                                     refresh_interval=refresh_interval,
+                                                                     covariance_options=covariance_options)
+            turbulence_sample.fit(returns_file.read(0, window_size))
+            for chunk_start in range(window_size, returns_file.rows, self.chunk_rows):
+                chunk = returns_file.read(chunk_start, chunk_start + self.chunk_rows)
+                for row, observation in enumerate(chunk):
+                    raw_turbulence[chunk_start - window_size + row] = turbulence_sample.score_and_update(observation)
+            self.calculator.turbulence_sample = turbulence_sample
+        
+        smoothed_values, states = self.calculator.exponential_smoothers(raw_data=raw_turbulence[None],
+                                                                        half_lives=[half_life])
+        if len(dates) > 0:
+            import src.calculate as calc
+            self.calculator.smoother_state = calc.ExponentialSmootherState(
+                smoothed_value=float(states[0].smoothed_value[0]),
+                smoothing_factor=states[0].smoothing_factor)
+        
+        turbulence = {'Dates': dates,
+                      'Raw Turbulence': raw_turbulence,
+                      'Turbulence': smoothed_values[0, 0],
+                      'Recession': self.recession_series(dates)}
+        self.calculator.turbulence = {'Dates': self.date_strings(dates),
+                                      'Raw Turbulence': raw_turbulence.tolist(),
+                                      'Turbulence': turbulence['Turbulence'].tolist(),
+                                      'Recession': turbulence['Recession'].tolist()}
+        self.calculator.turbulence_attribution = None
+        
+        return(turbulence)
+    
+    
+    def calculate_systemic_risk(self, returns_file, window_size=250):
+        """
+        Purpose: calculate the Systemic Risk of the asset pool (see
+        calc.Calculate().calculate_systemic_risk), one chunk of windows at a time.
+        
+        Output: a dictionary of arrays: "Dates" (datetime64[D]), "Systemic Risk"
+        and "Recession". The calculator keeps the same series as lists in
+        "calculator.systemic_risk".
+        
+        "returns_file": ReturnsFile, the returns of the asset pool.
+        """
+        import src.covariance as cov
+        
+        window_size = int(window_size)
+        dates = returns_file.dates()[window_size:]
+        systemic_risk = np.empty(len(dates))
+        windows = cov.SlidingWindowCovariances(window_size=window_size, max_chunk_bytes=self.max_chunk_bytes,
+                                               eigenvalue_dtype=self.eigenvalue_dtype)
+        asset_count = len(returns_file.columns)
+        sample_mean = returns_file.column_means() if window_size >= asset_count else None
+        chunk_size = windows.eigenvalue_chunk_size(asset_count)
+        
+        for chunk_start in range(window_size, returns_file.rows, chunk_size):
+            chunk_stop = min(chunk_start + chunk_size, returns_file.rows)
+            rows = returns_file.read(chunk_start + 1 - window_size, chunk_stop)
+            eigenvalues = windows.window_eigenvalues(rows, sample_mean)
+            systemic_risk[chunk_start - window_size:chunk_stop - window_size] = (
+                self.calculator.gini_coefficients(values=eigenvalues, presorted=True))
+        self.calculator.systemic_risk_window = returns_file.read(returns_file.rows - window_size,
+                                                                 returns_file.rows)
+        
+        recession = self.recession_series(dates)
+        self.calculator.systemic_risk = {'Dates': self.date_strings(dates),
+                                         'Systemic Risk': systemic_risk.tolist(),
+                                         'Recession': recession.tolist()}
+        # No spectra are cached and no other spectral indicators are calculated.
+        self.calculator.spectral_layer = None
+        self.calculator.spectral_indicators = {}
+        
+        return({'Dates': dates,
+                'Systemic Risk': systemic_risk,
+                'Recession': recession})
+
+
+#MIT License
+#
+#Copyright (c) 2019 Terrence Zhang
+#
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+#
+#The above copyright notice and this permission notice shall be included in all
+#copies or substantial portions of the Software.
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#SOFTWARE.
@@ -0,0 +1,268 @@
+"""
+This module calculates the Turbulence and Systemic Risk indicators on a pool of
+processes.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import math
+import os
+
+import numpy as np
+
+
+class SharedArray:
+    """
+    One copy of an array in shared memory, which the workers of a process pool
+    read in place instead of receiving a pickled copy.
+    """
+    
+    
+    def __init__(self, array):
+        """
+        "array": array, the values to share (copied once into shared memory).
+        """
+        array = np.ascontiguousarray(array)
+        self.shape = array.shape
+        self.dtype = array.dtype.str
+        self.shared_block = shared_memory.SharedMemory(create=True, size=max(1, array.nbytes))
+        np.ndarray(self.shape, dtype=self.dtype, buffer=self.shared_block.buf)[...] = array
+    
+    
+    def spec(self):
+        """
+        Purpose: the (name, shape, dtype) tuple that workers pass to read_shared_array.
+        """
+        return((self.shared_block.name, self.shape, self.dtype))
+    
+    
+    def close(self):
+        """
+        Purpose: release the shared memory (once every worker is done with it).
+        """
+        self.shared_block.close()
+        self.shared_block.unlink()
+
+
+def read_shared_array(array_spec, function, *args):
+    """
+    Purpose: call function(array, *args) on an array shared by a SharedArray,
+    without copying it. "function" must not keep references to the array.
+    
+    Output: the output of "function".
+    
+    "array_spec": tuple, the output of SharedArray.spec().
+    """
+    name, shape, dtype = array_spec
+    shared_block = shared_memory.SharedMemory(name=name)
+    try:
+        array = np.ndarray(shape, dtype=dtype, buffer=shared_block.buf)
+        output = function(array, *args)
+        del array
+    finally:
+        shared_block.close()
+        
+    return(output)
+
+
+def turbulence_task(chronological_values, chronological_dates, regime_calendar,
+                    recession_regime, turbulence_options):
+    """
+    Purpose: calculate the Turbulence in a worker (see Calculate.expanding_turbulence).
+    
+    Output: a tuple (Turbulence, running covariance statistics, smoother state,
+    per-asset attribution).
+    """
+    import src.calculate as calc
+    
+    calculator = calc.Calculate(regime_calendar=regime_calendar,
+                                recession_regime=recession_regime)
+    calculator.expanding_turbulence(chronological_values=chronological_values,
+                                    chronological_dates=chronological_dates,
+                                    **turbulence_options)
+    
+    return(calculator.turbulence, calculator.turbulence_sample, calculator.smoother_state,
+           calculator.turbulence_attribution)
+
+
+def systemic_risk_task(chronological_values, first_endpoint, stop_endpoint,
+                       window_size, max_chunk_bytes, spectral_indicators=(),
+                       spectral_functions=None):
+    """
+    Purpose: calculate the Systemic Risk (and the other spectral indicators) of
+    the windows ending in [first_endpoint, stop_endpoint) in a worker (see
+    Calculate.windowed_spectral_indicators).
+    
+    Output: a dictionary containing the list of values of each indicator.
+    
+    "spectral_functions": dictionary, the indicators added with
+    Calculate.add_spectral_indicator, by name.
+    """
+    import src.calculate as calc
+    import src.regimes as reg
+    
+    calculator = calc.Calculate(regime_calendar=reg.RegimeCalendar())
+    calculator.spectral_functions = dict(spectral_functions or {})
+    row_numbers = np.arange(len(chronological_values))
+    values, _ = calculator.windowed_spectral_indicators(
+        chronological_values=chronological_values, chronological_dates=row_numbers,
+        first_endpoint=first_endpoint, window_size=window_size,
+        max_chunk_bytes=max_chunk_bytes, stop_endpoint=stop_endpoint,
+        names=['Systemic Risk'] + list(spectral_indicators))
+    
+    return(values)
+
+
+class ParallelCalculate:
+    """
+    Calculates both indicators at the same time on a process pool: the Turbulence
+    (a sequential recursion) in one worker, and the Systemic Risk windows split
+    into blocks across the other workers. Every worker reads one shared-memory
+    copy of the returns.
+    
+    The blocks are cut at the chunk boundaries used by the serial path (see
+    covariance.SlidingWindowCovariances.covariance_chunks) and reassembled in
+    date order, so the results are bit-identical to calculate_turbulence and
+    calculate_systemic_risk.
+    """
+    
+    
+    def __init__(self, max_workers=None, blocks_per_worker=4):
+        """
+        "max_workers": integer, the number of processes (defaults to the number
+        of CPUs).
+        
+        "blocks_per_worker": integer, the number of Systemic Risk blocks per
+        worker (more blocks balance the load better, at some overhead per block).
+        """
+        self.max_workers = int(max_workers or os.cpu_count() or 1)
+        self.blocks_per_worker = int(blocks_per_worker)
+    
+    
+    def systemic_risk_blocks(self, row_count, asset_count, window_size, max_chunk_bytes):
+        """
+        Purpose: split the Systemic Risk windows into blocks of whole chunks.
+        
+        Output: a list of (first endpoint, stop endpoint) tuples, in date order.
+        """
+        import src.covariance as cov
+        
+        windows = cov.SlidingWindowCovariances(window_size=window_size,
+                                               max_chunk_bytes=max_chunk_bytes)
+        chunk_size = windows.eigenvalue_chunk_size(asset_count)
+        chunk_count = math.ceil(max(0, row_count - window_size) / chunk_size)
+        chunks_per_block = max(1, math.ceil(chunk_count / (self.max_workers * self.blocks_per_worker)))
+        block_size = chunks_per_block * chunk_size
+        
+        return([(block_start, min(block_start + block_size, row_count))
+                for block_start in range(window_size, row_count, block_size)])
+    
+    
+    def spectral_functions(self, calculator, spectral_indicators):
+        """
+        Purpose: collect the functions of the requested indicators added with
+        add_spectral_indicator, which the workers need to calculate them.
+        
+        Output: a dictionary containing the function of each indicator, by name.
+        """
+        import pickle
+        
+        spectral_functions = {name: function for name, function in calculator.spectral_functions.items()
+                              if name in spectral_indicators}
+        for name, function in spectral_functions.items():
+            try:
+                pickle.dumps(function)
+            except Exception as error:
+                raise ValueError('The function of the spectral indicator "{}" cannot be sent to the '
+                                 'workers ({}). Use a module-level function, or max_workers=1.'.format(
+                                     name, error))
+        
+        return(spectral_functions)
+    
+    
+    def calculate(self, calculator, returns, window_size=250, max_chunk_bytes=64 * 2**20,
+                  spectral_indicators=None, **turbulence_options):
+        """
+        Purpose: calculate the Turbulence and the Systemic Risk of the asset pool,
+        leaving "calculator" in the state calculate_turbulence and
+        calculate_systemic_risk would leave it in.
+        
+        Output: a tuple (Turbulence, Systemic Risk), as dictionaries.
+        
+        "calculator": calculate.Calculate, receives the results.
+        
+        "returns": dataframe, the returns of the asset pool (in reverse
+        chronological order).
+        
+        "window_size", "max_chunk_bytes", "spectral_indicators": see
+        Calculate.calculate_systemic_risk. The indicators added to "calculator"
+        with add_spectral_indicator are sent to the workers, so their functions
+        must be picklable (e.g. module-level functions).
+        
+        "turbulence_options": see Calculate.calculate_turbulence.
+        """
+        window_size = int(window_size)
+        spectral_indicators = list(spectral_indicators or [])
+        spectral_functions = self.spectral_functions(calculator, spectral_indicators)
+        chronological_returns = returns.iloc[::-1]
+        chronological_dates = chronological_returns['Dates'].values
+        chronological_values = chronological_returns.iloc[:, 1:].to_numpy(dtype=np.float64)
+        blocks = self.systemic_risk_blocks(row_count=len(chronological_values),
+                                           asset_count=chronological_values.shape[1],
+                                           window_size=window_size,
+                                           max_chunk_bytes=max_chunk_bytes)
+        
+        shared_values = SharedArray(chronological_values)
+        try:
+            with ProcessPoolExecutor(max_workers=self.max_workers) as pool:
+                turbulence_pull = pool.submit(read_shared_array, shared_values.spec(),
+                                              turbulence_task, chronological_dates,
+                                              calculator.regime_calendar,
+                                              calculator.recession_regime, turbulence_options)
+                systemic_risk_pulls = [pool.submit(read_shared_array, shared_values.spec(),
+                                                   systemic_risk_task, block_start, block_stop,
+                                                   window_size, max_chunk_bytes, spectral_indicators,
+                                                   spectral_functions)
+                                       for block_start, block_stop in blocks]
+                values = {name: [] for name in ['Systemic Risk'] + spectral_indicators}
+                for systemic_risk_pull in systemic_risk_pulls:
+                    for name, block_values in systemic_risk_pull.result().items():
+                        values[name].extend(block_values)
+                (calculator.turbulence, calculator.turbulence_sample,
+                 calculator.smoother_state, calculator.turbulence_attribution) = turbulence_pull.result()
+        finally:
+            shared_values.close()
+        
+        systemic_risk_dates = list(chronological_dates[window_size:])
+        calculator.systemic_risk = {'Dates': systemic_risk_dates,
+                                    'Systemic Risk': values.pop('Systemic Risk'),
+                                    'Recession': calculator.recession_series(dates=systemic_risk_dates)}
+        calculator.spectral_indicators = {}
+        if len(values) > 0:
+            calculator.spectral_indicators = dict({'Dates': list(systemic_risk_dates)}, **values)
+        calculator.spectral_layer = None
+        calculator.systemic_risk_window = chronological_values[-window_size:]
+        
+        return(calculator.turbulence, calculator.systemic_risk)
+
+
+#MIT License
+#
+#Copyright (c) 2019 Terrence Zhang
+#
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+#
+#The above copyright notice and this permission notice shall be included in all
+#copies or substantial portions of the Software.
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#SOFTWARE.
@@ -0,0 +1,221 @@
+"""
+This module stores the prices dataset as memory-mapped columns on disk.
+"""
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+
+class PriceStore:
+    """
+    An append-only store for the prices dataset. Rows are kept in chronological
+    order in two raw binary files, so that new rows are appended at the end:
+
+        dates.i8:    the dates, as int64 datetime64[D] values.
+        values.f8:   the prices, as a row-major (rows x columns) float64 matrix.
+        metadata.json: the column names and the number of valid rows.
+
+    Appends cost O(new rows), dropping the most recent rows only updates the row
+    count (O(1)), and reads are memory-mapped (no copy).
+    """
+
+
+    def __init__(self, directory):
+        """
+        "directory": string, the folder holding the store.
+        """
+        self.directory = str(directory)
+        self.metadata_path = os.path.join(self.directory, 'metadata.json')
+        self.dates_path = os.path.join(self.directory, 'dates.i8')
+        self.values_path = os.path.join(self.directory, 'values.f8')
+        self.columns = []
+        self.rows = 0
+        if self.exists():
+            self.read_metadata()
+
+
+    def exists(self):
+        """
+        Purpose: check whether the store has been created.
+        """
+        return(os.path.exists(self.metadata_path))
+
+
+    def read_metadata(self):
+        """
+        Purpose: load the column names and row count.
+        """
+        with open(self.metadata_path) as metadata_file:
+            metadata = json.load(metadata_file)
+        self.columns = metadata['columns']
+        self.rows = int(metadata['rows'])
+
+
+    def write_metadata(self):
+        """
+        Purpose: save the column names and row count (atomically, so that an
+        interrupted write never leaves a partially written row count).
+        """
+        temporary_path = self.metadata_path + '.tmp'
+        with open(temporary_path, 'w') as metadata_file:
+            json.dump({'columns': self.columns, 'rows': self.rows}, metadata_file)
+        os.replace(temporary_path, self.metadata_path)
+
+
+    def dates(self):
+        """
+        Purpose: memory-map the dates (chronological order).
+
+        Output: a read-only 1-D datetime64[D] array.
+        """
+        if self.rows == 0:
+            return(np.empty(0, dtype='datetime64[D]'))
+        return(np.memmap(self.dates_path, dtype=np.int64, mode='r',
+                         shape=(self.rows,)).view('datetime64[D]'))
+
+
+    def values(self):
+        """
+        Purpose: memory-map the prices (chronological order).
+
+        Output: a read-only (rows x columns) float64 array, in the order of
+        "self.columns".
+        """
+        if self.rows == 0:
+            return(np.empty((0, len(self.columns)), dtype=np.float64))
+        return(np.memmap(self.values_path, dtype=np.float64, mode='r',
+                         shape=(self.rows, len(self.columns))))
+
+
+    def to_dataframe(self):
+        """
+        Purpose: read the prices dataset in the format used by the rest of the
+        code.
+
+        Output: a dataframe containing the prices, in reverse chronological
+        order, with dates as YYYY-MM-DD strings.
+        """
+        prices = pd.DataFrame(np.array(self.values()[::-1]), columns=self.columns)
+        prices.insert(0, 'Dates', np.datetime_as_string(self.dates()[::-1], unit='D').astype(object))
+
+        return(prices)
+
+
+    def write(self, prices):
+        """
+        Purpose: (re)create the store from a full prices dataset.
+
+        "prices": dataframe, contains prices (in reverse chronological order),
+        including a "Dates" column of YYYY-MM-DD strings.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        chronological_prices = prices.iloc[::-1]
+        self.columns = [column for column in prices.columns if column != 'Dates']
+        dates = chronological_prices['Dates'].to_numpy(dtype=object).astype('datetime64[D]').astype(np.int64)
+        values = np.ascontiguousarray(chronological_prices[self.columns].to_numpy(dtype=np.float64))
+
+        dates.tofile(self.dates_path)
+        values.tofile(self.values_path)
+        self.rows = len(dates)
+        self.write_metadata()
+
+
+    def append(self, prices):
+        """
+        Purpose: append the rows of "prices" that are newer than the most recent
+        stored date. If "prices" has columns that are not stored yet, the store
+        is rewritten with the new columns instead.
+
+        Output: the number of rows appended.
+
+        "prices": dataframe, contains prices (in reverse chronological order),
+        including a "Dates" column of YYYY-MM-DD strings.
+        """
+        if not self.exists():
+            self.write(prices)
+            return(len(prices))
+
+        new_columns = [column for column in prices.columns
+                       if column != 'Dates' and column not in self.columns]
+        if len(new_columns) > 0:
+            stored_prices = self.to_dataframe()
+            new_rows = np.ones(len(prices), dtype=bool)
+            if self.rows > 0:
+                new_rows = prices['Dates'].to_numpy(dtype=object).astype('datetime64[D]') > self.dates()[-1]
+            self.write(pd.concat([prices[new_rows], stored_prices], sort=False))
+            return(int(new_rows.sum()))
+
+        chronological_prices = prices.iloc[::-1]
+        dates = chronological_prices['Dates'].to_numpy(dtype=object).astype('datetime64[D]')
+        if self.rows > 0:
+            chronological_prices = chronological_prices[dates > self.dates()[-1]]
+            dates = dates[dates > self.dates()[-1]]
+        values = np.ascontiguousarray(chronological_prices.reindex(columns=self.columns)
+                                      .to_numpy(dtype=np.float64))
+
+        self.append_bytes(self.dates_path, dates.astype(np.int64), self.rows * 8)
+        self.append_bytes(self.values_path, values, self.rows * len(self.columns) * 8)
+        self.rows += len(dates)
+        self.write_metadata()
+
+        return(len(dates))
+
+
+    def append_bytes(self, filepath, array, offset):
+        """
+        Purpose: write "array" to "filepath" at byte "offset", discarding anything
+        after it (e.g. rows dropped by truncate, or an interrupted append).
+        """
+        mode = 'r+b' if os.path.exists(filepath) else 'w+b'
+        with open(filepath, mode) as binary_file:
+            binary_file.seek(offset)
+            binary_file.write(array.tobytes())
+            binary_file.truncate()
+
+
+    def truncate(self, rows_to_drop):
+        """
+        Purpose: drop the most recent rows. Only the row count changes; the
+        dropped bytes are overwritten by the next append.
+
+        "rows_to_drop": integer, the number of rows (reverse-chronological) to drop.
+        """
+        self.rows = max(0, self.rows - int(rows_to_drop))
+        self.write_metadata()
+
+
+    def migrate(self, pickle_path):
+        """
+        Purpose: create the store from a prices dataframe saved as a pickle
+        (e.g. the former "index_data.pkl").
+
+        "pickle_path": string, the path of the pickle file.
+        """
+        self.write(pd.read_pickle(pickle_path))
+
+        return(self)
+
+
+#MIT License
+#
+#Copyright (c) 2019 Terrence Zhang
+#
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+#
+#The above copyright notice and this permission notice shall be included in all
+#copies or substantial portions of the Software.
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#SOFTWARE.
@@ -0,0 +1,319 @@
+"""
+This module serves the indicator series over a local HTTP/JSON query API.
+"""
+import collections
+import hashlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import math
+import os
+import threading
+import time
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import numpy as np
+
+
+class IndicatorCache:
+    """
+    An in-memory columnar copy of the indicator series (one datetime64 array of
+    dates and one float64 array per column, for each series), loaded from the
+    .npz file written at the end of each pipeline run. The file is checked at
+    most every "reload_interval" seconds, and reloaded when it has changed.
+    
+    Serialized responses are kept per data version and query, so repeated
+    queries are answered without recalculating or re-serializing anything.
+    """
+    
+    
+    def __init__(self, filepath, reload_interval=1.0, max_cached_responses=4096):
+        """
+        "filepath": string, the .npz file holding the indicator series.
+        
+        "reload_interval": float, the number of seconds between checks for a
+        new version of the file.
+        
+        "max_cached_responses": integer, the number of serialized responses kept
+        (least recently used ones are dropped first).
+        """
+        self.filepath = str(filepath)
+        self.reload_interval = float(reload_interval)
+        self.max_cached_responses = int(max_cached_responses)
+        self.series = {}
+        self.version = None
+        self.last_check = -math.inf
+        self.responses = collections.OrderedDict()
+        self.lock = threading.Lock()
+    
+    
+    def write(self, series):
+        """
+        Purpose: save the indicator series for the query service. The file is
+        replaced atomically, so a running service never reads a partial file.
+        
+        "series": dictionary, where each item (e.g. Calculate().turbulence) holds
+        a "Dates" column (YYYY-MM-DD strings) and numeric columns of the same length.
+        """
+        arrays = {}
+        for name, columns in series.items():
+            for column, values in columns.items():
+                if column == 'Dates':
+                    arrays[name + '.' + column] = np.asarray(values, dtype='datetime64[D]')
+                else:
+                    arrays[name + '.' + column] = np.asarray(values, dtype=np.float64)
+        
+        temporary_path = self.filepath + '.tmp'
+        with open(temporary_path, 'wb') as series_file:
+            np.savez(series_file, **arrays)
+        os.replace(temporary_path, self.filepath)
+    
+    
+    def reload_if_changed(self):
+        """
+        Purpose: reload the series if the file has changed since it was loaded
+        (checked at most every "reload_interval" seconds).
+        """
+        now = time.monotonic()
+        if now - self.last_check < self.reload_interval:
+            return
+        self.last_check = now
+        try:
+            file_status = os.stat(self.filepath)
+        except FileNotFoundError:
+            return
+        version = '{:x}-{:x}'.format(file_status.st_mtime_ns, file_status.st_size)
+        if version == self.version:
+            return
+        
+        series = {}
+        with np.load(self.filepath) as series_file:
+            for key in series_file.files:
+                name, column = key.split('.', 1)
+                series.setdefault(name, {})[column] = series_file[key]
+        with self.lock:
+            self.series = series
+            self.version = version
+            self.responses.clear()
+    
+    
+    def json_values(self, values):
+        """
+        Purpose: convert an array to a list for a JSON response, with null (None)
+        in place of nan and infinite values, which are not valid JSON.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        output = values.tolist()
+        for row in np.nonzero(~np.isfinite(values))[0]:
+            output[row] = None
+        
+        return(output)
+    
+    
+    def query(self, name, start=None, end=None, columns=None, step=1,
+              max_points=None, aggregate='last'):
+        """
+        Purpose: select a date range of one series, and optionally downsample it.
+        
+        Output: a dictionary containing the dates (YYYY-MM-DD strings) and the
+        selected columns, as lists (with None for missing values).
+        
+        "name": string, the name of the series (e.g. "turbulence").
+        
+        "start", "end": strings, the first and last dates (YYYY-MM-DD, both
+        inclusive). Default to the whole series.
+        
+        "columns": list, the columns to return. Defaults to every column.
+        
+        "step": integer, the number of rows per downsampled row.
+        
+        "max_points": integer, the maximum number of rows returned (the step is
+        increased as needed).
+        
+        "aggregate": string, how the rows of each step are combined: "last",
+        "mean", "min" or "max". Downsampled rows are dated by their last row.
+        """
+        series = self.series.get(name)
+        if series is None:
+            raise KeyError('Unknown series "{}".'.format(name))
+        columns = [column for column in series if column != 'Dates'] if columns is None else list(columns)
+        unknown_columns = [column for column in columns if column not in series or column == 'Dates']
+        if len(unknown_columns) > 0:
+            raise ValueError('Unknown columns: {}'.format(unknown_columns))
+        if aggregate not in ['last', 'mean', 'min', 'max']:
+            raise ValueError('Unknown aggregate "{}".'.format(aggregate))
+        
+        dates = series['Dates']
+        first_row = 0 if start is None else int(np.searchsorted(dates, np.datetime64(start, 'D'), side='left'))
+        stop_row = len(dates) if end is None else int(np.searchsorted(dates, np.datetime64(end, 'D'), side='right'))
+        row_count = max(0, stop_row - first_row)
+        step = max(1, int(step))
+        if max_points is not None and row_count > 0:
+            step = max(step, math.ceil(row_count / max(1, int(max_points))))
+        
+        bucket_starts = np.arange(first_row, first_row + row_count, step)
+        bucket_ends = np.minimum(bucket_starts + step, stop_row)
+        output = {'Dates': np.datetime_as_string(dates[bucket_ends - 1], unit='D').tolist()}
+        for column in columns:
+            values = series[column]
+            if row_count == 0:
+                output[column] = []
+            elif aggregate == 'last' or step == 1:
+                output[column] = self.json_values(values[bucket_ends - 1])
+            elif aggregate == 'mean':
+                output[column] = self.json_values(np.add.reduceat(values[first_row:stop_row],
+                                                                  bucket_starts - first_row)
+                                                  / (bucket_ends - bucket_starts))
+            else:
+                reducer = np.minimum if aggregate == 'min' else np.maximum
+                output[column] = self.json_values(reducer.reduceat(values[first_row:stop_row],
+                                                                   bucket_starts - first_row))
+        
+        return(output)
+    
+    
+    def catalog(self):
+        """
+        Purpose: describe the available series.
+        
+        Output: a dictionary containing the columns, row count and date range of
+        each series.
+        """
+        catalog = {}
+        for name, series in self.series.items():
+            dates = np.datetime_as_string(series['Dates'][[0, -1]], unit='D').tolist() if len(series['Dates']) > 0 else [None, None]
+            catalog[name] = {'columns': [column for column in series if column != 'Dates'],
+                             'rows': len(series['Dates']), 'start': dates[0], 'end': dates[1]}
+        
+        return(catalog)
+    
+    
+    def response(self, request_path):
+        """
+        Purpose: answer a GET request:
+        
+            /series                   the available series (see catalog)
+            /series/NAME?start=YYYY-MM-DD&end=YYYY-MM-DD&columns=A,B
+                        &step=N&max_points=N&aggregate=last|mean|min|max
+        
+        Output: a tuple (HTTP status, JSON body as bytes, ETag). The ETag depends
+        on the data version and the request, so it changes whenever a pipeline
+        run changes the data.
+        """
+        self.reload_if_changed()
+        with self.lock:
+            version = self.version
+            cached_response = self.responses.get(request_path)
+            if cached_response is not None and cached_response[0] == version:
+                self.responses.move_to_end(request_path)
+                return(cached_response[1])
+        
+        url = urlsplit(request_path)
+        parts = [unquote(part) for part in url.path.strip('/').split('/')]
+        parameters = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        try:
+            if parts == ['series']:
+                status, payload = 200, {'series': self.catalog()}
+            elif len(parts) == 2 and parts[0] == 'series':
+                columns = parameters.get('columns')
+                max_points = parameters.get('max_points')
+                payload = self.query(name=parts[1], start=parameters.get('start'),
+                                     end=parameters.get('end'),
+                                     columns=None if columns is None else columns.split(','),
+                                     step=int(parameters.get('step', 1)),
+                                     max_points=None if max_points is None else int(max_points),
+                                     aggregate=parameters.get('aggregate', 'last'))
+                status = 200
+            else:
+                status, payload = 404, {'error': 'Unknown path "{}".'.format(url.path)}
+        except KeyError as error:
+            status, payload = 404, {'error': str(error.args[0])}
+        except ValueError as error:
+            status, payload = 400, {'error': str(error)}
+        
+        body = json.dumps(payload, allow_nan=False).encode('utf-8')
+        etag = '"{}-{}"'.format(version, hashlib.sha1(request_path.encode('utf-8')).hexdigest()[:16])
+        with self.lock:
+            if version == self.version:
+                self.responses[request_path] = (version, (status, body, etag))
+                while len(self.responses) > self.max_cached_responses:
+                    self.responses.popitem(last=False)
+        
+        return(status, body, etag)
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    """
+    Answers GET requests with IndicatorCache.response, over keep-alive HTTP/1.1
+    connections. Requests carrying a matching If-None-Match header get an empty
+    304 response.
+    """
+    protocol_version = 'HTTP/1.1'
+    # The headers and the body are written separately: without TCP_NODELAY, each
+    # keep-alive response would wait for the client's delayed ACK.
+    disable_nagle_algorithm = True
+    
+    
+    def do_GET(self):
+        status, body, etag = self.server.indicator_cache.response(self.path)
+        if status == 200 and etag in [tag.strip() for tag in self.headers.get('If-None-Match', '').split(',')]:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        if status == 200:
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        self.wfile.write(body)
+    
+    
+    def log_message(self, format, *args):
+        """
+        Requests are not logged (logging every request would slow the service down).
+        """
+        pass
+
+
+class QueryServer(ThreadingHTTPServer):
+    """
+    The local HTTP/JSON query service over the indicator series.
+    """
+    daemon_threads = True
+    
+    
+    def __init__(self, indicator_cache, host='127.0.0.1', port=8080):
+        """
+        "indicator_cache": IndicatorCache, the series to serve.
+        
+        "host", "port": the address to listen on.
+        """
+        self.indicator_cache = indicator_cache
+        super().__init__((host, int(port)), QueryHandler)
+
+
+#MIT License
+#
+#Copyright (c) 2019 Terrence Zhang
+#
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+#
+#The above copyright notice and this permission notice shall be included in all
+#copies or substantial portions of the Software.
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#SOFTWARE.
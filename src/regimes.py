@@ -0,0 +1,120 @@
+"""
+This module labels dates with the regimes (e.g. recessions) that contain them.
+"""
+import json
+
+import numpy as np
+
+# The NBER recessions labelled when no regime calendar is configured.
+NBER_RECESSIONS = [['2001-04-01', '2001-11-01'],
+                   ['2008-01-01', '2009-06-01'],
+                   ['2020-03-01', '2020-04-01']]
+
+
+class RegimeCalendar:
+    """
+    Holds named sets of regime intervals (e.g. NBER recessions, custom stress
+    episodes), stored as sorted, non-overlapping datetime64 bounds.
+    """
+    
+    
+    def __init__(self, regime_sets=None):
+        """
+        "regime_sets": dictionary, where each item is a list of
+        [start date, end date] pairs (YYYY-MM-DD strings, both ends inclusive).
+        """
+        self.regime_starts = {}
+        self.regime_ends = {}
+        for name, intervals in (regime_sets or {}).items():
+            self.add_regime_set(name=name, intervals=intervals)
+    
+    
+    def load(self, filepath):
+        """
+        Purpose: add the regime sets stored in a .json file, formatted like
+        "regime_sets" in __init__.
+        
+        "filepath": string, the path of the .json file.
+        """
+        with open(filepath) as regimes_file:
+            regime_sets = json.load(regimes_file)
+        for name, intervals in regime_sets.items():
+            self.add_regime_set(name=name, intervals=intervals)
+            
+        return(self)
+    
+    
+    def add_regime_set(self, name, intervals):
+        """
+        Purpose: add (or replace) a named set of regime intervals. Overlapping
+        intervals are merged.
+        
+        "name": string, the name of the regime set.
+        
+        "intervals": list of [start date, end date] pairs.
+        """
+        bounds = np.asarray(intervals, dtype='datetime64[D]').reshape(-1, 2)
+        if (bounds[:, 1] < bounds[:, 0]).any():
+            raise ValueError('Regime set "{}" has an interval that ends before it starts.'.format(name))
+        bounds = bounds[np.argsort(bounds[:, 0], kind='stable')]
+        
+        starts = []
+        ends = []
+        for start, end in bounds:
+            if len(ends) > 0 and start <= ends[-1]:
+                ends[-1] = max(ends[-1], end)
+            else:
+                starts.append(start)
+                ends.append(end)
+        self.regime_starts[str(name)] = np.array(starts, dtype='datetime64[D]')
+        self.regime_ends[str(name)] = np.array(ends, dtype='datetime64[D]')
+    
+    
+    def label(self, dates, name, value=100):
+        """
+        Purpose: determine which "dates" fall in a regime of the set "name".
+        
+        Output: a 1-D integer array containing "value" for each date in a regime,
+        and 0 for each date outside of every regime.
+        
+        "dates": iterable, the dates (YYYY-MM-DD strings or datetime64 values).
+        
+        "name": string, the name of the regime set.
+        
+        "value": integer, the label of dates that fall in a regime.
+        """
+        if name not in self.regime_starts:
+            raise KeyError('Unknown regime set "{}". Available regime sets: {}'.format(
+                           name, list(self.regime_starts.keys())))
+        dates = np.asarray(dates).astype('datetime64[D]')
+        starts = self.regime_starts[name]
+        ends = self.regime_ends[name]
+        
+        regime_index = np.searchsorted(starts, dates, side='right') - 1
+        in_regime = regime_index >= 0
+        in_regime[in_regime] = dates[in_regime] <= ends[regime_index[in_regime]]
+        
+        return(np.where(in_regime, int(value), 0))
+
+
+#MIT License
+#
+#Copyright (c) 2019 Terrence Zhang
+#
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+#
+#The above copyright notice and this permission notice shall be included in all
+#copies or substantial portions of the Software.
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#SOFTWARE.
@@ -0,0 +1,130 @@
+"""
+This module scores hypothetical return scenarios against the latest covariance
+estimate of the Turbulence indicator.
+"""
+import numpy as np
+
+
+class ScenarioScorer:
+    """
+    Scores scenarios (e.g. stress scenarios or Monte-Carlo draws of one week of
+    returns) as the Raw Turbulence they would have if they were the next row of
+    the returns, and ranks them against the historical Raw Turbulence series.
+    
+    The mean and a whitening matrix of the latest covariance estimate are
+    calculated once, when the scorer is created (see the whitening_matrix method
+    of the covariance estimators); the scorer is a snapshot, and does not follow
+    later updates of the estimator. Scoring N scenarios then costs one
+    (N x k) @ (k x k) matrix product, calculated in chunks of "chunk_rows"
+    scenarios to bound the memory used.
+    """
+    
+    
+    def __init__(self, turbulence_sample, raw_turbulence, columns=None, chunk_rows=16384):
+        """
+        "turbulence_sample": covariance.ExpandingCovariance or
+        covariance.ShrinkageExpandingCovariance, the running covariance
+        statistics of Turbulence (e.g. Calculate().turbulence_sample).
+        
+        "raw_turbulence": iterable, the historical Raw Turbulence values.
+        
+        "columns": list, the asset names, in the order of the returns columns.
+        Scenario dataframes are reordered to match.
+        
+        "chunk_rows": integer, the number of scenarios scored at a time.
+        """
+        self.mean = np.array(turbulence_sample.mean, dtype=np.float64)
+        self.whitening_matrix = np.ascontiguousarray(turbulence_sample.whitening_matrix())
+        self.historical_turbulence = np.sort(np.asarray(raw_turbulence, dtype=np.float64))
+        self.columns = None if columns is None else list(columns)
+        self.chunk_rows = int(chunk_rows)
+    
+    
+    def scenario_values(self, scenarios):
+        """
+        Purpose: convert scenarios to a (N x k) float64 array, in the order of the
+        returns columns.
+        """
+        if hasattr(scenarios, 'columns') and self.columns is not None:
+            scenarios = scenarios[self.columns]
+        scenarios = np.atleast_2d(np.asarray(scenarios, dtype=np.float64))
+        if scenarios.shape[1] != len(self.mean):
+            raise ValueError('Scenarios have {} assets; the covariance estimate has {}.'.format(
+                             scenarios.shape[1], len(self.mean)))
+        
+        return(scenarios)
+    
+    
+    def score(self, scenarios):
+        """
+        Purpose: calculate the Raw Turbulence (squared Mahalanobis distance from
+        the latest mean) of each scenario.
+        
+        Output: a 1-D array, one value per scenario.
+        
+        "scenarios": 2-D array or dataframe (N x k), one scenario of returns per row.
+        """
+        scenarios = self.scenario_values(scenarios)
+        turbulence = np.empty(len(scenarios))
+        for chunk_start in range(0, len(scenarios), self.chunk_rows):
+            chunk_stop = min(chunk_start + self.chunk_rows, len(scenarios))
+            whitened_deviations = (scenarios[chunk_start:chunk_stop] - self.mean) @ self.whitening_matrix
+            turbulence[chunk_start:chunk_stop] = np.einsum('ij,ij->i', whitened_deviations,
+                                                           whitened_deviations)
+        
+        return(turbulence)
+    
+    
+    def percentile_ranks(self, turbulence):
+        """
+        Purpose: rank Raw Turbulence values against the historical series.
+        
+        Output: a 1-D array, the percentage (0 to 100) of historical values that
+        are less than or equal to each value.
+        
+        "turbulence": iterable, the Raw Turbulence values.
+        """
+        turbulence = np.asarray(turbulence, dtype=np.float64)
+        if len(self.historical_turbulence) == 0:
+            return(np.full(turbulence.shape, np.nan))
+        ranks = np.searchsorted(self.historical_turbulence, turbulence, side='right')
+        
+        return(100 * ranks / len(self.historical_turbulence))
+    
+    
+    def score_scenarios(self, scenarios):
+        """
+        Purpose: score and rank scenarios.
+        
+        Output: a dictionary containing the "Raw Turbulence" and "Percentile Rank"
+        of each scenario, as 1-D arrays.
+        
+        "scenarios": 2-D array or dataframe (N x k), one scenario of returns per row.
+        """
+        turbulence = self.score(scenarios)
+        
+        return({'Raw Turbulence': turbulence,
+                'Percentile Rank': self.percentile_ranks(turbulence)})
+
+
+#MIT License
+#
+#Copyright (c) 2019 Terrence Zhang
+#
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+#
+#The above copyright notice and this permission notice shall be included in all
+#copies or substantial portions of the Software.
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#SOFTWARE.
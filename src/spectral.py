@@ -0,0 +1,309 @@
+"""
+This module calculates indicators from the eigenvalues of the covariance matrix
+of each window, sharing one eigenvalue decomposition per window between them.
+"""
+from collections import OrderedDict
+
+import numpy as np
+
+
+class SpectrumCache:
+    """
+    A least-recently-used cache of window spectra (the eigenvalues of the
+    covariance matrix of each window, in ascending order), keyed by the date
+    of the last row of the window. Holds at most "max_entries" spectra.
+    """
+
+
+    def __init__(self, max_entries=4096):
+        """
+        "max_entries": integer, the number of spectra kept.
+        """
+        self.max_entries = int(max_entries)
+        self.spectra = OrderedDict()
+
+
+    def __len__(self):
+        return(len(self.spectra))
+
+
+    def __contains__(self, end_date):
+        return(end_date in self.spectra)
+
+
+    def get(self, end_date):
+        """
+        Purpose: look up the spectrum of the window ending at "end_date".
+
+        Output: a 1-D array, or None if it is not cached.
+        """
+        spectrum = self.spectra.get(end_date)
+        if spectrum is not None:
+            self.spectra.move_to_end(end_date)
+        return(spectrum)
+
+
+    def put(self, end_date, spectrum):
+        """
+        Purpose: store the spectrum of the window ending at "end_date", evicting
+        the least recently used spectrum if the cache is full.
+        """
+        self.spectra[end_date] = spectrum
+        self.spectra.move_to_end(end_date)
+        while len(self.spectra) > self.max_entries:
+            self.spectra.popitem(last=False)
+
+
+    def clear(self):
+        """
+        Purpose: drop every cached spectrum.
+        """
+        self.spectra.clear()
+
+
+class SpectralIndicators:
+    """
+    A set of indicators calculated from window spectra. Each indicator is a
+    function mapping a (windows x k) array of eigenvalues, each row in
+    ascending order, to one value per window, in O(k) per window:
+
+        Absorption Ratio: the share of the total variance explained by the
+        largest "absorption_fraction" of the eigenvalues (Kritzman et al., 2011).
+
+        Top Eigenvalue Share: the share of the total variance explained by the
+        largest eigenvalue.
+
+        Effective Rank: exp of the entropy of the eigenvalues normalized to sum
+        to 1 (Roy and Vetterli, 2007), between 1 (one factor) and k (no common
+        factor).
+
+    More indicators are added with add().
+    """
+
+
+    def __init__(self, absorption_fraction=0.2):
+        """
+        "absorption_fraction": float, the fraction of the eigenvalues (rounded
+        up) used by the Absorption Ratio.
+        """
+        self.absorption_fraction = float(absorption_fraction)
+        self.indicators = OrderedDict([('Absorption Ratio', self.absorption_ratio),
+                                       ('Top Eigenvalue Share', self.top_eigenvalue_share),
+                                       ('Effective Rank', self.effective_rank)])
+
+
+    def add(self, name, function):
+        """
+        Purpose: add (or replace) an indicator.
+
+        "name": string, the name of the indicator.
+
+        "function": callable, maps a (windows x k) array of eigenvalues, each row
+        in ascending order, to a 1-D array of values. It must be picklable
+        (e.g. not a lambda) to be used by parallel.ParallelCalculate.
+        """
+        self.indicators[str(name)] = function
+
+        return(self)
+
+
+    def names(self):
+        """
+        Purpose: the names of the indicators, in the order they were added.
+        """
+        return(list(self.indicators.keys()))
+
+
+    def evaluate(self, eigenvalues, names=None):
+        """
+        Purpose: calculate indicators from a stack of spectra.
+
+        Output: a dictionary containing a 1-D array of values for each indicator.
+
+        "eigenvalues": 2-D array (windows x k), each row in ascending order.
+
+        "names": list, the indicators to calculate. Defaults to all of them.
+        """
+        names = self.names() if names is None else list(names)
+        unknown_names = [name for name in names if name not in self.indicators]
+        if len(unknown_names) > 0:
+            raise ValueError('Unknown spectral indicators: {}'.format(unknown_names))
+        eigenvalues = np.asarray(eigenvalues, dtype=np.float64)
+
+        return({name: np.asarray(self.indicators[name](eigenvalues), dtype=np.float64)
+                for name in names})
+
+
+    def absorption_ratio(self, eigenvalues):
+        """
+        Purpose: the share of the total variance explained by the largest
+        ceil("absorption_fraction" * k) eigenvalues.
+        """
+        top_count = max(1, int(np.ceil(self.absorption_fraction * eigenvalues.shape[-1])))
+        return(eigenvalues[:, -top_count:].sum(axis=1) / eigenvalues.sum(axis=1))
+
+
+    def top_eigenvalue_share(self, eigenvalues):
+        """
+        Purpose: the share of the total variance explained by the largest eigenvalue.
+        """
+        return(eigenvalues[:, -1] / eigenvalues.sum(axis=1))
+
+
+    def effective_rank(self, eigenvalues):
+        """
+        Purpose: exp of the Shannon entropy of the eigenvalues, normalized to sum
+        to 1. Eigenvalues that are zero up to rounding (or slightly negative)
+        count as zero.
+        """
+        eigenvalues = np.clip(eigenvalues, 0, None)
+        shares = eigenvalues / eigenvalues.sum(axis=1, keepdims=True)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            entropy_terms = np.where(shares > 0, shares * np.log(shares), 0.0)
+        return(np.exp(-entropy_terms.sum(axis=1)))
+
+
+class SpectralLayer:
+    """
+    Calculates the spectrum of each sliding window once, and every requested
+    spectral indicator from it.
+
+    Spectra are calculated in chunks by covariance.SlidingWindowCovariances,
+    and kept in a SpectrumCache keyed by the end date of each window. Windows
+    whose spectrum is cached are not decomposed again, so an extra indicator,
+    or an extra pass over recent dates, costs O(k) per window instead of an
+    O(k^3) eigenvalue decomposition. Only the eigenvalues are kept: every
+    indicator here depends on the spectrum alone.
+
+    The cache assumes that the returns of a date do not change. A new
+    SpectralLayer (or cache.clear()) is needed after the returns are revised.
+    """
+
+
+    def __init__(self, window_size=250, max_chunk_bytes=64 * 2**20, cache_size=4096,
+                 indicators=None):
+        """
+        "window_size": integer, the number of observations in each window.
+
+        "max_chunk_bytes": integer, the memory budget for each chunk of windows
+        (see covariance.SlidingWindowCovariances).
+
+        "cache_size": integer, the number of spectra kept in the cache.
+
+        "indicators": SpectralIndicators, the indicators that can be calculated.
+        Defaults to SpectralIndicators().
+        """
+        import src.covariance as cov
+
+        self.window_size = int(window_size)
+        self.windows = cov.SlidingWindowCovariances(window_size=self.window_size,
+                                                    max_chunk_bytes=max_chunk_bytes)
+        self.cache = SpectrumCache(max_entries=cache_size)
+        self.indicators = indicators if indicators is not None else SpectralIndicators()
+
+
+    def spectrum_chunks(self, chronological_values, chronological_dates,
+                        first_endpoint=None, stop_endpoint=None):
+        """
+        Purpose: get the spectrum of every window ending at or after
+        "first_endpoint", from the cache where possible. Within each chunk, the
+        windows between the first and the last uncached one are decomposed
+        together (so a cold cache gives the chunks, and the values, of
+        SlidingWindowCovariances.eigenvalue_chunks), and stored in the cache.
+
+        Output: a generator of (endpoints, eigenvalues) tuples, where
+        "eigenvalues" is a (len(endpoints) x k) array, each row in ascending order.
+
+        "chronological_values": 2-D array, the returns (rows) of each asset (columns).
+
+        "chronological_dates": 1-D array, the date-stamp of each row (the cache keys).
+
+        "stop_endpoint": integer, only windows ending before this row index are
+        returned. Defaults to all windows.
+        """
+        chronological_values = np.ascontiguousarray(chronological_values, dtype=np.float64)
+        first_endpoint, stop_endpoint = self.windows.endpoint_range(len(chronological_values),
+                                                                    first_endpoint, stop_endpoint)
+        chunk_size = self.windows.eigenvalue_chunk_size(chronological_values.shape[1])
+
+        for chunk_start in range(first_endpoint, stop_endpoint, chunk_size):
+            endpoints = np.arange(chunk_start, min(chunk_start + chunk_size, stop_endpoint))
+            spectra = [self.cache.get(chronological_dates[endpoint]) for endpoint in endpoints]
+            missing_rows = [row for row, spectrum in enumerate(spectra) if spectrum is None]
+            if len(missing_rows) > 0:
+                first_missing, stop_missing = missing_rows[0], missing_rows[-1] + 1
+                computed = np.concatenate([eigenvalues for _, eigenvalues in self.windows.eigenvalue_chunks(
+                    chronological_values, first_endpoint=int(endpoints[first_missing]),
+                    stop_endpoint=int(endpoints[stop_missing - 1]) + 1)])
+                for row, spectrum in enumerate(computed, start=first_missing):
+                    spectra[row] = spectrum
+                    self.cache.put(chronological_dates[endpoints[row]], spectrum)
+            yield(endpoints, np.vstack(spectra))
+
+
+    def calculate(self, chronological_values, chronological_dates, first_endpoint=None,
+                  stop_endpoint=None, names=None):
+        """
+        Purpose: calculate spectral indicators for every window ending at or
+        after "first_endpoint" (see spectrum_chunks for the arguments).
+
+        Output: a tuple (values, date-stamps), where "values" is a dictionary
+        containing the list of values of each indicator.
+
+        "names": list, the indicators to calculate. Defaults to all of them.
+        """
+        names = self.indicators.names() if names is None else list(names)
+        values = {name: [] for name in names}
+        dates = []
+        for endpoints, eigenvalues in self.spectrum_chunks(chronological_values, chronological_dates,
+                                                           first_endpoint, stop_endpoint):
+            for name, chunk_values in self.indicators.evaluate(eigenvalues, names).items():
+                values[name].extend(chunk_values.tolist())
+            dates.extend(chronological_dates[endpoints])
+
+        return(values, dates)
+
+
+    def evaluate_cached(self, dates, names=None):
+        """
+        Purpose: calculate spectral indicators from cached spectra only, without
+        the returns (e.g. an indicator added after the windows were decomposed).
+
+        Output: a dictionary containing a 1-D array of values for each indicator,
+        NaN for the dates whose spectrum is not (or no longer) cached.
+
+        "dates": iterable, the end dates of the windows.
+        """
+        names = self.indicators.names() if names is None else list(names)
+        spectra = [self.cache.get(date) for date in dates]
+        cached_rows = [row for row, spectrum in enumerate(spectra) if spectrum is not None]
+        values = {name: np.full(len(spectra), np.nan) for name in names}
+        if len(cached_rows) > 0:
+            cached_values = self.indicators.evaluate(np.vstack([spectra[row] for row in cached_rows]), names)
+            for name in names:
+                values[name][cached_rows] = cached_values[name]
+
+        return(values)
+
+
+#MIT License
+#
+#Copyright (c) 2019 Terrence Zhang
+#
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+#
+#The above copyright notice and this permission notice shall be included in all
+#copies or substantial portions of the Software.
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#SOFTWARE.
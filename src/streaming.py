@@ -0,0 +1,366 @@
+"""
+This module updates the Turbulence and Systemic Risk indicators bar by bar, from
+a local stream of prices.
+"""
+import asyncio
+import json
+import re
+import time
+
+import numpy as np
+
+import src.covariance as cov
+
+
+class OnlineIndicators:
+    """
+    Extends Raw Turbulence, Turbulence and Systemic Risk by one bar (one row of
+    prices) at a time, starting from the state saved in a checkpoint. Only the
+    running covariance statistics, the smoother state, the trailing Systemic
+    Risk window and the last prices are kept, not the history.
+    
+    Each bar costs O(k^2), plus one (k x k) eigenvalue decomposition for
+    Systemic Risk.
+    """
+    
+    
+    def __init__(self, calculator, universe, last_date, last_prices):
+        """
+        "calculator": calculate.Calculate, restored from a checkpoint (see
+        Calculate.restore_checkpoint).
+        
+        "universe": universe.Universe, the asset pool of the checkpoint.
+        
+        "last_date": string, the date-stamp of the last processed bar (YYYY-MM-DD).
+        
+        "last_prices": dictionary, the prices of the last processed bar, for each
+        asset in "universe.tickers".
+        """
+        self.calculator = calculator
+        self.assets = list(universe.tickers)
+        self.last_date = str(last_date)
+        self.last_prices = np.array([last_prices[asset] for asset in self.assets],
+                                    dtype=np.float64)
+        self.turbulence_sample = calculator.turbulence_sample
+        self.smoother_state = calculator.smoother_state
+        self.systemic_risk_window = cov.RollingCovariance(calculator.systemic_risk_window)
+        self.last_update_seconds = None
+        
+        self.minuends = np.array([self.assets.index(legs[0]) for legs in universe.spreads.values()],
+                                 dtype=np.intp)
+        self.subtrahends = np.array([self.assets.index(legs[1]) for legs in universe.spreads.values()],
+                                    dtype=np.intp)
+        levels = self.assets + list(universe.spreads)
+        return_assets = universe.return_assets()
+        self.return_levels = np.array([levels.index(asset) for asset in return_assets],
+                                      dtype=np.intp)
+        self.is_percent_change = np.isin(return_assets, universe.percent_change)
+    
+    
+    def levels(self, prices):
+        """
+        Purpose: the prices followed by the spreads of the universe.
+        """
+        return(np.concatenate([prices, prices[self.minuends] - prices[self.subtrahends]]))
+    
+    
+    def bar_returns(self, prices):
+        """
+        Purpose: calculate the returns between the last bar and "prices", as
+        get.CalculateReturns().calculate_returns() does.
+        
+        Output: a 1-D array containing the returns, in the order of
+        universe.return_assets().
+        """
+        newer_levels = self.levels(prices)[self.return_levels]
+        older_levels = self.levels(self.last_prices)[self.return_levels]
+        returns = newer_levels - older_levels
+        returns[self.is_percent_change] = (newer_levels[self.is_percent_change]
+                                           / older_levels[self.is_percent_change]) - 1
+        
+        return(returns)
+    
+    
+    def update(self, bar):
+        """
+        Purpose: extend the indicators with one bar. Missing, 0 and nan prices are
+        replaced with the previous bar's prices. Bars that are not newer than the
+        last processed bar are skipped.
+        
+        Output: a dictionary containing the new indicator values and their
+        date-stamp, or None if the bar was skipped.
+        
+        "bar": dictionary, the date-stamp ("Dates", YYYY-MM-DD) and the price of
+        each asset.
+        """
+        date = str(bar['Dates'])
+        if date <= self.last_date:
+            return(None)
+        
+        start = time.perf_counter()
+        prices = np.array([bar.get(asset, np.nan) for asset in self.assets], dtype=np.float64)
+        is_gap = (prices == 0) | np.isnan(prices)
+        prices[is_gap] = self.last_prices[is_gap]
+        returns = self.bar_returns(prices)
+        
+        raw_turbulence = self.turbulence_sample.score_and_update(returns)
+        turbulence = float(self.smoother_state.update(raw_turbulence))
+        self.systemic_risk_window.update(returns)
+        eigenvalues = np.linalg.eigvalsh(self.systemic_risk_window.covariance())
+        systemic_risk = float(self.calculator.gini_coefficients(values=eigenvalues[None],
+                                                                presorted=True)[0])
+        recession = int(self.calculator.recession_series(dates=[date])[0])
+        
+        self.last_date = date
+        self.last_prices = prices
+        self.last_update_seconds = time.perf_counter() - start
+        
+        return({'Dates': date, 'Raw Turbulence': raw_turbulence, 'Turbulence': turbulence,
+                'Systemic Risk': systemic_risk, 'Recession': recession})
+
+
+async def socket_lines(host, port):
+    """
+    Purpose: read lines from a local socket (e.g. a process publishing bars).
+    
+    Output: an asynchronous generator of lines.
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        async for line in reader:
+            yield(line.decode('utf-8'))
+    finally:
+        writer.close()
+
+
+async def file_lines(filepath, follow=True, poll_interval=0.1):
+    """
+    Purpose: read lines from a file or a named pipe, and keep waiting for new
+    lines at the end of the file (like "tail -f") if "follow" is True. Blocking
+    reads run in a thread, so the event loop is never blocked.
+    
+    Output: an asynchronous generator of lines.
+    
+    "poll_interval": float, the number of seconds between checks for new lines.
+    """
+    loop = asyncio.get_running_loop()
+    # Opening a named pipe blocks until a writer opens it.
+    bar_file = await loop.run_in_executor(None, open, filepath)
+    partial_line = ''
+    try:
+        while True:
+            line = await loop.run_in_executor(None, bar_file.readline)
+            if line.endswith('\n'):
+                yield(partial_line + line)
+                partial_line = ''
+            elif line:
+                partial_line += line
+            elif follow:
+                await asyncio.sleep(poll_interval)
+            else:
+                break
+        if partial_line:
+            yield(partial_line)
+    finally:
+        bar_file.close()
+
+
+def source_lines(source, follow=True):
+    """
+    Purpose: read lines from "source": a local socket ("host:port") or a file or
+    named pipe (any other string).
+    
+    Output: an asynchronous generator of lines.
+    """
+    address = re.fullmatch(r'(?:tcp://)?([\w.-]+):(\d+)', str(source))
+    if address is not None:
+        return(socket_lines(address.group(1), int(address.group(2))))
+    
+    return(file_lines(source, follow=follow))
+
+
+class StreamService:
+    """
+    Reads bars (one JSON object per line) from a source, extends the indicators
+    with each bar, and publishes every update to its subscribers.
+    
+    Backpressure: bars are read into a bounded queue, so a source that produces
+    bars faster than they are processed is paused (reading stops, and the source
+    blocks once the socket or pipe buffers are full). Each subscriber has its own
+    bounded queue; a subscriber that falls behind loses its oldest updates
+    (counted in "dropped_updates") instead of slowing down everyone else.
+    """
+    
+    
+    def __init__(self, indicators, bar_queue_size=1024, subscriber_queue_size=1024):
+        """
+        "indicators": OnlineIndicators, the indicators to extend.
+        
+        "bar_queue_size": integer, the number of bars read ahead of processing.
+        
+        "subscriber_queue_size": integer, the number of updates queued per subscriber.
+        """
+        self.indicators = indicators
+        self.bar_queue_size = int(bar_queue_size)
+        self.subscriber_queue_size = int(subscriber_queue_size)
+        self.subscribers = []
+        self.processed_bars = 0
+        self.dropped_updates = 0
+        self.max_update_seconds = 0.0
+    
+    
+    def subscribe(self):
+        """
+        Purpose: register a new subscriber.
+        
+        Output: an asyncio.Queue receiving each update (as a dictionary), then
+        None when the stream ends.
+        """
+        subscriber = asyncio.Queue(maxsize=self.subscriber_queue_size)
+        self.subscribers.append(subscriber)
+        
+        return(subscriber)
+    
+    
+    def unsubscribe(self, subscriber):
+        """
+        Purpose: stop publishing updates to "subscriber".
+        """
+        if subscriber in self.subscribers:
+            self.subscribers.remove(subscriber)
+    
+    
+    def publish(self, update):
+        """
+        Purpose: queue "update" for every subscriber, dropping the oldest queued
+        update of subscribers whose queue is full.
+        """
+        for subscriber in self.subscribers:
+            if subscriber.full():
+                subscriber.get_nowait()
+                self.dropped_updates += 1
+            subscriber.put_nowait(update)
+    
+    
+    async def read_bars(self, lines, bars):
+        """
+        Purpose: move lines from the source to the bar queue, waiting whenever
+        the queue is full.
+        """
+        async for line in lines:
+            if line.strip():
+                await bars.put(line)
+        await bars.put(None)
+    
+    
+    async def process_bars(self, bars):
+        """
+        Purpose: extend the indicators with each queued bar, and publish the
+        updates. Malformed bars are reported and skipped.
+        """
+        while True:
+            line = await bars.get()
+            if line is None:
+                break
+            try:
+                update = self.indicators.update(json.loads(line))
+            except (ValueError, KeyError, TypeError) as error:
+                print('\t Skipped a malformed bar ({}): {}'.format(error, line.strip()[:80]))
+                continue
+            if update is not None:
+                self.processed_bars += 1
+                self.max_update_seconds = max(self.max_update_seconds,
+                                              self.indicators.last_update_seconds)
+                self.publish(update)
+        self.publish(None)
+    
+    
+    async def run(self, lines):
+        """
+        Purpose: process the bars of a source until it ends.
+        
+        "lines": asynchronous iterable, the lines of the source (see source_lines).
+        """
+        bars = asyncio.Queue(maxsize=self.bar_queue_size)
+        await asyncio.gather(self.read_bars(lines, bars), self.process_bars(bars))
+    
+    
+    async def send_updates(self, reader, writer):
+        """
+        Purpose: send every update to one connected client, as JSON lines, until
+        the stream ends or the client disconnects.
+        """
+        subscriber = self.subscribe()
+        try:
+            while True:
+                update = await subscriber.get()
+                if update is None:
+                    break
+                writer.write((json.dumps(update) + '\n').encode('utf-8'))
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.unsubscribe(subscriber)
+            writer.close()
+    
+    
+    async def serve_subscribers(self, host='127.0.0.1', port=8765):
+        """
+        Purpose: publish the updates over TCP: every client connecting to
+        host:port receives each update as a JSON line.
+        
+        Output: the asyncio server (close it once the stream ends).
+        """
+        return(await asyncio.start_server(self.send_updates, host, port))
+    
+    
+    async def print_updates(self, subscriber):
+        """
+        Purpose: print every update of "subscriber" until the stream ends.
+        """
+        while True:
+            update = await subscriber.get()
+            if update is None:
+                break
+            print('{Dates}  Raw Turbulence {Raw Turbulence:.4f}  Turbulence {Turbulence:.4f}'
+                  '  Systemic Risk {Systemic Risk:.4f}  Recession {Recession}'.format(**update))
+    
+    
+    async def serve(self, lines, publish_port=None):
+        """
+        Purpose: process the bars of a source until it ends, and either publish
+        the updates over TCP on "publish_port" or print them (if None).
+        """
+        if publish_port is None:
+            printer = asyncio.ensure_future(self.print_updates(self.subscribe()))
+            await self.run(lines)
+            await printer
+        else:
+            server = await self.serve_subscribers(port=publish_port)
+            await self.run(lines)
+            server.close()
+            await server.wait_closed()
+
+
+#MIT License
+#
+#Copyright (c) 2019 Terrence Zhang
+#
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+#
+#The above copyright notice and this permission notice shall be included in all
+#copies or substantial portions of the Software.
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#SOFTWARE.
@@ -0,0 +1,213 @@
+"""
+This module puts the bars of every ticker on one canonical calendar of dates.
+"""
+import numpy as np
+
+
+class TradingCalendar:
+    """
+    A canonical grid of bar dates, weekly or business-daily, with the
+    vectorized date conversions and the as-of alignment used to put every
+    ticker on it. Dates are datetime64[D] arrays throughout; strings are only
+    produced by format() for the prices dataset.
+
+    Each bar is matched to the nearest grid date within "tolerance_days" (3 days
+    for weekly bars, so a bar stamped on the Sunday before a Monday grid date, by
+    an exchange in another timezone, still lands on the right week, while the
+    previous and next weeks are out of reach). Grid dates without a bar and bars
+    without a grid date are reported, rather than shifting the column.
+    """
+    frequencies = {'W': {'interval': '1wk', 'step_days': 7, 'tolerance_days': 3},
+                   'D': {'interval': '1d', 'step_days': 1, 'tolerance_days': 0}}
+
+
+    def __init__(self, frequency='W', tolerance_days=None):
+        """
+        "frequency": string, "W" for weekly bars or "D" for business-daily bars.
+
+        "tolerance_days": integer, the largest distance (in days) between a bar
+        and the grid date it is matched to. Defaults to 3 for weekly bars and 0
+        for daily bars.
+        """
+        if frequency not in self.frequencies:
+            raise ValueError('Unknown frequency "{}".'.format(frequency))
+        self.frequency = frequency
+        self.interval = self.frequencies[frequency]['interval']
+        self.step_days = self.frequencies[frequency]['step_days']
+        self.tolerance_days = int(self.frequencies[frequency]['tolerance_days']
+                                  if tolerance_days is None else tolerance_days)
+
+
+    def to_dates(self, timestamps, utc_offset=0):
+        """
+        Purpose: convert Unix timestamps to the local dates of the exchange.
+
+        Output: a datetime64[D] array.
+
+        "timestamps": 1-D array, the Unix timestamps (in seconds).
+
+        "utc_offset": integer, the offset of the exchange from UTC, in seconds
+        (the "gmtoffset" of a Yahoo Finance chart).
+        """
+        seconds = np.asarray(timestamps, dtype=np.int64) + int(utc_offset)
+        return(np.floor_divide(seconds, 86400).astype('datetime64[D]'))
+
+
+    def parse(self, date_strings):
+        """
+        Purpose: convert YYYY-MM-DD strings to dates.
+
+        Output: a datetime64[D] array.
+        """
+        return(np.asarray(date_strings, dtype=object).astype('datetime64[D]'))
+
+
+    def format(self, dates):
+        """
+        Purpose: convert dates to YYYY-MM-DD strings.
+
+        Output: an object array of strings.
+        """
+        return(np.datetime_as_string(np.asarray(dates, dtype='datetime64[D]'), unit='D').astype(object))
+
+
+    def grid(self, first_date, stop_date):
+        """
+        Purpose: the grid dates from "first_date" (included) to "stop_date"
+        (excluded): every "step_days" days for weekly bars, or every business
+        day (Monday to Friday) for daily bars.
+
+        Output: a datetime64[D] array, in chronological order.
+        """
+        first_date = np.datetime64(first_date, 'D')
+        stop_date = np.datetime64(stop_date, 'D')
+        if stop_date <= first_date:
+            return(np.empty(0, dtype='datetime64[D]'))
+        dates = np.arange(first_date, stop_date, self.step_days, dtype='datetime64[D]')
+        if self.frequency == 'D':
+            dates = dates[np.is_busday(dates)]
+
+        return(dates)
+
+
+    def complete_bars(self, dates, values, today):
+        """
+        Purpose: drop the last bar if it is still in progress: dated today or
+        later, or (for weekly bars) less than 6 days after the previous bar.
+
+        Output: a tuple (dates, values), in chronological order.
+
+        "dates", "values": 1-D arrays, the bars in chronological order.
+
+        "today": datetime64[D], the current date.
+        """
+        if len(dates) == 0:
+            return(dates, values)
+        in_progress = dates[-1] >= np.datetime64(today, 'D')
+        if len(dates) > 1 and self.step_days > 1:
+            in_progress = in_progress or (dates[-1] - dates[-2]) < np.timedelta64(self.step_days - 1, 'D')
+        if in_progress:
+            return(dates[:-1], values[:-1])
+
+        return(dates, values)
+
+
+    def align(self, grid, dates, values):
+        """
+        Purpose: as-of join of one ticker's bars onto the grid. Each bar goes to
+        the nearest grid date within "tolerance_days"; when several bars reach
+        the same grid date, the nearest one (the latest, on a tie) is kept.
+
+        Output: a tuple (aligned values, report). "aligned values" is a float64
+        array with one value per grid date (NaN where no bar matched). "report"
+        is a dictionary:
+
+            "missing": the grid dates without a bar.
+            "unmatched": the dates of the bars within the span of the grid that
+            were not used (off the grid, or a second bar for the same grid date).
+            Bars before or after the grid are ignored.
+            "shifted": the number of bars used on a grid date other than their own.
+
+        "grid": datetime64[D] array, the grid dates, in chronological order.
+
+        "dates", "values": 1-D arrays, the bars in chronological order.
+        """
+        grid = np.asarray(grid, dtype='datetime64[D]')
+        dates = np.asarray(dates, dtype='datetime64[D]')
+        values = np.asarray(values, dtype=np.float64)
+        aligned_values = np.full(len(grid), np.nan)
+        if len(grid) == 0 or len(dates) == 0:
+            return(aligned_values, {'missing': grid, 'unmatched': dates, 'shifted': 0})
+
+        grid_days = grid.astype(np.int64)
+        bar_days = dates.astype(np.int64)
+        next_rows = np.clip(np.searchsorted(grid_days, bar_days), 1, len(grid) - 1)
+        previous_rows = next_rows - 1
+        if len(grid) == 1:
+            next_rows = previous_rows = np.zeros(len(dates), dtype=np.int64)
+        previous_distances = np.abs(bar_days - grid_days[previous_rows])
+        next_distances = np.abs(grid_days[next_rows] - bar_days)
+        grid_rows = np.where(next_distances < previous_distances, next_rows, previous_rows)
+        distances = np.minimum(previous_distances, next_distances)
+
+        candidates = np.nonzero(distances <= self.tolerance_days)[0]
+        # Nearest bar first for each grid date, the latest bar first on a tie.
+        order = np.lexsort((-candidates, distances[candidates], grid_rows[candidates]))
+        candidates = candidates[order]
+        _, first_candidates = np.unique(grid_rows[candidates], return_index=True)
+        used_bars = candidates[first_candidates]
+        aligned_values[grid_rows[used_bars]] = values[used_bars]
+
+        is_used = ((bar_days < grid_days[0] - self.tolerance_days)
+                   | (bar_days > grid_days[-1] + self.tolerance_days))
+        is_used[used_bars] = True
+        has_bar = np.zeros(len(grid), dtype=bool)
+        has_bar[grid_rows[used_bars]] = True
+        report = {'missing': grid[~has_bar],
+                  'unmatched': dates[~is_used],
+                  'shifted': int(np.count_nonzero(distances[used_bars]))}
+
+        return(aligned_values, report)
+
+
+    def describe(self, report):
+        """
+        Purpose: summarize an alignment report in one line.
+
+        Output: a string, empty if the bars matched the grid exactly.
+        """
+        parts = []
+        if len(report['missing']) > 0:
+            parts.append('{} grid dates without a bar ({})'.format(
+                len(report['missing']), ', '.join(self.format(report['missing'][:5]))))
+        if len(report['unmatched']) > 0:
+            parts.append('{} bars off the grid ({})'.format(
+                len(report['unmatched']), ', '.join(self.format(report['unmatched'][:5]))))
+        if report['shifted'] > 0:
+            parts.append('{} bars dated up to {} days from their grid date'.format(
+                report['shifted'], self.tolerance_days))
+
+        return('; '.join(parts))
+
+
+#MIT License
+#
+#Copyright (c) 2019 Terrence Zhang
+#
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+#
+#The above copyright notice and this permission notice shall be included in all
+#copies or substantial portions of the Software.
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#SOFTWARE.
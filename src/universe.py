@@ -0,0 +1,124 @@
+"""
+This module defines the asset universe used by the Turbulence indicators.
+"""
+import json
+
+# The baseline 11-asset pool (the same as data/universe.json), used when no
+# universe is configured.
+DEFAULT_UNIVERSE = {
+    'calendar': 'Russell2000',
+    'tickers': {'FTSE100': '^FTSE', 'Nikkei225': '^N225', 'DAX': '^GDAXI', 'CAC40': '^FCHI',
+                'HangSeng': '^HSI', 'Bovespa': '^BVSP', 'Russell2000': '^RUT', '13W_UST': '^IRX',
+                '5Y_UST': '^FVX', '10Y_UST': '^TNX', '30Y_UST': '^TYX'},
+    'spreads': {'CurveSlope_10Y-5Y': ['10Y_UST', '5Y_UST'],
+                'CurveSlope_10Y-13W': ['10Y_UST', '13W_UST']},
+    'percent_change': ['FTSE100', 'Nikkei225', 'DAX', 'CAC40', 'HangSeng', 'Bovespa', 'Russell2000'],
+    'absolute_change': ['10Y_UST', '30Y_UST', 'CurveSlope_10Y-5Y', 'CurveSlope_10Y-13W'],
+    'covariance_estimator': 'sample'
+}
+
+
+class Universe:
+    """
+    The assets pulled from Yahoo Finance, the spreads derived from them, and the
+    returns calculated for each asset, as defined in a .json file (see
+    data/universe.json).
+    """
+    
+    
+    def __init__(self, tickers=None, calendar=None, spreads=None, percent_change=None,
+                 absolute_change=None, covariance_estimator='sample', covariance_options=None):
+        """
+        "tickers": dictionary, the Yahoo Finance ticker of each asset (by name).
+        
+        "calendar": string, the asset whose dates are used for the prices dataset.
+        Defaults to the first asset in "tickers".
+        
+        "spreads": dictionary, where each item is a [minuend, subtrahend] pair of
+        asset names (e.g. a yield curve slope).
+        
+        "percent_change": list, the assets (or spreads) whose returns are percent
+        changes.
+        
+        "absolute_change": list, the assets (or spreads) whose returns are absolute
+        changes (e.g. yields).
+        
+        "covariance_estimator": string, the covariance estimator used by the
+        Turbulence indicator: "sample", "ledoit_wolf" for large universes, or
+        "exponential" / "rolling" to forget old observations.
+        
+        "covariance_options": dictionary, extra arguments of the covariance
+        estimator (e.g. {"half_life": 52} for "exponential").
+        """
+        self.tickers = dict(tickers or {})
+        self.calendar = calendar
+        self.spreads = dict(spreads or {})
+        self.percent_change = list(percent_change or [])
+        self.absolute_change = list(absolute_change or [])
+        self.covariance_estimator = str(covariance_estimator)
+        self.covariance_options = dict(covariance_options or {})
+        if self.calendar is None and len(self.tickers) > 0:
+            self.calendar = list(self.tickers.keys())[0]
+    
+    
+    def load(self, filepath):
+        """
+        Purpose: read the universe stored in a .json file, whose keys are the
+        arguments of __init__.
+        
+        "filepath": string, the path of the .json file.
+        """
+        with open(filepath) as universe_file:
+            definition = json.load(universe_file)
+        self.__init__(**definition)
+        self.validate()
+        
+        return(self)
+    
+    
+    def validate(self):
+        """
+        Purpose: check that every spread and return refers to a known asset.
+        """
+        if self.calendar not in self.tickers:
+            raise ValueError('The calendar asset "{}" is not in the tickers.'.format(self.calendar))
+        for spread, legs in self.spreads.items():
+            unknown_legs = [leg for leg in legs if leg not in self.tickers]
+            if len(legs) != 2 or len(unknown_legs) > 0:
+                raise ValueError('Spread "{}" must be a pair of assets in the tickers.'.format(spread))
+        unknown_assets = [asset for asset in self.return_assets()
+                          if asset not in self.tickers and asset not in self.spreads]
+        if len(unknown_assets) > 0:
+            raise ValueError('Unknown assets in the returns: {}'.format(unknown_assets))
+        if self.covariance_estimator not in ['sample', 'ledoit_wolf', 'exponential', 'rolling']:
+            raise ValueError('Unknown covariance estimator "{}".'.format(self.covariance_estimator))
+    
+    
+    def return_assets(self):
+        """
+        Purpose: the columns of the returns dataset, in order.
+        """
+        return(self.percent_change + self.absolute_change)
+
+
+#MIT License
+#
+#Copyright (c) 2019 Terrence Zhang
+#
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+#
+#The above copyright notice and this permission notice shall be included in all
+#copies or substantial portions of the Software.
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#SOFTWARE.
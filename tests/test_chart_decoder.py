@@ -0,0 +1,83 @@
+"""
+Checks the decoder of Yahoo Finance chart responses (get.ChartDecoder).
+"""
+import json
+import os
+
+import numpy as np
+import pytest
+
+import src.get_data as get
+
+CHART_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'chart_response.json')
+
+
+@pytest.fixture
+def response_text():
+    # A weekly ^GDAXI chart response, with null closes in two bars.
+    with open(CHART_PATH) as chart_file:
+        return(chart_file.read())
+
+
+def reference(response_text):
+    """
+    Purpose: the same fields, read with the json module.
+    """
+    chart = json.loads(response_text)['chart']['result'][0]
+    adjclose = [np.nan if value is None else value for value in chart['indicators']['adjclose'][0]['adjclose']]
+    return(np.array(chart['timestamp'], dtype=np.int64), np.array(adjclose, dtype=np.float64),
+           chart['meta']['gmtoffset'])
+
+
+@pytest.mark.filterwarnings('error')
+def test_decode_matches_json(response_text):
+    chart = get.ChartDecoder().decode(response_text)
+    timestamps, adjclose, gmtoffset = reference(response_text)
+
+    assert chart['timestamp'].dtype == np.int64
+    np.testing.assert_array_equal(chart['timestamp'], timestamps)
+    np.testing.assert_array_equal(chart['adjclose'], adjclose)
+    assert np.isnan(chart['adjclose']).sum() == 2
+    assert chart['gmtoffset'] == gmtoffset
+
+
+@pytest.mark.filterwarnings('error')
+@pytest.mark.parametrize('chunk_size', [1, 7, 64])
+def test_chunks_match_whole_response(response_text, chunk_size):
+    chart_decoder = get.ChartDecoder()
+    for start in range(0, len(response_text), chunk_size):
+        chart_decoder.feed(response_text[start:start + chunk_size])
+    chart = chart_decoder.close()
+    expected_chart = get.ChartDecoder().decode(response_text)
+
+    np.testing.assert_array_equal(chart['timestamp'], expected_chart['timestamp'])
+    np.testing.assert_array_equal(chart['adjclose'], expected_chart['adjclose'])
+    assert chart['gmtoffset'] == expected_chart['gmtoffset']
+
+
+def test_truncated_response_raises(response_text):
+    with pytest.raises(ValueError):
+        get.ChartDecoder().decode(response_text[:len(response_text) // 2])
+
+
+#MIT License
+#
+#Copyright (c) 2019 Terrence Zhang
+#
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+#
+#The above copyright notice and this permission notice shall be included in all
+#copies or substantial portions of the Software.
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#SOFTWARE.
@@ -0,0 +1,161 @@
+"""
+Checks the concurrent Yahoo Finance fetcher (get.GetPrices) against a local mock
+HTTP server.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+import numpy as np
+import pandas as pd
+import pytest
+import requests as req
+
+import src.get_data as get
+import src.universe as uni
+
+DELAYS = {'AAA': 0.1, 'BBB': 0.2, 'CCC': 0.3, 'DDD': 0.6}
+
+
+def chart_payload(rows=200):
+    timestamps = (np.datetime64('2020-01-06') + 7 * np.arange(rows)).astype('datetime64[s]').astype(np.int64)
+    chart = {'meta': {'gmtoffset': 0},
+             'timestamp': timestamps.tolist(),
+             'indicators': {'adjclose': [{'adjclose': (100.0 + np.arange(rows)).tolist()}]}}
+    return(json.dumps({'chart': {'result': [chart], 'error': None}}).encode())
+
+
+class MockYahooHandler(BaseHTTPRequestHandler):
+    """
+    Serves a crumb and one chart per ticker, after the ticker's delay. Tickers in
+    "failures" get an HTTP 503 for as many requests as their count. Every request
+    (crumb or quote) is counted in "requests".
+    """
+    protocol_version = 'HTTP/1.1'
+    body = chart_payload()
+    delays = {}
+    failures = {}
+    quote_requests = {}
+    requests = 0
+    lock = threading.Lock()
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        with self.lock:
+            MockYahooHandler.requests += 1
+        if path.startswith('/quote/'):
+            self.respond(200, b'<html>crumb:x,</html>')
+            return
+        symbol = path.split('/')[-1]
+        with self.lock:
+            self.quote_requests[symbol] = self.quote_requests.get(symbol, 0) + 1
+            failing = self.failures.get(symbol, 0) > 0
+            if failing:
+                self.failures[symbol] -= 1
+        time.sleep(self.delays.get(symbol, 0))
+        if failing:
+            self.respond(503, b'')
+        else:
+            self.respond(200, self.body)
+
+    def respond(self, status, body):
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def base_url():
+    MockYahooHandler.delays = dict(DELAYS)
+    MockYahooHandler.failures = {}
+    MockYahooHandler.quote_requests = {}
+    MockYahooHandler.requests = 0
+    server = ThreadingHTTPServer(('127.0.0.1', 0), MockYahooHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield('http://127.0.0.1:{}'.format(server.server_address[1]))
+    server.shutdown()
+    server.server_close()
+
+
+def price_source(base_url, **kwargs):
+    universe = uni.Universe(tickers={symbol: symbol for symbol in DELAYS}, percent_change=list(DELAYS))
+    options = {'max_workers': len(DELAYS), 'requests_per_second': 100.0, 'burst': 10,
+               'base_delay': 0.01, 'max_delay': 0.05}
+    options.update(kwargs)
+    return(get.GetPrices(universe=universe, base_url=base_url, **options))
+
+
+def test_wall_time_tracks_slowest_ticker(base_url):
+    start = time.perf_counter()
+    prices = price_source(base_url).get_weekly_prices()
+    seconds = time.perf_counter() - start
+
+    assert seconds >= max(DELAYS.values())
+    assert seconds < 0.5 * (max(DELAYS.values()) + sum(DELAYS.values()))
+    assert len(prices['Dates']) == 200
+    assert all(prices[symbol] == prices['AAA'] for symbol in DELAYS)
+
+
+def test_retries_server_errors(base_url):
+    MockYahooHandler.failures = {'BBB': 2}
+    prices = price_source(base_url).get_weekly_prices()
+
+    assert MockYahooHandler.quote_requests['BBB'] == 3
+    assert MockYahooHandler.quote_requests['AAA'] == 1
+    assert prices['BBB'] == prices['AAA']
+
+
+def test_gives_up_after_max_retries(base_url):
+    MockYahooHandler.failures = {'CCC': 10}
+    with pytest.raises(req.exceptions.HTTPError):
+        price_source(base_url, max_retries=2).get_weekly_prices()
+
+    assert MockYahooHandler.quote_requests['CCC'] == 3
+
+
+
+def test_same_day_update_uses_the_cache(base_url, tmp_path):
+    MockYahooHandler.delays = {}
+    prices = pd.DataFrame(price_source(base_url).get_weekly_prices())
+    stored_prices = prices.iloc[10:].reset_index(drop=True)
+    cache = get.ResponseCache(str(tmp_path))
+
+    MockYahooHandler.requests = 0
+    first_run = price_source(base_url, cache=cache).update_weekly_prices(stored_prices)
+    assert MockYahooHandler.requests > 0
+    assert len(first_run) == len(prices)
+
+    # The first run moved the latest stored date (and so the requested range),
+    # but the responses stored that day still cover it.
+    MockYahooHandler.requests = 0
+    second_run = price_source(base_url, cache=cache).update_weekly_prices(first_run)
+    assert MockYahooHandler.requests == 0
+    pd.testing.assert_frame_equal(second_run, first_run)
+
+#MIT License
+#
+#Copyright (c) 2019 Terrence Zhang
+#
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+#
+#The above copyright notice and this permission notice shall be included in all
+#copies or substantial portions of the Software.
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#SOFTWARE.
@@ -0,0 +1,81 @@
+"""
+Checks that extending the indicators from the state of a previous run gives the
+same results as a full run.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import src.calculate as calc
+import src.get_data as get
+
+NEW_ROWS = 13
+
+
+@pytest.fixture(scope='module')
+def returns():
+    prices_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                               'data', 'index_data.pkl')
+    prices = get.CalculateReturns().add_curve_slope(pd.read_pickle(prices_path))
+    return(get.CalculateReturns().calculate_returns(prices))
+
+
+@pytest.fixture(scope='module')
+def full_run(returns):
+    calculator = calc.Calculate()
+    calculator.calculate_turbulence(returns)
+    calculator.calculate_systemic_risk(returns)
+    return(calculator)
+
+
+@pytest.fixture(scope='module')
+def incremental_run(returns):
+    calculator = calc.Calculate()
+    calculator.calculate_turbulence(returns.iloc[NEW_ROWS:])
+    calculator.calculate_systemic_risk(returns.iloc[NEW_ROWS:])
+    # Two weekly runs: the older rows first, then the newest ones.
+    for new_returns in [returns.iloc[5:NEW_ROWS], returns.iloc[:5]]:
+        calculator.update_turbulence(new_returns)
+        calculator.update_systemic_risk(new_returns)
+    return(calculator)
+
+
+def test_turbulence_matches_full_run(full_run, incremental_run):
+    assert incremental_run.turbulence['Dates'] == full_run.turbulence['Dates']
+    for column in ['Raw Turbulence', 'Turbulence']:
+        np.testing.assert_array_equal(incremental_run.turbulence[column], full_run.turbulence[column])
+
+
+def test_systemic_risk_matches_full_run(full_run, incremental_run):
+    # The chunked cumulative sums are re-based at a different row, so the
+    # covariance matrices (and Systemic Risk) can differ in the last bits.
+    assert incremental_run.systemic_risk['Dates'] == full_run.systemic_risk['Dates']
+    np.testing.assert_allclose(incremental_run.systemic_risk['Systemic Risk'],
+                               full_run.systemic_risk['Systemic Risk'], rtol=0, atol=1e-12)
+    np.testing.assert_array_equal(incremental_run.systemic_risk['Recession'],
+                                  full_run.systemic_risk['Recession'])
+
+
+#MIT License
+#
+#Copyright (c) 2019 Terrence Zhang
+#
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+#
+#The above copyright notice and this permission notice shall be included in all
+#copies or substantial portions of the Software.
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#SOFTWARE.
@@ -0,0 +1,67 @@
+"""
+Checks the per-stage run metrics (instrumentation.RunInstrumentation).
+"""
+import json
+import tracemalloc
+
+import src.instrumentation as instr
+
+
+def test_memory_is_not_traced_by_default(tmp_path):
+    instrumentation = instr.RunInstrumentation(metrics_path=str(tmp_path / 'run_metrics.jsonl'))
+    with instrumentation.stage('stage', rows=10) as record:
+        assert not tracemalloc.is_tracing()
+    instrumentation.finish()
+
+    with open(str(tmp_path / 'run_metrics.jsonl')) as metrics_file:
+        records = [json.loads(line) for line in metrics_file]
+    assert [record['stage'] for record in records] == ['stage', 'run']
+    assert records[0]['rows'] == 10
+    assert records[0]['peak_mb'] is None
+
+
+def test_existing_tracing_is_left_running():
+    tracemalloc.start()
+    try:
+        held_before = bytearray(8 * 2**20)
+        instrumentation = instr.RunInstrumentation(track_memory=True)
+        with instrumentation.stage('stage'):
+            allocated = bytearray(2**20)
+        assert tracemalloc.is_tracing()
+        # The memory traced before the stage is not counted towards it.
+        assert 1 <= instrumentation.records[-1]['peak_mb'] < 4
+    finally:
+        tracemalloc.stop()
+
+
+def test_own_tracing_is_stopped():
+    instrumentation = instr.RunInstrumentation(track_memory=True)
+    with instrumentation.stage('stage'):
+        assert tracemalloc.is_tracing()
+        allocated = bytearray(2**20)
+
+    assert not tracemalloc.is_tracing()
+    assert instrumentation.records[-1]['peak_mb'] >= 1
+
+
+#MIT License
+#
+#Copyright (c) 2019 Terrence Zhang
+#
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+#
+#The above copyright notice and this permission notice shall be included in all
+#copies or substantial portions of the Software.
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#SOFTWARE.
@@ -0,0 +1,76 @@
+"""
+Checks that a parallel rebuild of MainProcess gives exactly the indicators of a
+serial rebuild.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import src.get_data as get
+
+PATH_NAMES = ['checkpoint_path', 'run_metrics_path', 'profile_path', 'response_cache_path',
+              'prices_store_path']
+
+
+@pytest.fixture(scope='module')
+def returns():
+    prices_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                               'data', 'index_data.pkl')
+    prices = get.CalculateReturns().add_curve_slope(pd.read_pickle(prices_path))
+    return(get.CalculateReturns().calculate_returns(prices))
+
+
+@pytest.fixture()
+def main(monkeypatch, tmp_path):
+    # TurbulenceSuite_paths changes the working directory when it is imported.
+    monkeypatch.chdir(os.getcwd())
+    import TurbulenceSuite_paths as path
+    import src.main as main
+    for name in PATH_NAMES:
+        monkeypatch.setattr(path, name, str(tmp_path / name))
+    return(main)
+
+
+def rebuild(main, returns, workers):
+    main_process = main.MainProcess(full_rebuild=True, interactive=False, workers=workers)
+    main_process.returns = returns
+    main_process.calculate_turbulence_and_systemic_risk()
+    return(main_process.calculator)
+
+
+def test_parallel_rebuild_matches_serial_rebuild(main, returns):
+    serial_run = rebuild(main, returns, workers=1)
+    parallel_run = rebuild(main, returns, workers=2)
+    for indicator in ['turbulence', 'systemic_risk', 'spectral_indicators']:
+        serial_series = getattr(serial_run, indicator)
+        parallel_series = getattr(parallel_run, indicator)
+        assert list(parallel_series) == list(serial_series)
+        for column in serial_series:
+            np.testing.assert_array_equal(parallel_series[column], serial_series[column])
+    np.testing.assert_array_equal(parallel_run.turbulence_attribution, serial_run.turbulence_attribution)
+    np.testing.assert_array_equal(parallel_run.systemic_risk_window, serial_run.systemic_risk_window)
+
+
+#MIT License
+#
+#Copyright (c) 2019 Terrence Zhang
+#
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+#
+#The above copyright notice and this permission notice shall be included in all
+#copies or substantial portions of the Software.
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#SOFTWARE.
@@ -0,0 +1,80 @@
+"""
+Checks that the out-of-core pass leaves the calculator ready to extend both
+indicators, as an in-memory run does.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import src.calculate as calc
+import src.get_data as get
+import src.out_of_core as ooc
+
+NEW_ROWS = 13
+
+
+@pytest.fixture(scope='module')
+def returns():
+    prices_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                               'data', 'index_data.pkl')
+    prices = get.CalculateReturns().add_curve_slope(pd.read_pickle(prices_path))
+    return(get.CalculateReturns().calculate_returns(prices))
+
+
+@pytest.fixture(scope='module')
+def full_run(returns):
+    calculator = calc.Calculate()
+    calculator.calculate_turbulence(returns)
+    calculator.calculate_systemic_risk(returns)
+    return(calculator)
+
+
+@pytest.fixture(scope='module')
+def out_of_core_run(returns, tmp_path_factory):
+    returns_file = ooc.ReturnsFile(str(tmp_path_factory.mktemp('returns'))).write(returns.iloc[NEW_ROWS:])
+    calculator = ooc.OutOfCoreCalculate(chunk_rows=100)
+    calculator.calculate_turbulence(returns_file)
+    calculator.calculate_systemic_risk(returns_file)
+    calculator.calculator.update_turbulence(returns.iloc[:NEW_ROWS])
+    calculator.calculator.update_systemic_risk(returns.iloc[:NEW_ROWS])
+    return(calculator.calculator)
+
+
+def test_update_turbulence_after_out_of_core_pass(full_run, out_of_core_run):
+    assert out_of_core_run.turbulence['Dates'] == full_run.turbulence['Dates']
+    assert out_of_core_run.turbulence['Recession'] == full_run.turbulence['Recession']
+    for column in ['Raw Turbulence', 'Turbulence']:
+        np.testing.assert_allclose(out_of_core_run.turbulence[column], full_run.turbulence[column],
+                                   rtol=1e-12, atol=0)
+
+
+def test_update_systemic_risk_after_out_of_core_pass(full_run, out_of_core_run):
+    assert out_of_core_run.systemic_risk['Dates'] == full_run.systemic_risk['Dates']
+    assert out_of_core_run.systemic_risk['Recession'] == full_run.systemic_risk['Recession']
+    np.testing.assert_allclose(out_of_core_run.systemic_risk['Systemic Risk'],
+                               full_run.systemic_risk['Systemic Risk'], rtol=0, atol=1e-12)
+
+
+#MIT License
+#
+#Copyright (c) 2019 Terrence Zhang
+#
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+#
+#The above copyright notice and this permission notice shall be included in all
+#copies or substantial portions of the Software.
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#SOFTWARE.
@@ -0,0 +1,79 @@
+"""
+Checks that the parallel path calculates the spectral indicators added with
+add_spectral_indicator, as the serial path does.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import src.calculate as calc
+import src.get_data as get
+import src.parallel as par
+
+
+def top_two_share(eigenvalues):
+    """
+    Purpose: the share of the variance explained by the two largest eigenvalues.
+    """
+    return(eigenvalues[:, -2:].sum(axis=1) / eigenvalues.sum(axis=1))
+
+
+@pytest.fixture(scope='module')
+def returns():
+    prices_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                               'data', 'index_data.pkl')
+    prices = get.CalculateReturns().add_curve_slope(pd.read_pickle(prices_path))
+    return(get.CalculateReturns().calculate_returns(prices))
+
+
+@pytest.fixture()
+def calculator(returns):
+    calculator = calc.Calculate()
+    calculator.calculate_systemic_risk(returns.iloc[:400])
+    calculator.add_spectral_indicator('Top Two Share', top_two_share)
+    return(calculator)
+
+
+def test_added_indicator_on_workers(returns, calculator):
+    serial_run = calc.Calculate()
+    serial_run.spectral_functions = dict(calculator.spectral_functions)
+    serial_run.calculate_systemic_risk(returns, spectral_indicators=['Top Two Share'])
+    par.ParallelCalculate(max_workers=2).calculate(calculator, returns,
+                                                   spectral_indicators=['Top Two Share'])
+    assert calculator.spectral_indicators['Dates'] == serial_run.spectral_indicators['Dates']
+    np.testing.assert_array_equal(calculator.spectral_indicators['Top Two Share'],
+                                  serial_run.spectral_indicators['Top Two Share'])
+    np.testing.assert_array_equal(calculator.systemic_risk['Systemic Risk'],
+                                  serial_run.systemic_risk['Systemic Risk'])
+
+
+def test_unpicklable_indicator_is_rejected(returns, calculator):
+    calculator.add_spectral_indicator('Top Share', lambda eigenvalues: eigenvalues[:, -1])
+    with pytest.raises(ValueError, match='Top Share'):
+        par.ParallelCalculate(max_workers=2).calculate(calculator, returns,
+                                                       spectral_indicators=['Top Share'])
+
+
+#MIT License
+#
+#Copyright (c) 2019 Terrence Zhang
+#
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+#
+#The above copyright notice and this permission notice shall be included in all
+#copies or substantial portions of the Software.
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#SOFTWARE.
@@ -0,0 +1,61 @@
+"""
+Checks the append-only prices store (price_store.PriceStore).
+"""
+import numpy as np
+import pandas as pd
+
+import src.price_store as store
+
+
+def prices(dates, columns):
+    """
+    Purpose: a prices dataset (in reverse chronological order) with one row per date.
+    """
+    output = pd.DataFrame({'Dates': dates[::-1]})
+    for number, column in enumerate(columns):
+        output[column] = np.arange(len(dates), 0, -1, dtype=np.float64) + number
+    return(output)
+
+
+def test_append_only_writes_new_rows(tmp_path):
+    price_store = store.PriceStore(str(tmp_path))
+    price_store.write(prices(['2024-01-01', '2024-01-08'], ['A', 'B']))
+
+    assert price_store.append(prices(['2024-01-08', '2024-01-15'], ['A', 'B'])) == 1
+    stored_prices = store.PriceStore(str(tmp_path)).to_dataframe()
+    assert stored_prices['Dates'].tolist() == ['2024-01-15', '2024-01-08', '2024-01-01']
+    assert stored_prices['A'].tolist() == [2.0, 2.0, 1.0]
+    assert stored_prices['B'].tolist() == [3.0, 3.0, 2.0]
+
+
+def test_append_new_column_to_truncated_store(tmp_path):
+    price_store = store.PriceStore(str(tmp_path))
+    price_store.write(prices(['2024-01-01', '2024-01-08'], ['A']))
+    price_store.truncate(2)
+
+    assert price_store.append(prices(['2024-01-01', '2024-01-08'], ['A', 'B'])) == 2
+    assert store.PriceStore(str(tmp_path)).columns == ['A', 'B']
+    assert store.PriceStore(str(tmp_path)).rows == 2
+
+
+#MIT License
+#
+#Copyright (c) 2019 Terrence Zhang
+#
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+#
+#The above copyright notice and this permission notice shall be included in all
+#copies or substantial portions of the Software.
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#SOFTWARE.
@@ -0,0 +1,101 @@
+"""
+Checks the HTTP/JSON query service over the indicator series (query_service).
+"""
+import json
+import os
+import threading
+
+import numpy as np
+import pytest
+import requests as req
+
+import src.query_service as qry
+
+DATES = ['2024-01-05', '2024-01-12', '2024-01-19', '2024-01-26']
+
+
+def strict_json(body):
+    """
+    Purpose: parse a response body, rejecting the NaN/Infinity literals that
+    are not valid JSON.
+    """
+    def reject(constant):
+        raise ValueError('Invalid JSON constant {}'.format(constant))
+    return(json.loads(body, parse_constant=reject))
+
+
+@pytest.fixture
+def indicator_cache(tmp_path):
+    indicator_cache = qry.IndicatorCache(str(tmp_path / 'indicators.npz'), reload_interval=0)
+    indicator_cache.write({'turbulence': {'Dates': DATES, 'Turbulence': [1.0, np.nan, np.inf, 4.0]}})
+    return(indicator_cache)
+
+
+@pytest.fixture
+def base_url(indicator_cache):
+    server = qry.QueryServer(indicator_cache, port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield('http://127.0.0.1:{}'.format(server.server_address[1]))
+    server.shutdown()
+    server.server_close()
+
+
+def test_missing_values_are_null(indicator_cache):
+    status, body, _ = indicator_cache.response('/series/turbulence')
+
+    assert status == 200
+    assert strict_json(body)['Turbulence'] == [1.0, None, None, 4.0]
+    status, body, _ = indicator_cache.response('/series/turbulence?step=2&aggregate=mean')
+    assert strict_json(body)['Turbulence'] == [None, None]
+
+
+def test_etag_round_trip(base_url):
+    response = req.get(base_url + '/series/turbulence')
+    etag = response.headers['ETag']
+    assert response.status_code == 200
+
+    response = req.get(base_url + '/series/turbulence', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.content == b''
+    assert response.headers['ETag'] == etag
+
+
+def test_rewrite_changes_version(base_url, indicator_cache):
+    first_response = req.get(base_url + '/series/turbulence')
+    first_version = indicator_cache.version
+
+    indicator_cache.write({'turbulence': {'Dates': DATES + ['2024-02-02'],
+                                          'Turbulence': [1.0, 2.0, 3.0, 4.0, 5.0]}})
+    # Make sure the new file has a new modification time, even on coarse clocks.
+    modified = os.stat(indicator_cache.filepath).st_mtime + 10
+    os.utime(indicator_cache.filepath, (modified, modified))
+    response = req.get(base_url + '/series/turbulence',
+                       headers={'If-None-Match': first_response.headers['ETag']})
+
+    assert indicator_cache.version != first_version
+    assert response.status_code == 200
+    assert response.headers['ETag'] != first_response.headers['ETag']
+    assert strict_json(response.content)['Turbulence'] == [1.0, 2.0, 3.0, 4.0, 5.0]
+
+
+#MIT License
+#
+#Copyright (c) 2019 Terrence Zhang
+#
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+#
+#The above copyright notice and this permission notice shall be included in all
+#copies or substantial portions of the Software.
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#SOFTWARE.
@@ -0,0 +1,89 @@
+"""
+Checks the on-disk cache of Yahoo Finance responses (get.ResponseCache).
+"""
+import os
+import time
+
+import pytest
+
+import src.get_data as get
+
+
+def age(filepath, seconds):
+    """
+    Purpose: make a stored response look "seconds" old.
+    """
+    modified = time.time() - seconds
+    os.utime(filepath, (modified, modified))
+
+
+def test_fresh_response_is_reused(tmp_path):
+    cache = get.ResponseCache(str(tmp_path), ttl=3600)
+    cache.put('^FTSE', 0, '2024-01-06', 'response')
+
+    assert cache.get('^FTSE', 0, '2024-01-06') == 'response'
+    assert cache.get('^FTSE', 0, '2024-01-13') is None
+    assert cache.get('^N225', 0, '2024-01-06') is None
+
+
+def test_covering_response_is_reused(tmp_path):
+    cache = get.ResponseCache(str(tmp_path), ttl=3600)
+    cache.put('^FTSE', 0, '2024-01-06', 'full range')
+    cache.put('^FTSE', 100, '2024-01-06', 'recent range')
+    cache.put('^FTSE_B', 500, '2024-01-06', 'other ticker')
+
+    assert cache.get('^FTSE', -100, '2024-01-06') is None
+    assert cache.get('^FTSE', 50, '2024-01-06') == 'full range'
+    assert cache.get('^FTSE', 600, '2024-01-06') == 'recent range'
+
+
+def test_stale_response_expires(tmp_path):
+    cache = get.ResponseCache(str(tmp_path), ttl=3600)
+    cache.put('^FTSE', 0, '2024-01-06', 'response')
+
+    age(cache.filepath('^FTSE', 0, '2024-01-06'), 3599)
+    assert cache.get('^FTSE', 0, '2024-01-06') == 'response'
+    age(cache.filepath('^FTSE', 0, '2024-01-06'), 3601)
+    assert cache.get('^FTSE', 0, '2024-01-06') is None
+
+
+def test_offline_replays_latest_response(tmp_path):
+    get.ResponseCache(str(tmp_path)).put('^FTSE', 0, '2024-01-06', 'older')
+    get.ResponseCache(str(tmp_path)).put('^FTSE', 100, '2024-01-13', 'newer')
+    age(os.path.join(str(tmp_path), '_FTSE_0_2024-01-06.json'), 10 * 86400)
+    age(os.path.join(str(tmp_path), '_FTSE_100_2024-01-13.json'), 5 * 86400)
+    cache = get.ResponseCache(str(tmp_path), ttl=3600, offline=True)
+
+    # Any range and request date, however old the stored responses are.
+    assert cache.get('^FTSE', 200, '2024-02-03') == 'newer'
+
+
+def test_offline_cache_miss_raises(tmp_path):
+    cache = get.ResponseCache(str(tmp_path), offline=True)
+    cache.put('^FTSE', 0, '2024-01-06', 'response')
+
+    with pytest.raises(FileNotFoundError):
+        cache.get('^N225', 0, '2024-01-06')
+
+
+#MIT License
+#
+#Copyright (c) 2019 Terrence Zhang
+#
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+#
+#The above copyright notice and this permission notice shall be included in all
+#copies or substantial portions of the Software.
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#SOFTWARE.
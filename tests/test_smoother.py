@@ -0,0 +1,74 @@
+"""
+Checks the exponential smoother (calculate.ExponentialSmootherState) against the
+recursion of the original code.
+"""
+import math
+
+import numpy as np
+import pytest
+
+import src.calculate as calc
+
+
+def reference_smoother(raw_data, half_life, smoothed_value=None):
+    """
+    Purpose: the loop of the original Calculate.exponential_smoother, optionally
+    continuing from "smoothed_value".
+    """
+    smoothing_factor = 1 - math.exp(math.log(0.5) / half_life)
+    smoothed_values = []
+    for raw_value in raw_data:
+        if smoothed_value is None:
+            smoothed_value = raw_value
+        else:
+            smoothed_value = (smoothing_factor * raw_value) + ((1 - smoothing_factor) * smoothed_value)
+        smoothed_values.append(smoothed_value)
+    return(smoothed_values)
+
+
+@pytest.mark.parametrize('new_values', [1, calc.ExponentialSmootherState.recursion_limit - 1,
+                                        calc.ExponentialSmootherState.recursion_limit, 500])
+def test_extend_matches_original_loop(new_values):
+    raw_data = np.random.RandomState(0).standard_normal(300 + new_values)
+    calculator = calc.Calculate()
+    history = calculator.exponential_smoother(raw_data[:300], half_life=12)
+    extension = calculator.smoother_state.extend(raw_data[300:])
+    expected_values = reference_smoother(raw_data, half_life=12)
+
+    np.testing.assert_allclose(history + extension, expected_values, rtol=1e-12, atol=1e-12)
+    assert calculator.smoother_state.smoothed_value == pytest.approx(expected_values[-1], rel=1e-12)
+
+
+def test_extend_several_series():
+    raw_data = np.random.RandomState(1).standard_normal((3, 100))
+    for new_values in [10, 80]:
+        state = calc.ExponentialSmootherState(smoothed_value=np.zeros(3), smoothing_factor=0.1)
+        extension = np.array(state.extend(raw_data[:, :new_values]))
+        expected_values = [reference_smoother(series[:new_values], half_life=math.log(0.5) / math.log(0.9),
+                                              smoothed_value=0.0) for series in raw_data]
+
+        assert extension.shape == (3, new_values)
+        np.testing.assert_allclose(extension, expected_values, rtol=1e-12, atol=1e-12)
+
+
+#MIT License
+#
+#Copyright (c) 2019 Terrence Zhang
+#
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+#
+#The above copyright notice and this permission notice shall be included in all
+#copies or substantial portions of the Software.
+#
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#SOFTWARE.